@@ -0,0 +1,320 @@
+'''
+in-process API benchmark: signup / login / update_password
+
+    python -m benchmarks.api_throughput run --concurrency 50 --requests 1000 --save main
+    python -m benchmarks.api_throughput run --compare benchmarks/baselines/main.json
+    python -m benchmarks.api_throughput compare benchmarks/baselines/main.json current.json
+
+the FastAPI app is driven through httpx.ASGITransport (no server, no sockets),
+AWS is replaced by the stand-ins of benchmarks/standins.py with the given latencies,
+so the numbers measure this code (validation, hashing, services, event publishing)
+plus the simulated round trips; `--*-ms 0` leaves the CPU cost only
+
+`users` accounts are signed up before the measured phases (login / update_password use them),
+the phases run one after another, each with `concurrency` workers sending `requests` requests;
+results: req/s and p50/p95/p99 (ms) per endpoint, saved as JSON (baseline),
+`compare` flags req/s drops and p95/p99 increases above `--threshold` (exit code 1)
+'''
+import os
+import sys
+import json
+import time
+import math
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+ENDPOINTS = ('signup', 'login', 'update_password')
+PASSWORD = 'bench-secret'
+API = '/auth/api/v1/auth-nosql'
+
+
+def install_standins(args) -> Any:
+    # conf is read at import time
+    if args.hash_scheme:
+        os.environ['PWD_HASH_SCHEME'] = args.hash_scheme
+    # all the requests come from one client
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+
+    import main
+    from src.configs import adapters
+    from src.configs.conf import (
+        ACCOUNT_CACHE_ENABLED,
+        ACCOUNT_CACHE_MAX_SIZE,
+        ACCOUNT_CACHE_TTL_SECS,
+    )
+    from src.infra.cache import LRUTTLCache
+    from src.infra.db.nosql.cached_auth_repository import CachedAuthRepository
+    from src.infra.memory import MemoryAuthRepository, MemoryObjectStorage, MemoryEventRepository
+    from src.routers.v1 import auth as auth_router
+    from src.events.pub.event import _base_publish
+    from benchmarks.standins import (
+        Latency,
+        WithLatency,
+        FakeSESClient,
+        FakeEventsClient,
+        FakeSQSClient,
+        FakeResourceHandler,
+    )
+
+    auth_repo = WithLatency(MemoryAuthRepository(), Latency(args.ddb_ms))
+    if ACCOUNT_CACHE_ENABLED:
+        auth_repo = CachedAuthRepository(
+            auth_repo=auth_repo,
+            account_cache=LRUTTLCache('account', ACCOUNT_CACHE_MAX_SIZE, ACCOUNT_CACHE_TTL_SECS),
+        )
+    obj_storage = WithLatency(MemoryObjectStorage(), Latency(args.s3_ms))
+    for service in (auth_router.auth_service, adapters.auth_svc):
+        service.auth_repo = auth_repo
+        service.obj_storage = obj_storage
+
+    adapters.email_client.ses = FakeResourceHandler(FakeSESClient(Latency(args.ses_ms)))
+    adapters.event_bus_adapter.event_bus_rsc = FakeResourceHandler(FakeEventsClient(Latency(args.mq_ms)))
+    for dlq in (adapters.failed_publish_events_dlq, adapters.failed_subscribed_events_dlq):
+        dlq.sqs_rsc = FakeResourceHandler(FakeSQSClient(Latency(args.mq_ms)), dlq.sqs_label)
+    _base_publish.event_repo = WithLatency(MemoryEventRepository(max_logs=1000), Latency(args.ddb_ms))
+
+    return main.app
+
+
+def signup_request(email: str) -> Tuple[str, str, Dict]:
+    return ('POST', f'{API}/signup', {
+        'email': email,
+        'meta': json.dumps({'role': 'teacher', 'pass': PASSWORD}),
+        'pubkey': 'bench',
+    })
+
+
+def login_request(email: str) -> Tuple[str, str, Dict]:
+    return ('POST', f'{API}/login', {
+        'email': email,
+        'meta': json.dumps({'pass': PASSWORD}),
+        'pubkey': 'bench',
+        'current_region': 'jp',
+    })
+
+
+def update_password_request(email: str) -> Tuple[str, str, Dict]:
+    # the same password, so the accounts stay usable by the next phases/runs
+    return ('PUT', f'{API}/password/update', {
+        'register_email': email,
+        'password1': PASSWORD,
+        'password2': PASSWORD,
+    })
+
+
+async def run_phase(client: Any, requests: List[Tuple[str, str, Dict]], concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    queue = iter(requests)
+
+    async def worker():
+        for (method, url, body) in queue:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not isinstance(status, int) or status >= 400:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return summarize(latencies, errors, elapsed)
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    rank = max(1, int(math.ceil(len(ordered) * p / 100)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: List[float], errors: Dict[str, int], elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'errors': sum(errors.values()),
+        'error_codes': errors,
+        'elapsed_secs': round(elapsed, 3),
+        'rps': round(len(ordered) / elapsed, 1) if elapsed > 0 else 0.0,
+        'mean_ms': round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 50), 3),
+        'p95_ms': round(percentile(ordered, 95), 3),
+        'p99_ms': round(percentile(ordered, 99), 3),
+    }
+
+
+async def benchmark(args) -> Dict[str, Any]:
+    import httpx
+
+    app = install_standins(args)
+    rand = random.Random(args.seed)
+    run_id = f'{int(time.time())}{rand.randrange(1000):03d}'
+    transport = httpx.ASGITransport(app=app)
+    results: Dict[str, Any] = {}
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        users = [f'bench-{run_id}-{i}@example.com' for i in range(args.users)]
+        seeded = await run_phase(client, [signup_request(email) for email in users], args.concurrency)
+        if seeded['errors']:
+            raise Exception(f'seeding failed: {seeded["error_codes"]}')
+
+        for endpoint in args.endpoints:
+            if endpoint == 'signup':
+                requests = [
+                    signup_request(f'bench-{run_id}-new-{i}@example.com')
+                    for i in range(args.requests)
+                ]
+            elif endpoint == 'login':
+                requests = [login_request(rand.choice(users)) for _ in range(args.requests)]
+            else:
+                requests = [update_password_request(rand.choice(users)) for _ in range(args.requests)]
+
+            results[endpoint] = await run_phase(client, requests, args.concurrency)
+
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def report(results: Dict[str, Any]):
+    print(f'{"endpoint":<18}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}')
+    for (endpoint, result) in results.items():
+        print(f'{endpoint:<18}{result["rps"]:>10.1f}{result["p50_ms"]:>10.2f}'
+              f'{result["p95_ms"]:>10.2f}{result["p99_ms"]:>10.2f}{result["errors"]:>8}')
+
+
+def baseline_path(name: str) -> str:
+    if name.endswith('.json') or os.sep in name:
+        return name
+    return os.path.join(BASELINE_DIR, f'{name}.json')
+
+
+'''
+regressions of current against baseline, per endpoint:
+req/s lower by more than threshold, p95/p99 higher by more than threshold
+'''
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    regressions = []
+    if baseline['meta'].get('args', None) != current['meta'].get('args', None):
+        print('warning: the runs have different arguments, the numbers may not be comparable')
+
+    print(f'{"endpoint":<18}{"metric":<8}{"baseline":>12}{"current":>12}{"change":>10}')
+    for (endpoint, base) in baseline['endpoints'].items():
+        cur = current['endpoints'].get(endpoint, None)
+        if cur is None:
+            continue
+
+        for (metric, higher_is_better) in (('rps', True), ('p95_ms', False), ('p99_ms', False)):
+            (old, new) = (base[metric], cur[metric])
+            change = (new - old) / old if old else 0.0
+            regressed = change < -threshold if higher_is_better else change > threshold
+            flag = '  REGRESSION' if regressed else ''
+            print(f'{endpoint:<18}{metric:<8}{old:>12.2f}{new:>12.2f}{change:>+10.1%}{flag}')
+            if regressed:
+                regressions.append(f'{endpoint}.{metric}')
+
+    return regressions
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(baseline_path(path)) as f:
+        return json.load(f)
+
+
+def cmd_run(args) -> int:
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    results = asyncio.run(benchmark(args))
+    document = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'hash_scheme': os.getenv('PWD_HASH_SCHEME', 'scrypt'),
+            'args': {
+                key: value for (key, value) in vars(args).items()
+                if key not in ('func', 'save', 'compare', 'verbose')
+            },
+        },
+        'endpoints': results,
+    }
+    report(results)
+
+    if args.save:
+        path = baseline_path(args.save)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f'saved: {path}')
+
+    if args.compare:
+        regressions = compare(load(args.compare), document, args.threshold)
+        return 1 if regressions else 0
+
+    return 0
+
+
+def cmd_compare(args) -> int:
+    regressions = compare(load(args.baseline), load(args.current), args.threshold)
+    if regressions:
+        print(f'regressions: {", ".join(regressions)}')
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='in-process API benchmark')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run the benchmark')
+    run.add_argument('--endpoints', type=lambda s: [e for e in s.split(',') if e],
+                     default=list(ENDPOINTS), help=f'comma separated: {",".join(ENDPOINTS)}')
+    run.add_argument('--concurrency', type=int, default=50)
+    run.add_argument('--requests', type=int, default=1000, help='requests per endpoint')
+    run.add_argument('--users', type=int, default=200, help='accounts signed up before the phases')
+    run.add_argument('--ddb-ms', type=float, default=5.0, help='DynamoDB latency')
+    run.add_argument('--s3-ms', type=float, default=15.0, help='S3 latency')
+    run.add_argument('--ses-ms', type=float, default=20.0, help='SES latency')
+    run.add_argument('--mq-ms', type=float, default=10.0, help='SQS/EventBridge latency')
+    run.add_argument('--hash-scheme', default=None, help='PWD_HASH_SCHEME of this run')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--save', default=None, help=f'baseline name (saved in {BASELINE_DIR}) or path')
+    run.add_argument('--compare', default=None, help='baseline name or path to compare with')
+    run.add_argument('--threshold', type=float, default=0.10)
+    run.add_argument('--verbose', action='store_true', help='keep the INFO logs of the app')
+    run.set_defaults(func=cmd_run)
+
+    cmp = commands.add_parser('compare', help='compare two saved runs')
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+    cmp.add_argument('--threshold', type=float, default=0.10)
+    cmp.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    for endpoint in getattr(args, 'endpoints', []):
+        if endpoint not in ENDPOINTS:
+            parser.error(f'unknown endpoint: {endpoint}')
+
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+'''
+password hashing benchmark: logins/sec per core at each cost setting
+
+    python -m benchmarks.password_hash
+    python -m benchmarks.password_hash --secs 3 --workers 4
+
+a login verifies exactly one hash, so single-thread verifies/sec
+is the login ceiling of one core; `--workers` also measures the
+thread pool used by the service (hashlib releases the GIL)
+'''
+import argparse
+import asyncio
+import time
+from typing import List, Tuple
+from src.infra.utils.password_hasher import (
+    IPasswordEngine,
+    PasswordHasher,
+    Sha224Engine,
+    Pbkdf2Engine,
+    ScryptEngine,
+)
+
+
+COST_SETTINGS: List[Tuple[str, IPasswordEngine]] = [
+    ('sha224 (legacy)', Sha224Engine()),
+    ('pbkdf2_sha256 i=100000', Pbkdf2Engine(iterations=100000)),
+    ('pbkdf2_sha256 i=310000', Pbkdf2Engine(iterations=310000)),
+    ('pbkdf2_sha256 i=600000', Pbkdf2Engine(iterations=600000)),
+    ('scrypt n=2^13 r=8 p=1', ScryptEngine(n=2 ** 13, r=8, p=1)),
+    ('scrypt n=2^14 r=8 p=1', ScryptEngine(n=2 ** 14, r=8, p=1)),
+    ('scrypt n=2^15 r=8 p=1', ScryptEngine(n=2 ** 15, r=8, p=1)),
+]
+
+PW = 'correct horse battery staple'
+SALT = 'abcdefghijkl'
+
+
+def per_core(engine: IPasswordEngine, secs: float) -> Tuple[float, float]:
+    pass_hash = engine.hash(PW, SALT)
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < secs:
+        engine.verify(pass_hash, PW, SALT)
+        count += 1
+    elapsed = time.perf_counter() - start
+    return (count / elapsed, elapsed / count * 1000)
+
+
+async def pooled(engine: IPasswordEngine, workers: int, secs: float) -> float:
+    hasher = PasswordHasher(engine=engine, workers=workers)
+    pass_hash = engine.hash(PW, SALT)
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < secs:
+        await asyncio.gather(*[
+            hasher.verify_async(pass_hash, PW, SALT) for _ in range(workers)
+        ])
+        count += workers
+    elapsed = time.perf_counter() - start
+    hasher.shutdown()
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='password hashing benchmark')
+    parser.add_argument('--secs', type=float, default=2.0, help='seconds per setting')
+    parser.add_argument('--workers', type=int, default=0, help='also measure a thread pool of N workers')
+    args = parser.parse_args()
+
+    header = f'{"setting":<26}{"logins/s/core":>15}{"ms/login":>10}'
+    if args.workers:
+        header += f'{f"logins/s ({args.workers}w)":>20}'
+    print(header)
+
+    for label, engine in COST_SETTINGS:
+        rate, ms = per_core(engine, args.secs)
+        line = f'{label:<26}{rate:>15.1f}{ms:>10.2f}'
+        if args.workers:
+            line += f'{asyncio.run(pooled(engine, args.workers, args.secs)):>20.1f}'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+'''
+ResourceHandler.access() overhead under concurrent coroutines
+
+    python -m benchmarks.resource_access
+    python -m benchmarks.resource_access --coroutines 1000 --calls 200 --connect-ms 50
+
+compares the former pattern (`async with self.lock` on every access)
+with the lock-free fast path of ClientResourceHandler; a fake client with a
+`--connect-ms` connect latency stands in for the aioboto3 client.
+`cold` starts every coroutine before the client exists: single flight
+means one connect, whatever the number of callers;
+`reinit` re-creates the client (a failed probe) while the calls go on:
+the former lock stalls every caller for the connect latency
+'''
+import argparse
+import asyncio
+import time
+from contextlib import AsyncExitStack
+from src.infra.resources.handlers._resource import ClientResourceHandler
+
+
+class FakeClient:
+    pass
+
+
+class LockedHandler:
+    # the former handlers: the lock is taken on every access
+    def __init__(self, connect_secs: float):
+        self.connect_secs = connect_secs
+        self.lock = asyncio.Lock()
+        self.client = None
+        self.connects = 0
+
+    async def access(self, **kwargs):
+        async with self.lock:
+            if self.client is None:
+                self.connects += 1
+                await asyncio.sleep(self.connect_secs)
+                self.client = FakeClient()
+            return self.client
+
+    async def reinitial(self):
+        async with self.lock:
+            self.connects += 1
+            await asyncio.sleep(self.connect_secs)
+            self.client = FakeClient()
+
+
+class FastPathHandler(ClientResourceHandler):
+    def __init__(self, connect_secs: float):
+        super().__init__()
+        self.connect_secs = connect_secs
+        self.connects = 0
+
+    async def _open(self, stack: AsyncExitStack):
+        self.connects += 1
+        await asyncio.sleep(self.connect_secs)
+        return FakeClient()
+
+    async def _validate(self, resource):
+        pass
+
+
+async def worker(handler, calls: int):
+    for _ in range(calls):
+        await handler.access()
+        # the request does its IO here, let the others run
+        await asyncio.sleep(0)
+
+
+async def measure(handler, coroutines: int, calls: int, state: str):
+    if state != 'cold':
+        await handler.access()
+
+    start = time.perf_counter()
+    jobs = [worker(handler, calls) for _ in range(coroutines)]
+    if state == 'reinit':
+        jobs.append(handler.reinitial())
+    await asyncio.gather(*jobs)
+    elapsed = time.perf_counter() - start
+    return (elapsed, handler.connects)
+
+
+async def baseline(coroutines: int, calls: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*[worker_sleep_only(calls) for _ in range(coroutines)])
+    return time.perf_counter() - start
+
+
+async def worker_sleep_only(calls: int):
+    for _ in range(calls):
+        await asyncio.sleep(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ResourceHandler.access() overhead')
+    parser.add_argument('--coroutines', type=int, default=1000)
+    parser.add_argument('--calls', type=int, default=100, help='access() calls per coroutine')
+    parser.add_argument('--connect-ms', type=float, default=20.0, help='fake connect latency')
+    args = parser.parse_args()
+
+    total = args.coroutines * args.calls
+    base = asyncio.run(baseline(args.coroutines, args.calls))
+    print(f'{args.coroutines} coroutines x {args.calls} calls, '
+          f'loop baseline {base / total * 1e6:.2f} us/call (subtracted below)')
+    print(f'{"handler":<12}{"state":<8}{"us/call":>10}{"connects":>10}')
+
+    for (label, handler_cls) in (('locked', LockedHandler), ('fast path', FastPathHandler)):
+        for state in ('warm', 'cold', 'reinit'):
+            handler = handler_cls(args.connect_ms / 1000)
+            (elapsed, connects) = asyncio.run(
+                measure(handler, args.coroutines, args.calls, state))
+            if state == 'cold':
+                # the first connect is unavoidable
+                elapsed -= args.connect_ms / 1000
+            overhead = max(0.0, elapsed - base) / total * 1e6
+            print(f'{label:<12}{state:<8}{overhead:>10.2f}{connects:>10}')
+
+
+if __name__ == '__main__':
+    main()
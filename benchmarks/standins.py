@@ -0,0 +1,94 @@
+'''
+local stand-ins of DynamoDB, S3, SES, SQS and EventBridge for the benchmarks:
+the in-memory repositories/storage of src/infra/memory and
+fake aioboto3 clients behind the resource handlers, each call waits an
+injectable latency (ms) to stand for the network round trip
+'''
+import uuid
+import asyncio
+import inspect
+from typing import Any, Dict, List
+
+
+class Latency:
+    def __init__(self, ms: float = 0.0):
+        self.ms = ms
+        self.calls = 0
+
+    async def wait(self):
+        self.calls += 1
+        if self.ms > 0:
+            await asyncio.sleep(self.ms / 1000)
+
+
+# the in-memory repositories of src/infra/memory, each call waits the latency first
+class WithLatency:
+    def __init__(self, target: Any, latency: Latency):
+        self.target = target
+        self.latency = latency
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.target, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            await self.latency.wait()
+            return await attr(*args, **kwargs)
+
+        return call
+
+
+class FakeSESClient:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    async def send_email(self, **kwargs) -> Dict:
+        await self.latency.wait()
+        return {'MessageId': uuid.uuid4().hex}
+
+    async def get_send_quota(self, **kwargs) -> Dict:
+        await self.latency.wait()
+        return {'Max24HourSend': -1.0, 'MaxSendRate': 10000.0, 'SentLast24Hours': 0.0}
+
+
+class FakeEventsClient:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    async def put_events(self, Entries: List[Dict], **kwargs) -> Dict:
+        await self.latency.wait()
+        return {
+            'FailedEntryCount': 0,
+            'Entries': [{'EventId': uuid.uuid4().hex} for _ in Entries],
+        }
+
+
+class FakeSQSClient:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    async def send_message(self, **kwargs) -> Dict:
+        await self.latency.wait()
+        return {'MessageId': uuid.uuid4().hex}
+
+    async def send_message_batch(self, Entries: List[Dict], **kwargs) -> Dict:
+        await self.latency.wait()
+        return {
+            'Successful': [{'Id': entry['Id'], 'MessageId': uuid.uuid4().hex} for entry in Entries],
+            'Failed': [],
+        }
+
+
+# stands for a ResourceHandler: access() returns the fake client
+class FakeResourceHandler:
+    def __init__(self, client: Any, label: str = 'fake', queue_url: str = 'local'):
+        self.client = client
+        self.label = label
+        self.queue_url = queue_url
+
+    async def access(self, **kwargs):
+        return self.client
+
+    def initialized(self) -> bool:
+        return True
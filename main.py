@@ -9,20 +9,32 @@ from src.infra.resources.manager import resource_manager
 from src.configs.adapters import (
     failed_publish_events_dlq,
     failed_subscribed_events_dlq,
+    event_bus_adapter,
+    email_client,
+    snowflake_lease,
 )
 from src.events.sub.sub_event_manager import (
     retry_pub_event_manager,
     retry_sub_event_manager,
 )
-from src.routers.v1 import auth, notify
+from src.routers.v1 import auth, notify, metrics
+from src.routers.middlewares import ServerTimingMiddleware, RateLimitMiddleware, rate_limiter
+from src.configs.conf import (
+    TIMING_ENABLED,
+    RATE_LIMIT_ENABLED,
+    SNOWFLAKE_WORKER_ID,
+    SNOWFLAKE_LEASE_ENABLED,
+)
 from src.routers.v2 import auth as auth_v2
 from src.events.sub.v1 import subscribe
+from src.events.sub.lambda_ingest import lambda_handler
 
 
 router_v1 = APIRouter(prefix='/auth/api/v1')
 router_v1.include_router(auth.router)
 router_v1.include_router(subscribe.router)
 router_v1.include_router(notify.router)
+router_v1.include_router(metrics.router)
 
 router_v2 = APIRouter(prefix='/auth/api/v2')
 router_v2.include_router(auth_v2.router)
@@ -31,6 +43,11 @@ router_v2.include_router(auth_v2.router)
 STAGE = os.environ.get('STAGE')
 root_path = '/' if not STAGE else f'/{STAGE}'
 app = FastAPI(title='ForeignTeacher: Auth Service', root_path=root_path)
+# the last added is the outermost: the rejected requests are timed too
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+if TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
 
 
 @app.on_event('startup')
@@ -39,6 +56,10 @@ async def startup_event():
     await resource_manager.initial()
     asyncio.create_task(resource_manager.keeping_probe())
 
+    # snowflake worker id of this process, unless it's configured
+    if SNOWFLAKE_LEASE_ENABLED and SNOWFLAKE_WORKER_ID is None:
+        await snowflake_lease.start()
+
     # polling local messages(SQS)
     asyncio.create_task(failed_publish_events_dlq.subscribe_messages(
         retry_pub_event_manager.subscribe_event,
@@ -50,6 +71,15 @@ async def startup_event():
 
 @app.on_event('shutdown')
 async def shutdown_event():
+    # flush buffered events & DLQ messages
+    await event_bus_adapter.close()
+    await failed_publish_events_dlq.close()
+    await failed_subscribed_events_dlq.close()
+    # send the queued emails
+    await email_client.close()
+    # the worker id can be leased by another process
+    await snowflake_lease.close()
+
     # close connection pool
     await resource_manager.close()
 
@@ -85,3 +115,6 @@ async def info(term: str):
 
 # Mangum Handler, this is so important
 handler = Mangum(app)
+
+# EventBridge / SQS batch events of remote regions, without API Gateway
+event_handler = lambda_handler
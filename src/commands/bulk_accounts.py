@@ -0,0 +1,555 @@
+'''
+bulk account import / export
+(tables: auth, accounts, account_indexs, and the S3 email registry)
+
+    python -m src.commands.bulk_accounts import users.ndjson --checkpoint users.ckpt.json
+    python -m src.commands.bulk_accounts import users.csv --chunk 200 --window 4 --rejects rejects.ndjson
+    python -m src.commands.bulk_accounts import users.ndjson --no-events
+    python -m src.commands.bulk_accounts export accounts.ndjson --segments 4 --with-credentials
+
+import rows (NDJSON, or CSV with a header row):
+    email, role
+    region                  optional, only this region (HERE_WE_ARE) is accepted
+    account_type            optional, ft(default) / fb / google
+    pass                    plain password, hashed in a process pool
+    pass_hash, pass_salt    hashed already (e.g. exported with --with-credentials)
+    sso_id                  for fb / google accounts
+    aid, role_id            optional, kept as they are (migrations)
+
+per chunk of rows:
+    1. skip the emails which exist in the auth table (batch_find_auths)
+    2. claim the emails in the S3 registry concurrently (init_if_absent),
+       skip the ones registered in other regions
+    3. hash the passwords in the process pool, allocate the ids in bulk
+    4. write the registry regions concurrently, then BatchWriteItem
+    5. on failure: delete the written rows and the claimed registry entries
+    6. publish the user_registration events of the imported users
+       (to the remote regions, like signup), unless --no-events
+
+BatchWriteItem is not conditional: only the registry claim keeps a concurrent
+signup of the same email out, so the import requires S3_CONDITIONAL_WRITES
+(an atomic init_if_absent)
+
+the checkpoint counts the rows of the contiguous completed chunks,
+rerunning with the same checkpoint resumes after them; the registry entries
+claimed by an interrupted import (no region yet) are claimed again once they
+are older than --claim-lease-secs, the unfinished signups are left alone
+'''
+import argparse
+import asyncio
+import csv
+import json
+import math
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from itertools import islice
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+from pydantic import BaseModel, EmailStr, Field, ValidationError, validator, root_validator
+from ..configs.adapters import (
+    auth_repo,
+    global_object_storage,
+    db_rsc,
+    storage_rsc,
+    event_bus_rsc,
+    failed_pub_mq_rsc,
+    event_bus_adapter,
+    failed_publish_events_dlq,
+)
+from ..configs.conf import MIN_PASSWORD_LENGTH, S3_CONDITIONAL_WRITES, IN_MEMORY_REPOSITORIES
+from ..configs.constants import HERE_WE_ARE, VALID_ROLES, ACCOUNT_PROJECTION, AccountType
+from ..events.pub.event.publish_remote_events import publish_remote_user_registration
+from ..models.auth_value_objects import SignupVO
+from ..infra.utils import auth_util
+from ..infra.utils.time_util import gen_timestamp
+import logging
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# registry versions claimed by the import: <prefix><ms>.<random>
+CLAIM_VERSION_PREFIX = 'bulk.'
+
+
+class BulkAccountRow(BaseModel):
+    email: EmailStr
+    role: str
+    region: str = HERE_WE_ARE
+    account_type: AccountType = AccountType.FT
+    pw: Optional[str] = Field(None, alias='pass')
+    pass_hash: Optional[str] = None
+    pass_salt: Optional[str] = None
+    sso_id: Optional[str] = None
+    aid: Optional[int] = None
+    role_id: Optional[int] = None
+
+    @validator('role')
+    def valid_role(cls, v):
+        if not v in VALID_ROLES:
+            raise ValueError(f'role allowed only in {VALID_ROLES}')
+        return v
+
+    @validator('region')
+    def this_region(cls, v):
+        if v != HERE_WE_ARE:
+            raise ValueError(f'region should be {HERE_WE_ARE}')
+        return v
+
+    @root_validator(skip_on_failure=True)
+    def credentials(cls, values):
+        if values['account_type'] == AccountType.FT:
+            if not (values.get('pass_hash') and values.get('pass_salt')) \
+                    and len(values.get('pw') or '') < MIN_PASSWORD_LENGTH:
+                raise ValueError(
+                    f'pass (at least {MIN_PASSWORD_LENGTH} chars) or pass_hash + pass_salt is required')
+
+        elif not values.get('sso_id'):
+            raise ValueError('sso_id is required')
+
+        if bool(values.get('aid')) != bool(values.get('role_id')):
+            raise ValueError('aid and role_id should be given together')
+
+        return values
+
+    # data of auth_util.gen_bulk_account_data
+    def account_data(self) -> Dict:
+        data = {
+            'email': self.email,
+            'role': self.role,
+            'region': self.region,
+            'sso_id': self.sso_id,
+        }
+        if self.aid:
+            data.update({'aid': self.aid, 'role_id': self.role_id})
+        return data
+
+
+class BulkAccountImporter:
+    def __init__(
+        self,
+        pool: ProcessPoolExecutor,
+        workers: int,
+        registry_concurrency: int,
+        resuming: bool,
+        claim_lease_secs: int,
+        publish_events: bool,
+    ):
+        self.pool = pool
+        self.workers = workers
+        self.registry_sem = asyncio.Semaphore(registry_concurrency)
+        # an interrupted run leaves registry entries without 'region', reclaim them
+        self.resuming = resuming
+        self.claim_lease_ms = claim_lease_secs * 1000
+        self.publish_events = publish_events
+        # emails taken by the previous chunks of this run
+        self.seen: Set[str] = set()
+        self.__cls_name = self.__class__.__name__
+
+    '''
+    rows: [(raw row, read error)], offset: row number of the first row
+    returns the chunk stats & rejects, raises after rolling the chunk back
+    '''
+    async def import_chunk(self, rows: List[Tuple[Optional[Dict], Optional[str]]], offset: int) -> Dict:
+        result = {'imported': 0, 'existing': 0, 'registered': 0, 'invalid': 0, 'rejects': []}
+
+        def reject(idx: int, email: Any, reason: str, counter: str):
+            result[counter] += 1
+            result['rejects'].append({'row': offset + idx, 'email': email, 'reason': reason})
+
+        # 1. parse & dedupe
+        candidates: List[Tuple[int, BulkAccountRow]] = []
+        for (idx, (raw, err)) in enumerate(rows):
+            if err:
+                reject(idx, None, err, 'invalid')
+                continue
+            try:
+                row = BulkAccountRow.parse_obj(raw)
+            except ValidationError as e:
+                reject(idx, raw.get('email', None), str(e).replace('\n', ' '), 'invalid')
+                continue
+
+            if row.email in self.seen:
+                reject(idx, row.email, 'duplicated email in the input', 'invalid')
+                continue
+            self.seen.add(row.email)
+            candidates.append((idx, row))
+
+        if not candidates:
+            return result
+
+        # 2. skip the existing accounts
+        auths = await auth_repo.batch_find_auths(db_rsc, [row.email for (_, row) in candidates])
+        existing = set([auth['email'] for auth in auths])
+        fresh = []
+        for (idx, row) in candidates:
+            if row.email in existing:
+                reject(idx, row.email, 'existing', 'existing')
+            else:
+                fresh.append((idx, row))
+
+        claimed: List[Tuple[BulkAccountRow, str]] = []
+        accounts = []
+        try:
+            # 3. claim the emails in the registry
+            claims = await asyncio.gather(
+                *[self.__claim(row) for (_, row) in fresh], return_exceptions=True)
+            errors = []
+            for ((idx, row), claim) in zip(fresh, claims):
+                if isinstance(claim, Exception):
+                    errors.append(claim)
+                    continue
+                (version, email_info) = claim
+                if version is None:
+                    reject(idx, row.email, f'registered: {email_info}', 'registered')
+                else:
+                    claimed.append((row, version))
+            if errors:
+                raise errors[0]
+
+            if not claimed:
+                return result
+
+            # 4. hash & allocate ids
+            claimed_rows = [row for (row, _) in claimed]
+            credentials = await self.__credentials(claimed_rows)
+            accounts = auth_util.gen_bulk_account_data(
+                [row.account_data() for row in claimed_rows],
+                [row.account_type for row in claimed_rows],
+                credentials,
+            )
+
+            # 5. registry regions, then the tables
+            await asyncio.gather(*[
+                self.__registry(global_object_storage.update,
+                    bucket=row.email, version=version, newdata={'region': row.region})
+                for (row, version) in claimed
+            ])
+            await auth_repo.batch_create_accounts(
+                auth_db=db_rsc, account_db=db_rsc, accounts=accounts)
+
+            result['imported'] = len(accounts)
+
+        except Exception as e:
+            log.error(f'{self.__cls_name}.import_chunk [chunk_import_err] \
+                offset:%s, size:%s, claimed:%s, err:%s',
+                offset, len(rows), len(claimed), e.__str__())
+            await self.__rollback(claimed, accounts)
+            raise e
+
+        # 6. the failed events go to the DLQ, they never roll the chunk back
+        if self.publish_events:
+            await asyncio.gather(*[
+                publish_remote_user_registration(SignupVO(auth=auth, account=account))
+                for (auth, account) in accounts
+            ])
+        return result
+
+    async def __claim(self, row: BulkAccountRow) -> Tuple[Optional[str], Optional[Dict]]:
+        version = f'{CLAIM_VERSION_PREFIX}{gen_timestamp()}.{auth_util.gen_random_string(10)}'
+        email_info = await self.__registry(
+            global_object_storage.init_if_absent, bucket=row.email, version=version)
+        if email_info is None:
+            return (version, None)
+
+        if self.resuming and not 'region' in email_info and self.__stale_claim(email_info.get('version', None)):
+            return (email_info['version'], None)
+
+        return (None, email_info)
+
+    # claimed by an import (not a signup) and older than the lease
+    def __stale_claim(self, version: Optional[str]) -> bool:
+        if not isinstance(version, str) or not version.startswith(CLAIM_VERSION_PREFIX):
+            return False
+
+        try:
+            claimed_at = int(version[len(CLAIM_VERSION_PREFIX):].split('.', 1)[0])
+        except ValueError:
+            return False
+
+        return gen_timestamp() - claimed_at >= self.claim_lease_ms
+
+    async def __credentials(self, rows: List[BulkAccountRow]) -> List[Optional[Tuple[str, str]]]:
+        credentials: List[Optional[Tuple[str, str]]] = [None] * len(rows)
+        to_hash = []
+        for (i, row) in enumerate(rows):
+            if row.account_type != AccountType.FT:
+                continue
+            if row.pass_hash and row.pass_salt:
+                credentials[i] = (row.pass_salt, row.pass_hash)
+            else:
+                to_hash.append(i)
+
+        if not to_hash:
+            return credentials
+
+        # one slice per worker process
+        loop = asyncio.get_running_loop()
+        size = math.ceil(len(to_hash) / self.workers)
+        slices = [to_hash[i:i + size] for i in range(0, len(to_hash), size)]
+        hashes = await asyncio.gather(*[
+            loop.run_in_executor(self.pool, auth_util.gen_password_hashes, [rows[i].pw for i in idxs])
+            for idxs in slices
+        ])
+        for (idxs, slice_hashes) in zip(slices, hashes):
+            for (i, credential) in zip(idxs, slice_hashes):
+                credentials[i] = credential
+
+        return credentials
+
+    async def __registry(self, func, **kwargs):
+        async with self.registry_sem:
+            return await func(**kwargs)
+
+    async def __rollback(self, claimed: List[Tuple[BulkAccountRow, str]], accounts: List):
+        try:
+            if accounts:
+                await auth_repo.batch_delete_accounts(
+                    auth_db=db_rsc, account_db=db_rsc, auths=[auth for (auth, _) in accounts])
+            await asyncio.gather(*[
+                self.__registry(global_object_storage.delete, bucket=row.email)
+                for (row, _) in claimed
+            ])
+
+        except Exception as e:
+            log.error(f'{self.__cls_name}.import_chunk [rollback_err] \
+                claimed:%s, err:%s', [row.email for (row, _) in claimed], e.__str__())
+
+
+def read_rows(path: str, fmt: str) -> Iterator[Tuple[Optional[Dict], Optional[str]]]:
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                yield ({k: v for (k, v) in row.items() if k and v not in (None, '')}, None)
+            return
+
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield (json.loads(line), None)
+            except ValueError as e:
+                yield (None, f'invalid json: {e}')
+
+
+def chunked(rows: Iterator, size: int) -> Iterator[List]:
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def load_checkpoint(path: str, source: str) -> Dict:
+    checkpoint = {
+        'source': source,
+        'rows': 0,
+        'imported': 0,
+        'existing': 0,
+        'registered': 0,
+        'invalid': 0,
+    }
+    if not os.path.exists(path):
+        return checkpoint
+
+    with open(path, encoding='utf-8') as f:
+        saved = json.load(f)
+    if saved.get('source', None) != source:
+        raise SystemExit(f'checkpoint {path} belongs to {saved.get("source", None)}, not {source}')
+
+    checkpoint.update(saved)
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: Dict):
+    checkpoint['updated_at'] = gen_timestamp()
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+async def run_import(args) -> bool:
+    source = os.path.abspath(args.source)
+    fmt = args.format or ('csv' if source.lower().endswith('.csv') else 'ndjson')
+    checkpoint_path = args.checkpoint or f'{args.source}.checkpoint.json'
+    checkpoint = load_checkpoint(checkpoint_path, source)
+    if checkpoint['rows']:
+        log.info('resume %s after %s rows', source, checkpoint['rows'])
+
+    pool = ProcessPoolExecutor(
+        max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'))
+    importer = BulkAccountImporter(
+        pool=pool,
+        workers=args.workers,
+        registry_concurrency=args.registry_concurrency,
+        resuming=checkpoint['rows'] > 0,
+        claim_lease_secs=args.claim_lease_secs,
+        publish_events=not args.no_events,
+    )
+    rejects = open(args.rejects, 'a', encoding='utf-8') if args.rejects else None
+    window: Deque[Tuple[asyncio.Task, int]] = deque()
+    failed = False
+
+    async def settle():
+        nonlocal failed
+        (task, size) = window.popleft()
+        try:
+            result = await task
+        except Exception:
+            failed = True
+            return
+
+        if failed:
+            # written, but behind a failed chunk: the rerun finds them as 'existing'
+            return
+
+        checkpoint['rows'] += size
+        for counter in ('imported', 'existing', 'registered', 'invalid'):
+            checkpoint[counter] += result[counter]
+        if rejects:
+            for reject in result['rejects']:
+                rejects.write(json.dumps(reject) + '\n')
+            rejects.flush()
+        save_checkpoint(checkpoint_path, checkpoint)
+        log.info('checkpoint: %s', checkpoint)
+
+    try:
+        offset = checkpoint['rows']
+        rows = islice(read_rows(source, fmt), offset, None)
+        for chunk in chunked(rows, args.chunk):
+            if failed:
+                break
+            task = asyncio.create_task(importer.import_chunk(chunk, offset))
+            window.append((task, len(chunk)))
+            offset += len(chunk)
+            if len(window) >= args.window:
+                await settle()
+
+        while window:
+            await settle()
+
+    finally:
+        pool.shutdown()
+        if rejects:
+            rejects.close()
+
+    if failed:
+        log.error('import stopped, rerun to resume from row %s', checkpoint['rows'])
+    return not failed
+
+
+def json_default(value: Any):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f'{type(value)} is not JSON serializable')
+
+
+def export_row(auth: Dict, account: Dict, with_credentials: bool) -> Dict:
+    row = dict(account)
+    if with_credentials:
+        for field in ('pass_hash', 'pass_salt', 'sso_id'):
+            if auth.get(field, None):
+                row[field] = auth[field]
+    return row
+
+
+async def export_segment(out, segment: int, args) -> int:
+    count = 0
+    start_key = None
+    while True:
+        (auths, start_key) = await auth_repo.scan_auths(
+            db=db_rsc, segment=segment, total_segments=args.segments,
+            start_key=start_key, limit=args.page_size)
+
+        # rows created before the account projection need the accounts table
+        aids = [auth['aid'] for auth in auths if not auth.get(ACCOUNT_PROJECTION, None)]
+        accounts = {}
+        if aids:
+            accounts = {account['aid']: account
+                        for account in await auth_repo.batch_find_accounts(db=db_rsc, aids=aids)}
+
+        for auth in auths:
+            account = auth.get(ACCOUNT_PROJECTION, None) or accounts.get(auth['aid'], None)
+            if account is None:
+                log.warning('export: auth without account, email:%s, aid:%s', auth['email'], auth['aid'])
+                continue
+            out.write(json.dumps(export_row(auth, account, args.with_credentials), default=json_default) + '\n')
+            count += 1
+
+        if not start_key:
+            return count
+
+
+async def run_export(args) -> bool:
+    # the segments share one file, lines are written within the event loop thread
+    with open(args.out, 'w', encoding='utf-8') as out:
+        counts = await asyncio.gather(*[
+            export_segment(out, segment, args) for segment in range(args.segments)
+        ])
+    log.info('exported %s accounts to %s, per segment: %s', sum(counts), args.out, counts)
+    return True
+
+
+async def run(args) -> bool:
+    importing = args.command == 'import'
+    if importing and not (S3_CONDITIONAL_WRITES or IN_MEMORY_REPOSITORIES):
+        raise SystemExit('import requires S3_CONDITIONAL_WRITES=true, '
+                         'the registry claims would race the concurrent signups')
+
+    await db_rsc.initial()
+    if importing:
+        await storage_rsc.initial()
+        if not args.no_events:
+            await event_bus_rsc.initial()
+            await failed_pub_mq_rsc.initial()
+
+    try:
+        if importing:
+            return await run_import(args)
+        return await run_export(args)
+
+    finally:
+        if importing and not args.no_events:
+            # flush the buffered events
+            await event_bus_adapter.close()
+            await failed_publish_events_dlq.close()
+            await event_bus_rsc.close()
+            await failed_pub_mq_rsc.close()
+        await db_rsc.close()
+        await storage_rsc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='bulk account import / export')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    importing = commands.add_parser('import', help='import users from NDJSON / CSV')
+    importing.add_argument('source', help='NDJSON or CSV file')
+    importing.add_argument('--format', choices=['ndjson', 'csv'], default=None, help='by file extension if omitted')
+    importing.add_argument('--checkpoint', default=None, help='default: <source>.checkpoint.json')
+    importing.add_argument('--rejects', default=None, help='append the skipped rows (NDJSON) here')
+    importing.add_argument('--chunk', type=int, default=200, help='rows per chunk')
+    importing.add_argument('--window', type=int, default=4, help='chunks in flight')
+    importing.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='password hashing processes')
+    importing.add_argument('--registry-concurrency', type=int, default=32, help='concurrent S3 registry requests')
+    importing.add_argument('--claim-lease-secs', type=int, default=300,
+                           help='on resume, reclaim the unfinished registry entries of an import older than this')
+    importing.add_argument('--no-events', action='store_true', help='do not publish the user_registration events')
+
+    exporting = commands.add_parser('export', help='export accounts to NDJSON by a parallel scan')
+    exporting.add_argument('out', help='NDJSON file')
+    exporting.add_argument('--segments', type=int, default=4, help='parallel scan segments')
+    exporting.add_argument('--page-size', type=int, default=100, help='items per scan page')
+    exporting.add_argument('--with-credentials', action='store_true', help='include pass_hash / pass_salt / sso_id')
+
+    args = parser.parse_args()
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,9 +4,42 @@ from ..infra.client import *
 from ..infra.mq import *
 from ..infra.storage.global_object_storage import GlobalObjectStorage
 from ..infra.db.nosql.event_repository import EventRepository
+from ..infra.db.nosql.idempotency_repository import IdempotencyRepository
+from ..infra.db.nosql.rate_limit_repository import RateLimitRepository
+from ..infra.db.nosql.worker_lease_repository import WorkerLeaseRepository
 from ..infra.db.nosql.auth_repository import AuthRepository
+from ..infra.db.nosql.cached_auth_repository import CachedAuthRepository
+from ..infra.memory import *
+from ..infra.cache import LRUTTLCache
+from ..infra.utils.snowflake_id import snowflake_generator
+from ..infra.utils.worker_lease import SnowflakeWorkerLease
 from ..services.auth_service import AuthService
 from ..services.alert_service import IAlertService
+from ..models.event_vos import event_compaction_key
+from .conf import (
+    ACCOUNT_CACHE_ENABLED,
+    ACCOUNT_CACHE_MAX_SIZE,
+    ACCOUNT_CACHE_TTL_SECS,
+    EMAIL_REGISTRY_CACHE_ENABLED,
+    EMAIL_REGISTRY_CACHE_MAX_SIZE,
+    EMAIL_REGISTRY_CACHE_TTL_SECS,
+    EMAIL_REGISTRY_CACHE_NEGATIVE_TTL_SECS,
+    S3_CONDITIONAL_WRITES,
+    S3_ETAG_CACHE_MAX_SIZE,
+    S3_ETAG_CACHE_TTL_SECS,
+    EVENT_BUS_LINGER_SECS,
+    EVENT_COMPACTION_ENABLED,
+    SQS_PRODUCER_LINGER_SECS,
+    IN_MEMORY_REPOSITORIES,
+    IN_MEMORY_EVENT_LOG_MAX_SIZE,
+    RATE_LIMIT_STORE,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_WINDOW_SECS,
+    EMAIL_QUEUE_ENABLED,
+    EMAIL_ENQUEUE_ONLY,
+    EMAIL_SEND_RATE_SHARED,
+    SNOWFLAKE_LEASE_SECS,
+)
 
 
 ###############################################
@@ -34,16 +67,69 @@ http_rsc: HttpResourceHandler = resource_manager.get('http')
 # client/repo/adapter
 ########################
 
-global_object_storage = GlobalObjectStorage(storage_rsc)
-event_repo = EventRepository(db_rsc)
-email_client = EmailClient(email_rsc)
+if IN_MEMORY_REPOSITORIES:
+    global_object_storage = MemoryObjectStorage()
+    event_repo = MemoryEventRepository(max_logs=IN_MEMORY_EVENT_LOG_MAX_SIZE)
+    idempotency_repo = MemoryIdempotencyRepository()
+else:
+    global_object_storage = GlobalObjectStorage(
+        storage_rsc,
+        cache=LRUTTLCache('email_registry', EMAIL_REGISTRY_CACHE_MAX_SIZE, EMAIL_REGISTRY_CACHE_TTL_SECS) \
+            if EMAIL_REGISTRY_CACHE_ENABLED else None,
+        negative_ttl_secs=EMAIL_REGISTRY_CACHE_NEGATIVE_TTL_SECS,
+        etags=LRUTTLCache('email_registry_etag', S3_ETAG_CACHE_MAX_SIZE, S3_ETAG_CACHE_TTL_SECS) \
+            if S3_CONDITIONAL_WRITES else None,
+    )
+    event_repo = EventRepository(db_rsc)
+    idempotency_repo = IdempotencyRepository(db_rsc)
+
+# per process, or shared by all instances on DynamoDB
+if RATE_LIMIT_STORE == 'dynamodb' and not IN_MEMORY_REPOSITORIES:
+    rate_limit_repo = RateLimitRepository(
+        db_rsc,
+        prev_hits=LRUTTLCache('rate_limit', RATE_LIMIT_MAX_KEYS, RATE_LIMIT_WINDOW_SECS),
+    )
+else:
+    rate_limit_repo = MemoryRateLimitRepository(max_keys=RATE_LIMIT_MAX_KEYS)
+
+email_client = EmailClient(
+    email_rsc,
+    dispatch=EMAIL_QUEUE_ENABLED,
+    enqueue_only=EMAIL_ENQUEUE_ONLY,
+    # the per second counter is only shared on DynamoDB
+    shared_rate=rate_limit_repo if EMAIL_SEND_RATE_SHARED and isinstance(rate_limit_repo, RateLimitRepository) else None,
+)
 request_client = RequestClientAdapter(http_rsc)
 # dlq(deal letter queue) for failed pub events
-failed_publish_events_dlq = SqsMqAdapter(failed_pub_mq_rsc)
+failed_publish_events_dlq = SqsMqAdapter(
+    failed_pub_mq_rsc,
+    linger_secs=SQS_PRODUCER_LINGER_SECS,
+    compaction=event_compaction_key if EVENT_COMPACTION_ENABLED else None,
+)
 # dlq(deal letter queue) for failed sub events
-failed_subscribed_events_dlq = SqsMqAdapter(failed_sub_mq_rsc)
+failed_subscribed_events_dlq = SqsMqAdapter(
+    failed_sub_mq_rsc,
+    linger_secs=SQS_PRODUCER_LINGER_SECS,
+    compaction=event_compaction_key if EVENT_COMPACTION_ENABLED else None,
+)
 # for remote events
-event_bus_adapter = EventBridgeMqAdapter(event_bus_rsc)
+event_bus_adapter = EventBridgeMqAdapter(
+    event_bus_rsc,
+    linger_secs=EVENT_BUS_LINGER_SECS,
+    compaction=event_compaction_key if EVENT_COMPACTION_ENABLED else None,
+)
+
+# snowflake worker id of this process, started on app startup
+worker_lease_repo = MemoryWorkerLeaseRepository() if IN_MEMORY_REPOSITORIES else WorkerLeaseRepository(db_rsc)
+snowflake_lease = SnowflakeWorkerLease(worker_lease_repo, snowflake_generator, SNOWFLAKE_LEASE_SECS)
+
+# shared by all services, so the cache invalidation is shared too
+auth_repo = MemoryAuthRepository() if IN_MEMORY_REPOSITORIES else AuthRepository()
+if ACCOUNT_CACHE_ENABLED:
+    auth_repo = CachedAuthRepository(
+        auth_repo=auth_repo,
+        account_cache=LRUTTLCache('account', ACCOUNT_CACHE_MAX_SIZE, ACCOUNT_CACHE_TTL_SECS),
+    )
 
 fb_login_repo = FBLoginRepository(request_client)
 google_login_repo = GoogleLoginRepository(request_client)
@@ -56,7 +142,7 @@ google_login_repo = GoogleLoginRepository(request_client)
 # TODO: implement & DI(connect resources)
 alert_svc = IAlertService()
 auth_svc = AuthService(
-    auth_repo=AuthRepository(),
+    auth_repo=auth_repo,
     obj_storage=global_object_storage,
     email=email_client,
 )
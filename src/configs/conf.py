@@ -7,8 +7,54 @@ STAGE = os.getenv("STAGE", "dev")
 LOCAL_REGION = os.getenv("AWS_REGION", "ap-northeast-1")
 MIN_PASSWORD_LENGTH = int(os.getenv("MIN_PASSWORD_LENGTH", 6))
 
+# password hashing conf
+# scheme: 'scrypt' | 'pbkdf2_sha256' | 'sha224'(legacy)
+PWD_HASH_SCHEME = os.getenv("PWD_HASH_SCHEME", "scrypt")
+PWD_HASH_WORKERS = int(os.getenv("PWD_HASH_WORKERS", os.cpu_count() or 1))
+PWD_PBKDF2_ITERATIONS = int(os.getenv("PWD_PBKDF2_ITERATIONS", 600000))
+PWD_SCRYPT_N = int(os.getenv("PWD_SCRYPT_N", 2 ** 14))
+PWD_SCRYPT_R = int(os.getenv("PWD_SCRYPT_R", 8))
+PWD_SCRYPT_P = int(os.getenv("PWD_SCRYPT_P", 1))
+
+# snowflake id: worker id (0 ~ 511) of this process, leased from TABLE_WORKER_LEASE if not given
+SNOWFLAKE_WORKER_ID = os.getenv("SNOWFLAKE_WORKER_ID", None)
+SNOWFLAKE_LEASE_ENABLED = os.getenv('SNOWFLAKE_LEASE_ENABLED', 'true').lower() == 'true'
+SNOWFLAKE_LEASE_SECS = int(os.getenv('SNOWFLAKE_LEASE_SECS', 300))
+
+# per-stage latency histograms (login/signup/repositories/storage/email)
+TIMING_ENABLED = os.getenv('TIMING_ENABLED', 'true').lower() == 'true'
+# return the stages of every request in the Server-Timing response header (debugging only);
+# otherwise only the requests carrying the metrics token get it
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', 'false').lower() == 'true'
+# internal metrics route, required in the x-metrics-token header; the route is disabled (404) without it
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', None)
+# service-to-service routes (e.g. /accounts/batch), required in the x-internal-token header;
+# the routes are disabled (404) without it
+INTERNAL_API_TOKEN = os.getenv('INTERNAL_API_TOKEN', None)
+
+# dict-backed repositories/storage instead of DynamoDB/S3 (local load testing/profiling only,
+# the data is per process and lost on exit); SES/SQS/EventBridge are still the real ones
+IN_MEMORY_REPOSITORIES = os.getenv('IN_MEMORY_REPOSITORIES', 'false').lower() == 'true'
+IN_MEMORY_EVENT_LOG_MAX_SIZE = int(os.getenv('IN_MEMORY_EVENT_LOG_MAX_SIZE', 10000))
+
 # probe cycle secs
 PROBE_CYCLE_SECS = int(os.getenv("PROBE_CYCLE_SECS", 3))
+# adaptive probing: skip warm resources, back off up to PROBE_MAX_CYCLE_SECS while healthy
+PROBE_ADAPTIVE = os.getenv('PROBE_ADAPTIVE', 'true').lower() == 'true'
+PROBE_MAX_CYCLE_SECS = int(os.getenv('PROBE_MAX_CYCLE_SECS', 60))
+PROBE_TIMEOUT_SECS = float(os.getenv('PROBE_TIMEOUT_SECS', 10))
+PROBE_REPORT_SECS = int(os.getenv('PROBE_REPORT_SECS', 300))
+
+# resource initialization at startup / cold start
+RESOURCE_PARALLEL_INIT = os.getenv('RESOURCE_PARALLEL_INIT', 'true').lower() == 'true'
+# startup doesn't wait longer for the eager resources, the slow ones keep connecting in background
+RESOURCE_INIT_DEADLINE_SECS = float(os.getenv('RESOURCE_INIT_DEADLINE_SECS', 5))
+# resources initialized on first use (names of resource_manager)
+RESOURCE_LAZY_INIT = set([
+    name.strip() for name in
+    os.getenv('RESOURCE_LAZY_INIT', 'email,event_bus,failed_pub_mq_rsc,failed_sub_mq_rsc').split(',')
+    if name.strip()
+])
 
 # cache conf
 TOKEN_EXPIRE_TIME = int(os.getenv('TOKEN_EXPIRE_TIME', 60 * 60 * 24 * 30))
@@ -17,6 +63,10 @@ TOKEN_EXPIRE_TIME = int(os.getenv('TOKEN_EXPIRE_TIME', 60 * 60 * 24 * 30))
 DDB_CONNECT_TIMEOUT = int(os.getenv("DDB_CONNECT_TIMEOUT", 20))
 DDB_READ_TIMEOUT = int(os.getenv("DDB_READ_TIMEOUT", 30))
 DDB_MAX_ATTEMPTS = int(os.getenv("DDB_MAX_ATTEMPTS", 5))
+# connections per botocore client (botocore default: 10)
+DDB_MAX_POOL_CONNECTIONS = int(os.getenv("DDB_MAX_POOL_CONNECTIONS", 50))
+# > 1: the calls are spread over N clients (least in-flight calls first)
+DDB_CLIENT_POOL_SIZE = int(os.getenv("DDB_CLIENT_POOL_SIZE", 1))
 DDB_PREFIX = os.getenv('DDB_PREFIX', '') # ft_dev_
 
 # db table conf
@@ -24,11 +74,50 @@ TABLE_AUTH = DDB_PREFIX + os.getenv('TABLE_AUTH', 'auth')
 TABLE_ACCOUNT = DDB_PREFIX + os.getenv('TABLE_ACCOUNT', 'accounts')
 TABLE_ACCOUNT_INDEX = DDB_PREFIX + os.getenv('TABLE_ACCOUNT_INDEX', 'account_indexs')
 BATCH_LIMIT = int(os.getenv('BATCH_LIMIT', '20'))
+# write a copy of the account row into the auth row on create_account
+ACCOUNT_PROJECTION_ENABLED = os.getenv('ACCOUNT_PROJECTION_ENABLED', 'true').lower() == 'true'
+BATCH_MAX_RETRY = int(os.getenv('BATCH_MAX_RETRY', 5))
+BATCH_RETRY_DELAY_SECS = float(os.getenv('BATCH_RETRY_DELAY_SECS', 0.05))
+BATCH_MAX_KEYS_PER_REQUEST = int(os.getenv('BATCH_MAX_KEYS_PER_REQUEST', 100))
+
+# account cache conf (read-through cache in front of the accounts table; the auth rows are never cached)
+ACCOUNT_CACHE_ENABLED = os.getenv('ACCOUNT_CACHE_ENABLED', 'true').lower() == 'true'
+ACCOUNT_CACHE_MAX_SIZE = int(os.getenv('ACCOUNT_CACHE_MAX_SIZE', 10000))
+ACCOUNT_CACHE_TTL_SECS = float(os.getenv('ACCOUNT_CACHE_TTL_SECS', 60))
 
 # db log table conf
 TABLE_EVENT = DDB_PREFIX + os.getenv('TABLE_EVENT', 'auth_event')
 TABLE_EVENT_LOG = DDB_PREFIX + os.getenv('TABLE_EVENT_LOG', 'auth_event_log')
 MAX_RETRY = int(os.getenv('MAX_RETRY', 3))
+TABLE_WORKER_LEASE = DDB_PREFIX + os.getenv('TABLE_WORKER_LEASE', 'auth_worker_lease')
+
+# idempotency of the subscribed events (dedupe by event_id before the business logic)
+IDEMPOTENCY_ENABLED = os.getenv('IDEMPOTENCY_ENABLED', 'true').lower() == 'true'
+TABLE_EVENT_IDEMPOTENCY = DDB_PREFIX + os.getenv('TABLE_EVENT_IDEMPOTENCY', 'auth_event_idempotency')
+# a claim in progress expires after the lease (the worker died), then the event can be processed again
+IDEMPOTENCY_LEASE_SECS = int(os.getenv('IDEMPOTENCY_LEASE_SECS', 120))
+# processed event_ids are kept (DynamoDB TTL on expires_at) longer than any redelivery
+IDEMPOTENCY_TTL_SECS = int(os.getenv('IDEMPOTENCY_TTL_SECS', 60 * 60 * 24 * 7))
+IDEMPOTENCY_CACHE_MAX_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_MAX_SIZE', 10000))
+IDEMPOTENCY_CACHE_TTL_SECS = float(os.getenv('IDEMPOTENCY_CACHE_TTL_SECS', 60 * 60))
+
+# rate limit of /login, /signup, /sendcode/email (checked before any downstream call)
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+# 'memory': per process, 'dynamodb': shared by all instances (TABLE_RATE_LIMIT)
+RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', 'memory')
+TABLE_RATE_LIMIT = DDB_PREFIX + os.getenv('TABLE_RATE_LIMIT', 'auth_rate_limit')
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))
+# requests per RATE_LIMIT_WINDOW_SECS (sliding window), per client ip / per email
+RATE_LIMIT_WINDOW_SECS = int(os.getenv('RATE_LIMIT_WINDOW_SECS', 60))
+RATE_LIMIT_LOGIN_PER_IP = int(os.getenv('RATE_LIMIT_LOGIN_PER_IP', 60))
+RATE_LIMIT_LOGIN_PER_EMAIL = int(os.getenv('RATE_LIMIT_LOGIN_PER_EMAIL', 10))
+RATE_LIMIT_SIGNUP_PER_IP = int(os.getenv('RATE_LIMIT_SIGNUP_PER_IP', 20))
+RATE_LIMIT_SIGNUP_PER_EMAIL = int(os.getenv('RATE_LIMIT_SIGNUP_PER_EMAIL', 5))
+RATE_LIMIT_SENDCODE_PER_IP = int(os.getenv('RATE_LIMIT_SENDCODE_PER_IP', 10))
+RATE_LIMIT_SENDCODE_PER_EMAIL = int(os.getenv('RATE_LIMIT_SENDCODE_PER_EMAIL', 3))
+# admission control of this instance (token bucket, all the limited routes), 0: disabled
+RATE_LIMIT_GLOBAL_RPS = float(os.getenv('RATE_LIMIT_GLOBAL_RPS', 200))
+RATE_LIMIT_GLOBAL_BURST = int(os.getenv('RATE_LIMIT_GLOBAL_BURST', 400))
 
 # s3 conf
 FT_BUCKET = os.getenv('FT_BUCKET', 'foreign-teacher')
@@ -37,12 +126,30 @@ S3_CONNECT_TIMEOUT = int(os.getenv("S3_CONNECT_TIMEOUT", 10))
 S3_READ_TIMEOUT = int(os.getenv("S3_READ_TIMEOUT", 10))
 S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", 3))
 
+# email registry: create-if-absent/compare-and-swap via S3 conditional writes (If-None-Match/If-Match)
+S3_CONDITIONAL_WRITES = os.getenv('S3_CONDITIONAL_WRITES', 'false').lower() == 'true'
+S3_ETAG_CACHE_MAX_SIZE = int(os.getenv('S3_ETAG_CACHE_MAX_SIZE', 10000))
+S3_ETAG_CACHE_TTL_SECS = float(os.getenv('S3_ETAG_CACHE_TTL_SECS', 300))
+
+# email registry (email_info.json) cache conf
+EMAIL_REGISTRY_CACHE_ENABLED = os.getenv('EMAIL_REGISTRY_CACHE_ENABLED', 'true').lower() == 'true'
+EMAIL_REGISTRY_CACHE_MAX_SIZE = int(os.getenv('EMAIL_REGISTRY_CACHE_MAX_SIZE', 10000))
+EMAIL_REGISTRY_CACHE_TTL_SECS = float(os.getenv('EMAIL_REGISTRY_CACHE_TTL_SECS', 30))
+# short, another region/container may register the email meanwhile
+EMAIL_REGISTRY_CACHE_NEGATIVE_TTL_SECS = float(os.getenv('EMAIL_REGISTRY_CACHE_NEGATIVE_TTL_SECS', 3))
+
 # connection
 # http
 HTTP_TIMEOUT = float(os.getenv("TIMEOUT", 10.0))
 HTTP_MAX_CONNECTS = int(os.getenv("MAX_CONNECTS", 20))
 HTTP_MAX_KEEPALIVE_CONNECTS = int(os.getenv("MAX_KEEPALIVE_CONNECTS", 10))
 HTTP_KEEPALIVE_EXPIRY = float(os.getenv("KEEPALIVE_EXPIRY", 30.0))
+# one shared client (connection pool) for all hosts, instead of one client per domain
+HTTP_SHARED_POOL = os.getenv('HTTP_SHARED_POOL', 'true').lower() == 'true'
+# HTTP/2 multiplexing on https hosts (requires h2, httpx[http2])
+HTTP2_ENABLED = os.getenv('HTTP2_ENABLED', 'true').lower() == 'true'
+# concurrent requests per host in the shared pool (connections under HTTP/1.1)
+HTTP_MAX_CONNECTS_PER_HOST = int(os.getenv('HTTP_MAX_CONNECTS_PER_HOST', 10))
 
 # FB App conf
 FACEBOOK_APP_ID = os.getenv('FACEBOOK_APP_ID', '829288179205024')
@@ -63,12 +170,40 @@ FRONTEND_RESET_PASSWORD_URL = os.getenv('FRONTEND_RESET_PASSWORD_URL', 'https://
 SES_CONNECT_TIMEOUT = int(os.getenv("SES_CONNECT_TIMEOUT", 10))
 SES_READ_TIMEOUT = int(os.getenv("SES_READ_TIMEOUT", 10))
 SES_MAX_ATTEMPTS = int(os.getenv("SES_MAX_ATTEMPTS", 3))
+# send queue in front of SES: workers paced at MaxSendRate (GetSendQuota) * EMAIL_SEND_RATE_RATIO
+EMAIL_QUEUE_ENABLED = os.getenv('EMAIL_QUEUE_ENABLED', 'true').lower() == 'true'
+EMAIL_QUEUE_MAX_SIZE = int(os.getenv('EMAIL_QUEUE_MAX_SIZE', 1000))
+EMAIL_QUEUE_WORKERS = int(os.getenv('EMAIL_QUEUE_WORKERS', 4))
+# msgs/sec until the quota is known (SES sandbox: 1)
+EMAIL_SEND_RATE = float(os.getenv('EMAIL_SEND_RATE', 1))
+EMAIL_SEND_RATE_RATIO = float(os.getenv('EMAIL_SEND_RATE_RATIO', 0.9))
+# the SES quota is per account: each process paces at the rate / EMAIL_SEND_INSTANCES
+# (the expected concurrent containers), or all of them share one counter
+# in the rate limit store with EMAIL_SEND_RATE_SHARED (RATE_LIMIT_STORE=dynamodb)
+EMAIL_SEND_INSTANCES = int(os.getenv('EMAIL_SEND_INSTANCES', 1))
+EMAIL_SEND_RATE_SHARED = os.getenv('EMAIL_SEND_RATE_SHARED', 'false').lower() == 'true'
+EMAIL_QUOTA_REFRESH_SECS = float(os.getenv('EMAIL_QUOTA_REFRESH_SECS', 300))
+# throttled sends, retried with full jitter backoff
+EMAIL_MAX_RETRY = int(os.getenv('EMAIL_MAX_RETRY', 3))
+EMAIL_RETRY_BASE_SECS = float(os.getenv('EMAIL_RETRY_BASE_SECS', 0.2))
+# the kinds returned as soon as enqueued: conform_code,reset_password,contact
+# (long-running containers only, a frozen Lambda sends them on its next invocation);
+# the other kinds wait for the emails queued before theirs: a backlog of
+# EMAIL_QUEUE_MAX_SIZE at the send rate can outlast the API Gateway timeout (29s)
+EMAIL_ENQUEUE_ONLY = set([
+    kind.strip() for kind in
+    os.getenv('EMAIL_ENQUEUE_ONLY', '').split(',') if kind.strip()
+])
 
 
 # event bus conf
 EVENT_BUS_NAME = os.getenv('EVENT_BUS_NAME', 'default')
 EVENT_SOURCE = os.getenv('EVENT_SOURCE', 'ft.test')
 EVENT_DETAIL_TYPE = os.getenv('EVENT_DETAIL_TYPE', 'TestEvent')
+# > 0: coalesce events into put_events batches (10 entries / 256KB), 0: one put_events per event
+EVENT_BUS_LINGER_SECS = float(os.getenv('EVENT_BUS_LINGER_SECS', 0.05))
+# collapse the pending update_password events of a user into the newest one (buffers & DLQ batches)
+EVENT_COMPACTION_ENABLED = os.getenv('EVENT_COMPACTION_ENABLED', 'true').lower() == 'true'
 
 # sqs/event bus conf
 MQ_CONNECT_TIMEOUT = int(os.getenv("MQ_CONNECT_TIMEOUT", 10))
@@ -82,3 +217,13 @@ SQS_P_QUEUE_URL = os.getenv('SQS_P_QUEUE_URL', 'https://sqs.ap-southeast-1.amazo
 SQS_S_QUEUE_URL = os.getenv('SQS_S_QUEUE_URL', 'https://sqs.ap-southeast-1.amazonaws.com/549734764220/FT_DLQ_TEST')
 SQS_MAX_MESSAGES = int(os.getenv('SQS_MAX_MESSAGES', 10))
 SQS_WAIT_SECS = int(os.getenv('SQS_WAIT_SECS', 20))
+# > 0: coalesce DLQ writes into send_message_batch calls (10 msgs / 256KB), 0: one send_message per msg
+SQS_PRODUCER_LINGER_SECS = float(os.getenv('SQS_PRODUCER_LINGER_SECS', 0.05))
+# messages processed in parallel by a consumer
+SQS_CONSUMER_CONCURRENCY = int(os.getenv('SQS_CONSUMER_CONCURRENCY', 10))
+# in-flight messages are extended every SQS_VISIBILITY_TIMEOUT / 2 secs
+SQS_VISIBILITY_TIMEOUT = int(os.getenv('SQS_VISIBILITY_TIMEOUT', 30))
+# acked messages are deleted right after their handler, coalesced into delete_message_batch calls
+SQS_DELETE_LINGER_SECS = float(os.getenv('SQS_DELETE_LINGER_SECS', 0.05))
+# remote events processed in parallel by the Lambda entry (main.event_handler)
+INGEST_CONCURRENCY = int(os.getenv('INGEST_CONCURRENCY', 10))
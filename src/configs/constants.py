@@ -27,6 +27,9 @@ VALID_ROLES = set(['company', 'teacher'])
 
 DYNAMODB_KEYWORDS = set(['role', 'region'])
 
+# denormalized copy of the account row, kept on the auth row (email -> account in one read)
+ACCOUNT_PROJECTION = 'account_projection'
+
 class AccountType(str, Enum):
     FT = 'ft'
     FB = 'fb'
@@ -37,6 +40,8 @@ class PubEventStatus(Enum):
     READY = 'ready'
     PUBLISHED = 'published'
     PUB_FAILED = 'pub_failed'
+    # superseded by a newer event of the same key (compaction), not published
+    COALESCED = 'coalesced'
 
 
 class SubEventStatus(Enum):
@@ -45,6 +50,11 @@ class SubEventStatus(Enum):
     SUB_FAILED = 'sub_failed'
 
 
+class IdempotencyStatus(Enum):
+    IN_PROGRESS = 'in_progress'
+    COMPLETED = 'completed'
+
+
 
 # event types
 class BusinessEventType(Enum):
@@ -1,6 +1,7 @@
 from ....configs.conf import MAX_RETRY
 from ....configs.constants import PubEventStatus
 from ....models.event_vos import PubEventDetailVO
+from ....infra.mq import COALESCED
 from ....configs.adapters import (
     event_bus_adapter as event_bus,
     event_repo,
@@ -29,14 +30,22 @@ async def publish_remote_event(event: PubEventDetailVO):
         event.ready()
         log.info('publish_remote_event: %s, status: %s',
                  event.dict(), event.status.value)
-        await event_bus.publish_message(event.payload())
+        result = await event_bus.publish_message(event.payload())
+        if result == COALESCED:
+            # a newer event of the same key is published instead
+            event.coalesced()
+            await event_repo.append_pub_event_log(event)
+            log.info('publish_remote_event: %s, status: %s',
+                     event.dict(), event.status.value)
+            return
+
         event.published()
         await event_repo.append_pub_event_log(event)
         log.info('publish_remote_event: %s, status: %s',
                  event.dict(), event.status.value)
 
     except Exception as e:
-        if event.status == PubEventStatus.PUBLISHED:
+        if event.status in (PubEventStatus.PUBLISHED, PubEventStatus.COALESCED):
             log.warning('publish success but append log fail. event: %s',
                         event.dict())
             await alert_svc.exception_alert('[pub] event log writing fail.', e)
@@ -0,0 +1,127 @@
+import uuid
+from typing import Any, Dict, Optional
+from ...configs.constants import IdempotencyStatus
+from ...repositories.idempotency_repository import IIdempotencyRepository
+from ...infra.cache import LRUTTLCache
+import logging
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+'''
+dedupe of the subscribed events by event_id, before any business logic:
+
+- recently completed event_ids are kept in memory (cache), no IO for those duplicates
+- the events in flight in this process are known locally as well
+- otherwise a conditional put claims the event_id in DynamoDB (leased),
+  the claim is completed (kept for the TTL) or released (retry allowed) after the handler
+
+the event_id is kept through the retries (DLQ), so a failed event is released, not completed;
+if DynamoDB fails, the event is processed anyway (the business logic has its own conditions)
+'''
+class EventIdempotency:
+    def __init__(
+        self,
+        scope: str,
+        repo: IIdempotencyRepository,
+        cache: LRUTTLCache,
+        lease_secs: int,
+        ttl_secs: int,
+    ):
+        self.scope = scope
+        self.repo = repo
+        self.cache = cache
+        self.lease_secs = lease_secs
+        self.ttl_secs = ttl_secs
+        self.inflight: Dict[str, str] = {}  # key -> owner
+        self.metrics = {
+            'checks': 0,
+            'claims': 0,
+            'local_hits': 0,      # completed, found in memory
+            'remote_hits': 0,     # completed, found in DynamoDB
+            'in_progress_hits': 0,  # processed by another worker right now
+            'completes': 0,
+            'releases': 0,
+            'errors': 0,
+        }
+
+    def key(self, event_id: Any) -> str:
+        return f'{self.scope}#{event_id}'
+
+    # None: claimed, go on with the business logic; otherwise the status of the duplicate
+    async def claim(self, event_id: Any) -> Optional[IdempotencyStatus]:
+        key = self.key(event_id)
+        self.metrics['checks'] += 1
+        if self.cache.get(key, False):
+            self.metrics['local_hits'] += 1
+            return IdempotencyStatus.COMPLETED
+
+        if key in self.inflight:
+            self.metrics['in_progress_hits'] += 1
+            return IdempotencyStatus.IN_PROGRESS
+
+        owner = self.inflight[key] = uuid.uuid4().hex
+        try:
+            status = await self.repo.claim(key, owner, self.lease_secs)
+
+        except Exception as e:
+            self.metrics['errors'] += 1
+            log.error('EventIdempotency[%s]: claim error, process anyway, key: %s, err: %s',
+                      self.scope, key, e)
+            status = None
+
+        if status is None:
+            self.metrics['claims'] += 1
+            return None
+
+        self.inflight.pop(key, None)
+        if status == IdempotencyStatus.COMPLETED:
+            self.metrics['remote_hits'] += 1
+            self.cache.set(key, True)
+        else:
+            self.metrics['in_progress_hits'] += 1
+
+        return status
+
+    async def complete(self, event_id: Any):
+        key = self.key(event_id)
+        owner = self.inflight.pop(key, None)
+        self.cache.set(key, True)
+        self.metrics['completes'] += 1
+        if owner is None:
+            return
+
+        try:
+            await self.repo.complete(key, owner, self.ttl_secs)
+
+        except Exception as e:
+            self.metrics['errors'] += 1
+            log.error('EventIdempotency[%s]: complete error, key: %s, err: %s',
+                      self.scope, key, e)
+
+    async def release(self, event_id: Any):
+        key = self.key(event_id)
+        owner = self.inflight.pop(key, None)
+        self.metrics['releases'] += 1
+        if owner is None:
+            return
+
+        try:
+            await self.repo.release(key, owner)
+
+        except Exception as e:
+            # the lease expires anyway
+            self.metrics['errors'] += 1
+            log.error('EventIdempotency[%s]: release error, key: %s, err: %s',
+                      self.scope, key, e)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.metrics['local_hits'] + self.metrics['remote_hits'] + self.metrics['in_progress_hits']
+        return {
+            **self.metrics,
+            'dedupe_hits': hits,
+            'dedupe_ratio': round(hits / self.metrics['checks'], 4) if self.metrics['checks'] else 0.0,
+            'inflight': len(self.inflight),
+            'cache': self.cache.stats(),
+        }
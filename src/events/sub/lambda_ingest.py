@@ -0,0 +1,119 @@
+import json
+import asyncio
+from typing import Any, Dict, List, Optional
+from .sub_event_manager import SubscribeEventManager, sub_remote_event_manager
+from ...configs.conf import LOCAL_REGION, INGEST_CONCURRENCY
+import logging
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+'''
+Lambda-native entry of the remote region events, no API Gateway / FastAPI in between:
+
+- EventBridge: the rule invokes the function with one event,
+  a failure raises so that Lambda retries it (async invocation)
+- SQS (a queue targeted by the rule): a batch of EventBridge events,
+  the records are processed concurrently (INGEST_CONCURRENCY),
+  the ones not done are returned as batchItemFailures (ReportBatchItemFailures)
+  and received again, the others are deleted by Lambda
+
+an event is done once its handler acks it (completed, or sent to the DLQ for retry),
+the same contract as the DLQ consumers (SqsMqAdapter)
+'''
+class LambdaEventIngestor:
+    def __init__(self, manager: SubscribeEventManager, concurrency: int = INGEST_CONCURRENCY):
+        self.manager = manager
+        self.concurrency = concurrency
+
+    async def ingest(self, event: Dict) -> Dict:
+        if 'Records' in event:
+            return await self.ingest_records(event['Records'])
+
+        if 'detail' in event:
+            return await self.ingest_event(event)
+
+        log.warning('LambdaEventIngestor: unknown event, keys: %s', list(event.keys()))
+        return {}
+
+    # EventBridge -> Lambda
+    async def ingest_event(self, event: Dict) -> Dict:
+        if not await self.__process(event.get('detail', None), event.get('id', None)):
+            raise Exception('remote_event_not_processed')
+
+        return {}
+
+    # EventBridge -> SQS -> Lambda
+    async def ingest_records(self, records: List[Dict]) -> Dict:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*[
+            self.__process_record(semaphore, record) for record in records
+        ])
+        failures = [
+            {'itemIdentifier': record['messageId']}
+            for (record, done) in zip(records, results) if not done
+        ]
+        log.info('LambdaEventIngestor: records: %s, failures: %s',
+                 len(records), len(failures))
+        return {'batchItemFailures': failures}
+
+    async def __process_record(self, semaphore: asyncio.Semaphore, record: Dict) -> bool:
+        async with semaphore:
+            message_id = record.get('messageId', None)
+            try:
+                body = json.loads(record['body'])
+            except Exception as e:
+                # malformed, redelivery won't help
+                log.error('LambdaEventIngestor: invalid record body, msg ID: %s, error: %s',
+                          message_id, e)
+                return True
+
+            # the EventBridge envelope (rule target), or the event detail itself
+            detail = body.get('detail', None) if 'detail' in body else body
+            return await self.__process(detail, message_id)
+
+    # True: done (acked or nothing to do), False: to be retried
+    async def __process(self, detail: Optional[Dict], msg_id: Any) -> bool:
+        if not detail:
+            log.info('LambdaEventIngestor: remote event detail is empty, ID: %s', msg_id)
+            return True
+
+        region = detail.get('region', None)
+        if region == LOCAL_REGION:
+            log.info('LambdaEventIngestor: remote event is from local region, ID: %s', msg_id)
+            return True
+
+        event_type = detail.get('event_type', None)
+        if not event_type in self.manager.handlers:
+            log.info('LambdaEventIngestor: no handler for event_type: %s, ID: %s',
+                     event_type, msg_id)
+            return True
+
+        acked = False
+
+        async def ack():
+            nonlocal acked
+            acked = True
+
+        try:
+            await self.manager.subscribe_event({**detail, 'ack': ack})
+
+        except Exception as e:
+            log.error('LambdaEventIngestor: process event error: %s, ID: %s, event_id: %s',
+                      e.__str__(), msg_id, detail.get('event_id', None))
+            return False
+
+        if not acked:
+            log.warning('LambdaEventIngestor: event not acked, ID: %s, event_id: %s',
+                        msg_id, detail.get('event_id', None))
+        return acked
+
+
+remote_event_ingestor = LambdaEventIngestor(sub_remote_event_manager)
+
+
+# the event loop is kept between invocations, with the clients bound to it
+def lambda_handler(event: Dict, context: Any) -> Dict:
+    loop = asyncio.get_event_loop()
+    return loop.run_until_complete(remote_event_ingestor.ingest(event))
@@ -1,8 +1,18 @@
 import json
-from typing import Dict, Callable
-from ...configs.constants import BusinessEventType
+from typing import Dict, Callable, Optional
+from ...configs.conf import (
+    IDEMPOTENCY_ENABLED,
+    IDEMPOTENCY_LEASE_SECS,
+    IDEMPOTENCY_TTL_SECS,
+    IDEMPOTENCY_CACHE_MAX_SIZE,
+    IDEMPOTENCY_CACHE_TTL_SECS,
+)
+from ...configs.constants import BusinessEventType, SubEventStatus, IdempotencyStatus
 from ...configs.exceptions import ServerException
+from ...configs.adapters import idempotency_repo
+from ...infra.cache import LRUTTLCache
 from ...models.event_vos import SubEventDetailVO
+from .idempotency import EventIdempotency
 from .event import *
 from ..pub.event.publish_remote_events import *
 import logging
@@ -12,9 +22,10 @@ log = logging.getLogger(__name__)
 
 
 class SubscribeEventManager:
-    def __init__(self, label: str, handlers: Dict[str, Callable]):
+    def __init__(self, label: str, handlers: Dict[str, Callable], idempotency: Optional[EventIdempotency] = None):
         self.label = label
         self.handlers = handlers
+        self.idempotency = idempotency
 
     async def subscribe_event(self, event_detail: Dict):
         if not len(self.handlers):
@@ -32,13 +43,45 @@ class SubscribeEventManager:
                 return
 
             sub_event = SubEventDetailVO.parse_obj(event_detail)
-            await self.handlers[event_type](sub_event)
+            if self.idempotency is None:
+                await self.handlers[event_type](sub_event)
+                return
+
+            await self.__subscribe_once(self.handlers[event_type], sub_event)
 
         except Exception as e:
             log.error('[%s]: subscribe_event error: %s',
                       self.label, e.__str__())
             raise e
 
+    '''
+    duplicates are short-circuited before the handler:
+    - completed already: acked, nothing to do
+    - in progress elsewhere: not acked, delivered again later (the other one may fail)
+    '''
+    async def __subscribe_once(self, handler: Callable, sub_event: SubEventDetailVO):
+        duplicate = await self.idempotency.claim(sub_event.event_id)
+        if duplicate == IdempotencyStatus.COMPLETED:
+            log.info('[%s]: duplicate event, completed already. event_id: %s',
+                     self.label, sub_event.event_id)
+            await sub_event.call_ack()
+            return
+
+        if duplicate == IdempotencyStatus.IN_PROGRESS:
+            log.info('[%s]: duplicate event, in progress. event_id: %s',
+                     self.label, sub_event.event_id)
+            return
+
+        try:
+            await handler(sub_event)
+
+        finally:
+            # failed ones are retried (DLQ) with the same event_id
+            if sub_event.status == SubEventStatus.COMPLETED:
+                await self.idempotency.complete(sub_event.event_id)
+            else:
+                await self.idempotency.release(sub_event.event_id)
+
     def get(self, event_detail: Dict, key: str):
         if not key in event_detail:
             log.error('[%s]: "%s" is not in event_detail: \n%s',
@@ -48,6 +91,16 @@ class SubscribeEventManager:
         return event_detail[key]
 
 
+# the remote events and their retries (sub DLQ) share the same event_ids
+sub_event_idempotency = EventIdempotency(
+    'sub',
+    idempotency_repo,
+    LRUTTLCache('sub_event_idempotency', IDEMPOTENCY_CACHE_MAX_SIZE, IDEMPOTENCY_CACHE_TTL_SECS),
+    lease_secs=IDEMPOTENCY_LEASE_SECS,
+    ttl_secs=IDEMPOTENCY_TTL_SECS,
+) if IDEMPOTENCY_ENABLED else None
+
+
 # Subscribe EventBridge from remote regions
 sub_remote_event_manager = SubscribeEventManager(
     'Subscribe event bus from remote regions',
@@ -56,7 +109,8 @@ sub_remote_event_manager = SubscribeEventManager(
         # TODO: pending...
         # BusinessEventType.USER_LOGIN.value: None,
         BusinessEventType.UPDATE_PASSWORD.value: subscribe_update_password,
-    })
+    },
+    idempotency=sub_event_idempotency)
 
 
 # Subscribe SQS for retry failed subscribe events (DEAL LETTER QUEUE)
@@ -68,7 +122,8 @@ retry_sub_event_manager = SubscribeEventManager(
         # TODO: pending...
         # BusinessEventType.USER_LOGIN.value: None,
         BusinessEventType.UPDATE_PASSWORD.value: subscribe_update_password,
-    })
+    },
+    idempotency=sub_event_idempotency)
 
 
 # Subscribe SQS for retry failed publish events (DEAL LETTER QUEUE)
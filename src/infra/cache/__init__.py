@@ -0,0 +1 @@
+from .lru_ttl_cache import LRUTTLCache
@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUTTLCache:
+    '''
+    bounded in-process cache: LRU eviction + per-entry TTL
+    NOTE: designed for the single asyncio event loop, no lock is needed
+    '''
+
+    def __init__(self, label: str, max_size: int, ttl_secs: float):
+        self.label = label
+        self.max_size = max(1, int(max_size))
+        self.ttl_secs = float(ttl_secs)
+        self.__entries: OrderedDict = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key: Hashable):
+        return self.__lookup(key) is not None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.__lookup(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self.__entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl_secs: Optional[float] = None):
+        ttl = self.ttl_secs if ttl_secs is None else float(ttl_secs)
+        if ttl <= 0:
+            self.invalidate(key)
+            return
+
+        self.__entries[key] = (time.monotonic() + ttl, value)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        return self.__entries.pop(key, None) is not None
+
+    def clear(self):
+        self.__entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'label': self.label,
+            'size': len(self.__entries),
+            'max_size': self.max_size,
+            'ttl_secs': self.ttl_secs,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def __lookup(self, key: Hashable):
+        entry = self.__entries.get(key, None)
+        if entry is None:
+            return None
+
+        if entry[0] <= time.monotonic():
+            del self.__entries[key]
+            self.expirations += 1
+            return None
+
+        return entry
@@ -1,172 +1,213 @@
+from typing import Dict, Optional, Set
 from pydantic import EmailStr
 from botocore.exceptions import ClientError
 from ...configs.exceptions import *
 from ...configs.conf import *
 from ...infra.resources.handlers.email_resource import SESResourceHandler
+from ...infra.utils.timing import timed
+from ...repositories.rate_limit_repository import IRateLimitRepository
+from .email_dispatcher import EmailDispatcher
 import logging as log
 
 log.basicConfig(filemode='w', level=log.INFO)
 
 
+'''
+dispatch(optional): the emails go through the EmailDispatcher queue
+(paced at the SES send rate, throttling retried), otherwise send_email is called inline;
+enqueue_only: the kinds ('conform_code', 'reset_password', 'contact')
+returned as soon as they are enqueued, the send errors are only logged;
+the others wait behind the queued emails (see EMAIL_ENQUEUE_ONLY)
+shared_rate(optional): the send rate is shared by the instances through this store
+'''
 class EmailClient:
-    def __init__(self, ses: SESResourceHandler):
+    def __init__(
+        self,
+        ses: SESResourceHandler,
+        dispatch: bool = False,
+        enqueue_only: Set[str] = set(),
+        shared_rate: Optional[IRateLimitRepository] = None,
+    ):
         self.ses = ses
+        self.enqueue_only = enqueue_only
+        self.dispatcher: Optional[EmailDispatcher] = None
+        if dispatch:
+            self.dispatcher = EmailDispatcher(
+                'ses',
+                send=self.__send_email,
+                get_send_quota=self.__get_send_quota,
+                workers=EMAIL_QUEUE_WORKERS,
+                max_size=EMAIL_QUEUE_MAX_SIZE,
+                default_rate=EMAIL_SEND_RATE,
+                rate_ratio=EMAIL_SEND_RATE_RATIO,
+                quota_refresh_secs=EMAIL_QUOTA_REFRESH_SECS,
+                max_retry=EMAIL_MAX_RETRY,
+                retry_base_secs=EMAIL_RETRY_BASE_SECS,
+                instances=EMAIL_SEND_INSTANCES,
+                shared_rate=shared_rate,
+            )
 
+    @timed('ses.send_contact')
     async def send_contact(self, recipient: EmailStr, subject: str, body: str) -> None:
         log.debug(f'send email: {recipient}, subject: {subject}, body: {body}')
-        try:
-            email_client = await self.ses.access()
-            response = await email_client.send_email(
-                Source=EMAIL_SENDER,
-                Destination={
-                    'ToAddresses': [recipient],
+        await self.__send('contact', {
+            'Source': EMAIL_SENDER,
+            'Destination': {
+                'ToAddresses': [recipient],
+            },
+            'Message': {
+                'Subject': {'Data': f'{subject}'},
+                'Body': {
+                    'Text': {'Data': f'{body}'},
                 },
-                Message={
-                    'Subject': {'Data': f'{subject}'},
-                    'Body': {
-                        'Text': {'Data': f'{body}'},
-                    },
-                }
-            )
-            log.info(f"EmailClient sent. Message ID: {response['MessageId']}")
-
-        except ClientError as e:
-            log.error(f"SES ClientError sending email: {e}")
-            raise ServerException(msg='email_send_contact_error')
-
-        except Exception as e:
-            log.error(f"Error sending email: {e}")
-            raise ServerException(msg='email_send_contact_error')
+            },
+        }, err_msg='email_send_contact_error')
 
 
+    @timed('ses.send_conform_code')
     async def send_conform_code(self, email: str, confirm_code: str) -> None:
         log.debug(f'send email: {email}, code: {confirm_code}')
-        try:
-            html_template = f'''
-                <!DOCTYPE html>
-                <html>
-                <head>
-                    <title>Verification Code</title>
-                    <style>
-                        body {{
-                            font-family: Arial, sans-serif;
-                            background-color: #f4f4f4;
-                            color: #333;
-                            line-height: 1.6;
-                        }}
-                        .container {{
-                            max-width: 600px;
-                            margin: 20px auto;
-                            padding: 20px;
-                            background: #fff;
-                            border: 1px solid #ddd;
-                            border-radius: 5px;
-                            box-shadow: 0 0 10px rgba(0, 0, 0, 0.1);
-                        }}
-                        .verification-code {{
-                            font-size: 24px;
-                            color: #007bff;
-                            font-weight: bold;
-                        }}
-                    </style>
-                </head>
-                <body>
-                    <div class="container">
-                        <h2>Your Verification Code</h2>
-                        <p>You are performing an important operation. Please enter the following verification code in the form to complete the process:</p>
-                        <p class="verification-code">{confirm_code}</p>
-                        <p>Please note that this verification code will expire in 5 minutes.</p>
-                    </div>
-                </body>
-                </html>
-            '''
-            email_client = await self.ses.access()
-            response = await email_client.send_email(
-                Source=EMAIL_SENDER,
-                Destination={
-                    'ToAddresses': [email],
+        html_template = f'''
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <title>Verification Code</title>
+                <style>
+                    body {{
+                        font-family: Arial, sans-serif;
+                        background-color: #f4f4f4;
+                        color: #333;
+                        line-height: 1.6;
+                    }}
+                    .container {{
+                        max-width: 600px;
+                        margin: 20px auto;
+                        padding: 20px;
+                        background: #fff;
+                        border: 1px solid #ddd;
+                        border-radius: 5px;
+                        box-shadow: 0 0 10px rgba(0, 0, 0, 0.1);
+                    }}
+                    .verification-code {{
+                        font-size: 24px;
+                        color: #007bff;
+                        font-weight: bold;
+                    }}
+                </style>
+            </head>
+            <body>
+                <div class="container">
+                    <h2>Your Verification Code</h2>
+                    <p>You are performing an important operation. Please enter the following verification code in the form to complete the process:</p>
+                    <p class="verification-code">{confirm_code}</p>
+                    <p>Please note that this verification code will expire in 5 minutes.</p>
+                </div>
+            </body>
+            </html>
+        '''
+        # response = await self.ses.send_templated_email(
+        #     Source=EMAIL_SENDER,
+        #     Destination={
+        #         'ToAddresses': [email],
+        #     },
+        #     Template=EMAIL_VERIFY_CODE_TEMPLATE,
+        #     TemplateData=f'{"verification_code":"{confirm_code}"}'
+        # )
+        await self.__send('conform_code', {
+            'Source': EMAIL_SENDER,
+            'Destination': {
+                'ToAddresses': [email],
+            },
+            'Message': {
+                'Subject': {'Data': f'ForeignTeacher - Verification Code: {confirm_code}'},
+                'Body': {
+                    'Text': {'Data': f'Your Code is: {confirm_code}'},
+                    'Html': {'Data': html_template},
                 },
-                Message={
-                    'Subject': {'Data': f'ForeignTeacher - Verification Code: {confirm_code}'},
-                    'Body': {
-                        'Text': {'Data': f'Your Code is: {confirm_code}'},
-                        'Html': {'Data': html_template},
-                    },
-                }
-            )
-            # response = await self.ses.send_templated_email(
-            #     Source=EMAIL_SENDER,
-            #     Destination={
-            #         'ToAddresses': [email],
-            #     },
-            #     Template=EMAIL_VERIFY_CODE_TEMPLATE,
-            #     TemplateData=f'{"verification_code":"{confirm_code}"}'
-            # )
-            log.info(f"EmailClient sent. Message ID: {response['MessageId']}")
-
-        except ClientError as e:
-            log.error(f"Error sending email: {e}")
-            raise ServerException(msg='email_send_conform_code_error')
-
-        except Exception as e:
-            log.error(f'Error sending email: {e}')
-            raise ServerException(msg='email_send_conform_code_error')
+            },
+        }, err_msg='email_send_conform_code_error')
 
 
+    @timed('ses.send_reset_password_comfirm_email')
     async def send_reset_password_comfirm_email(self, email: str, token: str) -> None:
         log.debug(f'send email: {email}, code: {token}')
         log.debug(f'{FRONTEND_RESET_PASSWORD_URL}{token}')
-        try:
-            html_template = f'''
-                <!DOCTYPE html>
-                <html>
-                <head>
-                    <title>Password Reset</title>
-                    <style>
-                        body {{ font-family: Arial, sans-serif; background-color: #f4f4f4; color: #333; line-height: 1.6; }}
-                        .container {{ max-width: 600px; margin: 20px auto; padding: 20px; background: #fff; border: 1px solid #ddd; border-radius: 5px; box-shadow: 0 0 10px rgba(0, 0, 0, 0.1); }}
-                        .button {{ display: inline-block; padding: 10px 20px; margin-top: 20px; background-color: #007bff; color: #fff; text-decoration: none; border-radius: 5px; }}
-                    </style>
-                </head>
-                <body>
-                    <div class="container">
-                        <h2>Password Reset Request</h2>
-                        <p>You recently requested to reset your password for your account. Click the button below to reset it.</p>
-                        <a href="{FRONTEND_RESET_PASSWORD_URL}{token}" class="button">Reset Your Password</a>
-                        <p>If you did not request a password reset, please ignore this email or contact support if you have questions.</p>
-                        <p>Thank you!</p>
-                    </div>
-                </body>
-                </html>
-            '''
-            email_client = await self.ses.access()
-            response = await email_client.send_email(
-                Source=EMAIL_SENDER,
-                Destination={
-                    'ToAddresses': [email],
+        html_template = f'''
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <title>Password Reset</title>
+                <style>
+                    body {{ font-family: Arial, sans-serif; background-color: #f4f4f4; color: #333; line-height: 1.6; }}
+                    .container {{ max-width: 600px; margin: 20px auto; padding: 20px; background: #fff; border: 1px solid #ddd; border-radius: 5px; box-shadow: 0 0 10px rgba(0, 0, 0, 0.1); }}
+                    .button {{ display: inline-block; padding: 10px 20px; margin-top: 20px; background-color: #007bff; color: #fff; text-decoration: none; border-radius: 5px; }}
+                </style>
+            </head>
+            <body>
+                <div class="container">
+                    <h2>Password Reset Request</h2>
+                    <p>You recently requested to reset your password for your account. Click the button below to reset it.</p>
+                    <a href="{FRONTEND_RESET_PASSWORD_URL}{token}" class="button">Reset Your Password</a>
+                    <p>If you did not request a password reset, please ignore this email or contact support if you have questions.</p>
+                    <p>Thank you!</p>
+                </div>
+            </body>
+            </html>
+        '''
+        # response = await self.ses.send_templated_email(
+        #     Source=EMAIL_SENDER,
+        #     Destination={
+        #         'ToAddresses': [email],
+        #     },
+        #     Template=EMAIL_RESET_PASSWORD_TEMPLATE,
+        #     TemplateData=f'{"reset_password_url":"{FRONTEND_RESET_PASSWORD_URL}","token":"{token}"}'
+        # )
+        await self.__send('reset_password', {
+            'Source': EMAIL_SENDER,
+            'Destination': {
+                'ToAddresses': [email],
+            },
+            'Message': {
+                'Subject': {'Data': f'ForeignTeacher - Reset Password'},
+                'Body': {
+                    'Text': {'Data': f'Reset Your Password'},
+                    'Html': {'Data': html_template},
                 },
-                Message={
-                    'Subject': {'Data': f'ForeignTeacher - Reset Password'},
-                    'Body': {
-                        'Text': {'Data': f'Reset Your Password'},
-                        'Html': {'Data': html_template},
-                    },
-                }
-            )
-            # response = await self.ses.send_templated_email(
-            #     Source=EMAIL_SENDER,
-            #     Destination={
-            #         'ToAddresses': [email],
-            #     },
-            #     Template=EMAIL_RESET_PASSWORD_TEMPLATE,
-            #     TemplateData=f'{"reset_password_url":"{FRONTEND_RESET_PASSWORD_URL}","token":"{token}"}'
-            # )
-            log.info(f"EmailClient sent. Message ID: {response['MessageId']}")
+            },
+        }, err_msg='email_send_reset_password_error')
+
+
+    async def close(self):
+        if self.dispatcher is not None:
+            await self.dispatcher.close()
+
+    def stats(self) -> Optional[Dict]:
+        return self.dispatcher.stats() if self.dispatcher is not None else None
+
+    async def __send(self, kind: str, params: Dict, err_msg: str) -> None:
+        try:
+            if self.dispatcher is None:
+                response = await self.__send_email(params)
+            else:
+                response = await self.dispatcher.dispatch(params, wait=kind not in self.enqueue_only)
+
+            if response is None:
+                log.info(f'EmailClient enqueued: {kind}')
+            else:
+                log.info(f"EmailClient sent. Message ID: {response['MessageId']}")
 
         except ClientError as e:
-            log.error(f"Error sending email: {e}") 
-            raise ServerException(msg='email_send_reset_password_error')
+            log.error(f"SES ClientError sending email: {e}")
+            raise ServerException(msg=err_msg)
 
         except Exception as e:
             log.error(f'Error sending email: {e}')
-            raise ServerException(msg='email_send_reset_password_error')
+            raise ServerException(msg=err_msg)
+
+    async def __send_email(self, params: Dict) -> Dict:
+        email_client = await self.ses.access()
+        return await email_client.send_email(**params)
+
+    async def __get_send_quota(self) -> Dict:
+        email_client = await self.ses.access()
+        return await email_client.get_send_quota()
@@ -0,0 +1,217 @@
+import time
+import random
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from botocore.exceptions import ClientError
+from ..utils.timing import record, detach_request
+from ...repositories.rate_limit_repository import IRateLimitRepository
+from ...configs.conf import TIMING_ENABLED
+import logging
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+THROTTLING_ERRORS = set([
+    'Throttling',
+    'ThrottlingException',
+    'TooManyRequestsException',
+])
+# SES rejects sends above MaxSendRate, never pace below this rate (msgs/sec)
+MIN_SEND_RATE = 0.1
+
+
+'''
+bounded queue of SES send_email calls in front of a pool of workers
+
+- dispatch(params, wait=True): waits until its own email is sent, returns/raises its result,
+  i.e. behind all the queued emails (a full queue takes max_size / rate secs);
+  a full queue makes the caller wait (backpressure)
+- dispatch(params, wait=False): returns once enqueued, the errors are only logged;
+  a full queue raises email_queue_full
+- the sends are paced at MaxSendRate (GetSendQuota) * rate_ratio, the quota is refreshed
+  every quota_refresh_secs; the quota is per account, so the rate of this process is
+  divided by the expected instances, or (shared_rate) every send takes a slot of the
+  per second counter in the rate limit store, shared by all the instances
+- throttled sends are retried with full jitter backoff, up to max_retry
+'''
+class EmailDispatcher:
+    def __init__(
+        self,
+        label: str,
+        send: Callable[[Dict], Awaitable[Dict]],
+        get_send_quota: Callable[[], Awaitable[Dict]],
+        workers: int,
+        max_size: int,
+        default_rate: float,
+        rate_ratio: float,
+        quota_refresh_secs: float,
+        max_retry: int,
+        retry_base_secs: float,
+        instances: int = 1,
+        shared_rate: Optional[IRateLimitRepository] = None,
+    ):
+        self.label = label
+        self.send = send
+        self.get_send_quota = get_send_quota
+        self.workers = max(1, workers)
+        self.max_size = max(1, max_size)
+        # shared: this process may use the whole rate, the counter keeps the total under it
+        self.instances = 1 if shared_rate is not None else max(1, instances)
+        self.shared_rate = shared_rate
+        self.rate = max(MIN_SEND_RATE, default_rate / self.instances)
+        self.rate_ratio = rate_ratio
+        self.quota_refresh_secs = quota_refresh_secs
+        self.max_retry = max_retry
+        self.retry_base_secs = retry_base_secs
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+        self.next_send_at = 0.0
+        self.quota_expires_at = 0.0
+        self.quota: Dict[str, Any] = {}
+        self.metrics = {
+            'queued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retries': 0,
+            'rejected': 0,  # queue full (wait=False)
+            'shared_waits': 0,  # no slot left in the shared counter
+        }
+
+    async def dispatch(self, params: Dict, wait: bool = True) -> Optional[Dict]:
+        self.__start()
+        if not wait:
+            try:
+                self.queue.put_nowait((params, None, time.perf_counter()))
+            except asyncio.QueueFull:
+                self.metrics['rejected'] += 1
+                raise Exception('email_queue_full')
+
+            self.metrics['queued'] += 1
+            return None
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((params, future, time.perf_counter()))
+        self.metrics['queued'] += 1
+        return await future
+
+    async def close(self, timeout_secs: float = 10):
+        if self.queue is not None and self.tasks:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout_secs)
+            except asyncio.TimeoutError:
+                log.error('[%s] close: %s emails are not sent', self.label, self.queue.qsize())
+
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            'label': self.label,
+            'queue_size': self.queue.qsize() if self.queue is not None else 0,
+            'workers': len(self.tasks),
+            'send_rate': round(self.rate, 2),
+            'instances': self.instances,
+            'shared_rate': self.shared_rate is not None,
+            'quota': self.quota,
+        }
+
+    # the workers live in the loop of the first dispatch
+    def __start(self):
+        if self.tasks and not all(task.done() for task in self.tasks):
+            return
+
+        if self.queue is None:
+            self.queue = asyncio.Queue(self.max_size)
+        loop = asyncio.get_running_loop()
+        self.tasks = [loop.create_task(self.__work()) for _ in range(self.workers)]
+
+    async def __work(self):
+        # started by the first dispatch, i.e. within a request
+        detach_request()
+        while True:
+            (params, future, enqueued_at) = await self.queue.get()
+            try:
+                if TIMING_ENABLED:
+                    record('ses.queue_wait', (time.perf_counter() - enqueued_at) * 1000)
+
+                result = await self.__send_with_retry(params)
+                self.metrics['sent'] += 1
+                if future is not None and not future.done():
+                    future.set_result(result)
+
+            except Exception as e:
+                self.metrics['failed'] += 1
+                if future is not None and not future.done():
+                    future.set_exception(e)
+                elif future is None:
+                    # nobody waits for it
+                    log.error('[%s] send email error, to:%s, err:%s',
+                              self.label, params.get('Destination', None), e)
+
+            finally:
+                self.queue.task_done()
+
+    async def __send_with_retry(self, params: Dict) -> Dict:
+        retry = 0
+        while True:
+            await self.__acquire()
+            try:
+                return await self.send(params)
+
+            except ClientError as e:
+                if e.response['Error']['Code'] not in THROTTLING_ERRORS or retry >= self.max_retry:
+                    raise e
+
+                retry += 1
+                self.metrics['retries'] += 1
+                await asyncio.sleep(random.uniform(0, self.retry_base_secs * (2 ** retry)))
+
+    # one send slot every 1/rate secs, shared by the workers
+    async def __acquire(self):
+        await self.__refresh_quota()
+        now = time.monotonic()
+        slot = max(now, self.next_send_at)
+        self.next_send_at = slot + 1 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+        if self.shared_rate is not None:
+            await self.__acquire_shared()
+
+    # a slot of the current second, in the counter of all the instances
+    async def __acquire_shared(self):
+        limit = max(1, int(self.rate))
+        while True:
+            try:
+                if await self.shared_rate.hit(f'{self.label}#send', limit, 1):
+                    return
+            except Exception as e:
+                # paced by this process only
+                log.error('[%s] shared send rate error, send anyway, err:%s', self.label, e)
+                return
+
+            self.metrics['shared_waits'] += 1
+            await asyncio.sleep(1 - time.time() % 1 + random.uniform(0, 1 / self.rate))
+
+    async def __refresh_quota(self):
+        if time.monotonic() < self.quota_expires_at:
+            return
+
+        # one refresh at a time, the others keep the current rate
+        self.quota_expires_at = time.monotonic() + self.quota_refresh_secs
+        try:
+            res = await self.get_send_quota()
+            self.quota = {
+                'max_send_rate': float(res['MaxSendRate']),
+                'max_24_hour_send': float(res['Max24HourSend']),
+                'sent_last_24_hours': float(res['SentLast24Hours']),
+            }
+            self.rate = max(MIN_SEND_RATE, self.quota['max_send_rate'] * self.rate_ratio / self.instances)
+            # Max24HourSend -1: unlimited
+            if 0 <= self.quota['max_24_hour_send'] <= self.quota['sent_last_24_hours']:
+                log.warning('[%s] the 24 hour sending quota is used up: %s', self.label, self.quota)
+
+        except Exception as e:
+            log.error('[%s] get_send_quota error, keep the rate %s, err:%s', self.label, self.rate, e)
@@ -1,4 +1,5 @@
-from typing import Dict, List, Any, Tuple
+import asyncio
+from typing import Dict, List, Any, Tuple, Optional
 from decimal import Decimal
 from pydantic import EmailStr
 from boto3.dynamodb.conditions import Key, Attr
@@ -6,15 +7,35 @@ from botocore.exceptions import ClientError
 
 from .auth_schemas import *
 from .ddb_error_handler import *
-from ....configs.conf import TABLE_AUTH, TABLE_ACCOUNT, TABLE_ACCOUNT_INDEX, BATCH_LIMIT
-from ....configs.constants import DYNAMODB_KEYWORDS
+from ....configs.conf import (
+    TABLE_AUTH,
+    TABLE_ACCOUNT,
+    TABLE_ACCOUNT_INDEX,
+    BATCH_LIMIT,
+    ACCOUNT_PROJECTION_ENABLED,
+    BATCH_MAX_RETRY,
+    BATCH_RETRY_DELAY_SECS,
+)
+from ....configs.constants import DYNAMODB_KEYWORDS, ACCOUNT_PROJECTION
 from ....configs.exceptions import *
 from ....repositories.auth_repository import IAuthRepository
 from ....models.auth_value_objects import UpdatePasswordDTO
+from ...utils.timing import timed
 import logging as log
 
 log.basicConfig(filemode='w', level=log.INFO)
 
+# DynamoDB BatchGetItem accepts up to 100 keys per request
+MAX_BATCH_GET_KEYS = 100
+# DynamoDB BatchWriteItem accepts up to 25 put/delete requests
+MAX_BATCH_WRITE_ITEMS = 25
+# upper bound of the adaptive pacing between BatchWriteItem requests
+MAX_BATCH_WRITE_DELAY_SECS = 2.0
+THROTTLING_ERRORS = set([
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+])
 
 
 class AuthRepository(IAuthRepository):
@@ -22,7 +43,10 @@ class AuthRepository(IAuthRepository):
         self.__cls_name = self.__class__.__name__
         self.auth_db = None
         self.account_db = None
+        # adaptive pacing of bulk writes, grows on throttling, decays on success
+        self.write_delay_secs = 0
 
+    @timed('ddb.get_account_by_email')
     async def get_account_by_email(self, auth_db: Any, account_db: Any, email: EmailStr, fields: List):
         auth_res = None
         acc_res = None
@@ -37,7 +61,12 @@ class AuthRepository(IAuthRepository):
             if not 'Item' in auth_res:
                 return None
 
-            # 2. get account by aid
+            # 2-1. the auth row carries the account projection: one round trip only
+            projection = auth_res['Item'].get(ACCOUNT_PROJECTION, None)
+            if projection:
+                return self.__project_fields(projection, fields)
+
+            # 2-2. get account by aid (rows created before the projection existed)
             aid = auth_res['Item']['aid']
             account_db = await account_db.access()
             acc_table = await account_db.Table(TABLE_ACCOUNT)
@@ -80,6 +109,9 @@ class AuthRepository(IAuthRepository):
                 email, fields, auth_res, acc_res, account, e.__str__())
             raise Exception('db_read_error')
 
+    def __project_fields(self, item: Dict, fields: List) -> Dict:
+        return {field: item[field] for field in fields if field in item}
+
     def __gen_expression_for_get_items(self, fields: List):
         expression_attr_names = {}
         for idx, field in enumerate(fields):
@@ -91,6 +123,7 @@ class AuthRepository(IAuthRepository):
         projection_expression = ','.join(fields)
         return projection_expression, expression_attr_names
 
+    @timed('ddb.create_account')
     async def create_account(self, auth_db: Any, account_db: Any, auth: FTAuth, account: Account) -> Tuple[FTAuth, Account]:
         response = None
         auth_dict: Dict = auth.create_ts().dict()
@@ -100,6 +133,9 @@ class AuthRepository(IAuthRepository):
             aid=auth.aid,
         )
         account_index_dict: Dict = account_index.create_ts().dict()
+        if ACCOUNT_PROJECTION_ENABLED:
+            # written in the same transaction, so it never drifts from the account row
+            auth_dict[ACCOUNT_PROJECTION] = account_dict
 
         try:
             _db = await account_db.access()
@@ -147,6 +183,7 @@ class AuthRepository(IAuthRepository):
             raise Exception('db_insert_error')
 
 
+    @timed('ddb.delete_account')
     async def delete_account(self, auth_db: Any, account_db: Any, auth: FTAuth):
         auth_res = None
         response = None
@@ -195,6 +232,7 @@ class AuthRepository(IAuthRepository):
             raise Exception('db_delete_error')        
 
 
+    @timed('ddb.find_account')
     async def find_account(self, db: Any, aid: Decimal):
         res = None
         result = None
@@ -223,6 +261,7 @@ class AuthRepository(IAuthRepository):
             raise Exception('db_read_error')
 
 
+    @timed('ddb.find_account_by_role_id')
     async def find_account_by_role_id(self, db: Any, role_id: Decimal):
         idx_res = None
         res = None
@@ -236,7 +275,7 @@ class AuthRepository(IAuthRepository):
             if idx_res.get('Item', None) != None and 'aid' in idx_res['Item']:
                 aid = idx_res['Item']['aid']
                 table = await db.Table(TABLE_ACCOUNT)
-                res = table.get_item(Key={'aid': aid})
+                res = await table.get_item(Key={'aid': aid})
                 if res.get('Item', None) != None:
                     result = res['Item']
 
@@ -257,6 +296,7 @@ class AuthRepository(IAuthRepository):
             raise Exception('db_read_error')
 
 
+    @timed('ddb.find_auth')
     async def find_auth(self, db: Any, email: EmailStr):
         res = None
         result = None
@@ -285,23 +325,37 @@ class AuthRepository(IAuthRepository):
             raise Exception('db_read_error')
 
 
+    @timed('ddb.update_password')
     async def update_password(
-        self, db: Any, update_password_params: UpdatePasswordDTO
-    ) -> (FTAuth):
+        self, db: Any, update_password_params: UpdatePasswordDTO, expected_pass_hash: Optional[str] = None, newer_only: bool = False
+    ) -> Optional[FTAuth]:
         res = None
         try:
             db = await db.access()
             auth_table = await db.Table(TABLE_AUTH)
 
-            res = await auth_table.update_item(
-                Key={'email': update_password_params.email},
-                UpdateExpression='set pass_salt=:ps, pass_hash=:ph',
-                ExpressionAttributeValues={
+            params = {
+                'Key': {'email': update_password_params.email},
+                'UpdateExpression': 'set pass_salt=:ps, pass_hash=:ph',
+                'ExpressionAttributeValues': {
                     ':ps': update_password_params.pass_salt,
                     ':ph': update_password_params.pass_hash,
                 },
-                ReturnValues='ALL_NEW',
-            )
+                'ReturnValues': 'ALL_NEW',
+            }
+            if expected_pass_hash is not None:
+                # a password changed after it was read is never overwritten
+                params['ConditionExpression'] = 'pass_hash = :old'
+                params['ExpressionAttributeValues'][':old'] = expected_pass_hash
+            else:
+                # a rehash keeps the time of the password it rehashes
+                params['UpdateExpression'] += ', updated_at=:ua'
+                params['ExpressionAttributeValues'][':ua'] = update_password_params.updated_at
+                if newer_only:
+                    # an older password (e.g. a retried event) never overwrites a newer one
+                    params['ConditionExpression'] = 'attribute_not_exists(updated_at) OR updated_at < :ua'
+
+            res = await auth_table.update_item(**params)
             if 'Attributes' in res:
                 # NOTE: return "role_id" for table: account_indexs
                 return FTAuth.parse_obj(res['Attributes'])
@@ -309,6 +363,9 @@ class AuthRepository(IAuthRepository):
                 raise Exception('update_password_fail')
     
         except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return None
+
             err = client_err_msg(e)
             log.error(f'{self.__cls_name}.update_password error [update_req_error], \
                 update_password_params:%s, res:%s, err:%s', update_password_params, res, err)
@@ -320,3 +377,232 @@ class AuthRepository(IAuthRepository):
                 update_password_params:%s, res:%s, err:%s', update_password_params, res, err)
             raise Exception('update_password_fail')
 
+
+
+    @timed('ddb.batch_find_auths')
+    async def batch_find_auths(self, db: Any, emails: List[EmailStr]) -> List[Dict]:
+        try:
+            db = await db.access()
+            return await self.__batch_get_items(db, TABLE_AUTH, 'email', emails)
+
+        except ClientError as e:
+            log.error(f'{self.__cls_name}.batch_find_auths error [read_req_error], \
+                emails:%s, err:%s', emails, client_err_msg(e))
+            raise Exception('read_req_error')
+
+        except Exception as e:
+            log.error(f'{self.__cls_name}.batch_find_auths error [db_read_error], \
+                emails:%s, err:%s', emails, e.__str__())
+            raise Exception('db_read_error')
+
+
+    @timed('ddb.batch_find_accounts')
+    async def batch_find_accounts(self, db: Any, aids: List[Decimal]) -> List[Dict]:
+        try:
+            db = await db.access()
+            return await self.__batch_get_items(db, TABLE_ACCOUNT, 'aid', aids)
+
+        except ClientError as e:
+            log.error(f'{self.__cls_name}.batch_find_accounts error [read_req_error], \
+                aids:%s, err:%s', aids, client_err_msg(e))
+            raise Exception('read_req_error')
+
+        except Exception as e:
+            log.error(f'{self.__cls_name}.batch_find_accounts error [db_read_error], \
+                aids:%s, err:%s', aids, e.__str__())
+            raise Exception('db_read_error')
+
+
+    @timed('ddb.batch_find_by_role_ids')
+    async def batch_find_by_role_ids(self, db: Any, role_ids: List[Decimal]) -> List[Dict]:
+        idx_items = None
+        try:
+            # 1. role_ids -> aids (account_indexs)
+            db = await db.access()
+            idx_items = await self.__batch_get_items(db, TABLE_ACCOUNT_INDEX, 'role_id', role_ids)
+            aids = [item['aid'] for item in idx_items if 'aid' in item]
+            if not aids:
+                return []
+
+            # 2. aids -> accounts
+            return await self.__batch_get_items(db, TABLE_ACCOUNT, 'aid', aids)
+
+        except ClientError as e:
+            log.error(f'{self.__cls_name}.batch_find_by_role_ids error [read_req_error], \
+                role_ids:%s, idx_items:%s, err:%s', role_ids, idx_items, client_err_msg(e))
+            raise Exception('read_req_error')
+
+        except Exception as e:
+            log.error(f'{self.__cls_name}.batch_find_by_role_ids error [db_read_error], \
+                role_ids:%s, idx_items:%s, err:%s', role_ids, idx_items, e.__str__())
+            raise Exception('db_read_error')
+
+
+    '''
+    bulk version of create_account, for imports/migrations
+    - BatchWriteItem is not conditional, the caller filters existing emails
+    - account & account_index rows are written before the auth rows,
+      so a user is visible (find_auth/login) only after all the rows exist
+    '''
+    @timed('ddb.batch_create_accounts')
+    async def batch_create_accounts(self, auth_db: Any, account_db: Any, accounts: List[Tuple[FTAuth, Account]]):
+        account_reqs = []
+        index_reqs = []
+        auth_reqs = []
+        for (auth, account) in accounts:
+            auth_dict: Dict = auth.create_ts().dict()
+            account_dict: Dict = account.create_ts().dict()
+            account_index_dict: Dict = AccountIndex(
+                role_id=auth.role_id,
+                aid=auth.aid,
+            ).create_ts().dict()
+            if ACCOUNT_PROJECTION_ENABLED:
+                auth_dict[ACCOUNT_PROJECTION] = account_dict
+
+            account_reqs.append((TABLE_ACCOUNT, {'PutRequest': {'Item': account_dict}}))
+            index_reqs.append((TABLE_ACCOUNT_INDEX, {'PutRequest': {'Item': account_index_dict}}))
+            auth_reqs.append((TABLE_AUTH, {'PutRequest': {'Item': auth_dict}}))
+
+        try:
+            db = await account_db.access()
+            await self.__batch_write_items(db, account_reqs + index_reqs + auth_reqs)
+            return len(accounts)
+
+        except ClientError as e:
+            log.error(f'{self.__cls_name}.batch_create_accounts error [insert_req_error], \
+                size:%s, err:%s', len(accounts), client_err_msg(e))
+            raise Exception('insert_req_error')
+
+        except Exception as e:
+            log.error(f'{self.__cls_name}.batch_create_accounts error [db_insert_error], \
+                size:%s, err:%s', len(accounts), e.__str__())
+            raise Exception('db_insert_error')
+
+
+    # auth rows first: the users disappear before their account rows
+    @timed('ddb.batch_delete_accounts')
+    async def batch_delete_accounts(self, auth_db: Any, account_db: Any, auths: List[FTAuth]):
+        requests = [(TABLE_AUTH, {'DeleteRequest': {'Key': {'email': auth.email}}}) for auth in auths]
+        requests += [(TABLE_ACCOUNT, {'DeleteRequest': {'Key': {'aid': auth.aid}}}) for auth in auths]
+        requests += [(TABLE_ACCOUNT_INDEX, {'DeleteRequest': {'Key': {'role_id': auth.role_id}}}) for auth in auths]
+
+        try:
+            db = await account_db.access()
+            await self.__batch_write_items(db, requests)
+            return len(auths)
+
+        except ClientError as e:
+            log.error(f'{self.__cls_name}.batch_delete_accounts error [delete_req_error], \
+                size:%s, err:%s', len(auths), client_err_msg(e))
+            raise Exception('delete_req_error')
+
+        except Exception as e:
+            log.error(f'{self.__cls_name}.batch_delete_accounts error [db_delete_error], \
+                size:%s, err:%s', len(auths), e.__str__())
+            raise Exception('db_delete_error')
+
+
+    '''
+    one page of a parallel scan on the auth table,
+    returns (items, last_evaluated_key); last_evaluated_key is None on the last page
+    '''
+    @timed('ddb.scan_auths')
+    async def scan_auths(self, db: Any, segment: int, total_segments: int, start_key: Optional[Dict] = None, limit: int = 100) -> Tuple[List[Dict], Optional[Dict]]:
+        res = None
+        try:
+            db = await db.access()
+            table = await db.Table(TABLE_AUTH)
+            params = {
+                'Segment': segment,
+                'TotalSegments': total_segments,
+                'Limit': limit,
+            }
+            if start_key:
+                params['ExclusiveStartKey'] = start_key
+
+            res = await table.scan(**params)
+            return (res.get('Items', []), res.get('LastEvaluatedKey', None))
+
+        except ClientError as e:
+            log.error(f'{self.__cls_name}.scan_auths error [read_req_error], \
+                segment:%s/%s, start_key:%s, err:%s', segment, total_segments, start_key, client_err_msg(e))
+            raise Exception('read_req_error')
+
+        except Exception as e:
+            log.error(f'{self.__cls_name}.scan_auths error [db_read_error], \
+                segment:%s/%s, start_key:%s, err:%s', segment, total_segments, start_key, e.__str__())
+            raise Exception('db_read_error')
+
+
+    '''
+    BatchWriteItem in chunks of 25 requests [(table_name, request)],
+    UnprocessedItems are re-sent with exponential backoff;
+    write_delay_secs paces the following requests while the tables are throttling
+    '''
+    async def __batch_write_items(self, db: Any, requests: List[Tuple[str, Dict]]):
+        for i in range(0, len(requests), MAX_BATCH_WRITE_ITEMS):
+            request_items: Dict[str, List] = {}
+            for (table_name, request) in requests[i:i + MAX_BATCH_WRITE_ITEMS]:
+                request_items.setdefault(table_name, []).append(request)
+
+            retry = 0
+            while request_items:
+                if self.write_delay_secs > 0:
+                    await asyncio.sleep(self.write_delay_secs)
+
+                try:
+                    res = await db.batch_write_item(RequestItems=request_items)
+                    request_items = res.get('UnprocessedItems', None)
+                except ClientError as e:
+                    if e.response['Error']['Code'] not in THROTTLING_ERRORS:
+                        raise e
+
+                if not request_items:
+                    self.write_delay_secs = self.write_delay_secs / 2 \
+                        if self.write_delay_secs > BATCH_RETRY_DELAY_SECS else 0
+                    break
+
+                retry += 1
+                if retry > BATCH_MAX_RETRY:
+                    log.error(f'{self.__cls_name}.__batch_write_items [unprocessed_items], \
+                        unprocessed:%s', request_items)
+                    raise Exception('unprocessed_items_exceeded')
+
+                self.write_delay_secs = min(
+                    MAX_BATCH_WRITE_DELAY_SECS,
+                    max(BATCH_RETRY_DELAY_SECS * (2 ** (retry - 1)), self.write_delay_secs * 2),
+                )
+
+
+    '''
+    BatchGetItem in chunks of BATCH_LIMIT keys,
+    UnprocessedKeys are re-requested with exponential backoff
+    '''
+    async def __batch_get_items(self, db: Any, table_name: str, key_name: str, keys: List) -> List[Dict]:
+        items = []
+        keys = list(dict.fromkeys(keys))  # BatchGetItem rejects duplicated keys
+        chunk_size = max(1, min(BATCH_LIMIT, MAX_BATCH_GET_KEYS))
+
+        for i in range(0, len(keys), chunk_size):
+            request_items = {
+                table_name: {
+                    'Keys': [{key_name: key} for key in keys[i:i + chunk_size]],
+                }
+            }
+            retry = 0
+            while request_items:
+                res = await db.batch_get_item(RequestItems=request_items)
+                items.extend(res.get('Responses', {}).get(table_name, []))
+                request_items = res.get('UnprocessedKeys', None)
+                if not request_items:
+                    break
+
+                retry += 1
+                if retry > BATCH_MAX_RETRY:
+                    log.error(f'{self.__cls_name}.__batch_get_items [unprocessed_keys], \
+                        table:%s, unprocessed:%s', table_name, request_items)
+                    raise Exception('unprocessed_keys_exceeded')
+
+                await asyncio.sleep(BATCH_RETRY_DELAY_SECS * (2 ** (retry - 1)))
+
+        return items
@@ -0,0 +1,148 @@
+from typing import Dict, List, Any, Tuple, Optional, Callable
+from decimal import Decimal
+from pydantic import EmailStr
+
+from .auth_schemas import *
+from ....configs.constants import ACCOUNT_PROJECTION
+from ....repositories.auth_repository import IAuthRepository
+from ....models.auth_value_objects import UpdatePasswordDTO
+from ...cache import LRUTTLCache
+import logging as log
+
+log.basicConfig(filemode='w', level=log.INFO)
+
+
+'''
+read-through cache in front of IAuthRepository
+
+- find_account(aid) is served from the cache
+- the auth rows (pass_hash/pass_salt) are never cached: a changed password
+  is used by every container at once; only their account projection is cached
+- create_account / delete_account invalidate the entries,
+  the remote subscribers write through the same repository so they invalidate too
+- only found items are cached, a miss always goes to the db
+- the cache is per process, TTL bounds the staleness between containers
+'''
+class CachedAuthRepository(IAuthRepository):
+    def __init__(self, auth_repo: IAuthRepository, account_cache: LRUTTLCache):
+        self.auth_repo = auth_repo
+        self.account_cache = account_cache
+
+    async def get_account_by_email(self, auth_db: Any, account_db: Any, email: EmailStr, fields: List):
+        return await self.auth_repo.get_account_by_email(
+            auth_db=auth_db, account_db=account_db, email=email, fields=fields)
+
+    async def create_account(self, auth_db: Any, account_db: Any, auth: FTAuth, account: Account) -> Tuple[FTAuth, Account]:
+        try:
+            return await self.auth_repo.create_account(
+                auth_db=auth_db, account_db=account_db, auth=auth, account=account)
+        finally:
+            self.invalidate(aid=auth.aid)
+
+    async def delete_account(self, auth_db: Any, account_db: Any, auth: FTAuth):
+        try:
+            return await self.auth_repo.delete_account(
+                auth_db=auth_db, account_db=account_db, auth=auth)
+        finally:
+            self.invalidate(aid=auth.aid)
+
+    async def find_account(self, db: Any, aid: Decimal):
+        key = self.__aid_key(aid)
+        account = self.account_cache.get(key)
+        if account is not None:
+            return dict(account)
+
+        account = await self.auth_repo.find_account(db=db, aid=aid)
+        if account is not None:
+            self.account_cache.set(key, dict(account))
+        return account
+
+    async def find_account_by_role_id(self, db: Any, role_id: Decimal):
+        return await self.auth_repo.find_account_by_role_id(db=db, role_id=role_id)
+
+    async def find_auth(self, db: Any, email: EmailStr):
+        auth = await self.auth_repo.find_auth(db=db, email=email)
+        if auth is not None:
+            self.__cache_projection(auth)
+        return auth
+
+    async def update_password(self, db: Any, update_password_params: UpdatePasswordDTO, expected_pass_hash: Optional[str] = None, newer_only: bool = False) -> Optional[FTAuth]:
+        return await self.auth_repo.update_password(
+            db=db, update_password_params=update_password_params,
+            expected_pass_hash=expected_pass_hash, newer_only=newer_only)
+
+    async def batch_find_auths(self, db: Any, emails: List[EmailStr]) -> List[Dict]:
+        auths = await self.auth_repo.batch_find_auths(db=db, emails=emails)
+        for auth in auths:
+            self.__cache_projection(auth)
+        return auths
+
+    async def batch_find_accounts(self, db: Any, aids: List[Decimal]) -> List[Dict]:
+        return await self.__batch_read_through(
+            cache=self.account_cache,
+            keys=aids,
+            to_key=self.__aid_key,
+            item_key='aid',
+            fetch=lambda misses: self.auth_repo.batch_find_accounts(db=db, aids=misses),
+        )
+
+    async def batch_find_by_role_ids(self, db: Any, role_ids: List[Decimal]) -> List[Dict]:
+        accounts = await self.auth_repo.batch_find_by_role_ids(db=db, role_ids=role_ids)
+        for account in accounts:
+            self.account_cache.set(self.__aid_key(account['aid']), dict(account))
+        return accounts
+
+    async def batch_create_accounts(self, auth_db: Any, account_db: Any, accounts: List[Tuple[FTAuth, Account]]):
+        try:
+            return await self.auth_repo.batch_create_accounts(
+                auth_db=auth_db, account_db=account_db, accounts=accounts)
+        finally:
+            for (auth, _) in accounts:
+                self.invalidate(aid=auth.aid)
+
+    async def batch_delete_accounts(self, auth_db: Any, account_db: Any, auths: List[FTAuth]):
+        try:
+            return await self.auth_repo.batch_delete_accounts(
+                auth_db=auth_db, account_db=account_db, auths=auths)
+        finally:
+            for auth in auths:
+                self.invalidate(aid=auth.aid)
+
+    async def scan_auths(self, db: Any, segment: int, total_segments: int, start_key: Optional[Dict] = None, limit: int = 100) -> Tuple[List[Dict], Optional[Dict]]:
+        return await self.auth_repo.scan_auths(
+            db=db, segment=segment, total_segments=total_segments, start_key=start_key, limit=limit)
+
+    def invalidate(self, aid: Optional[Decimal] = None):
+        if aid is not None:
+            self.account_cache.invalidate(self.__aid_key(aid))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'account': self.account_cache.stats(),
+        }
+
+    # the account copy written with the auth row (ACCOUNT_PROJECTION_ENABLED)
+    def __cache_projection(self, auth: Dict):
+        projection = auth.get(ACCOUNT_PROJECTION, None)
+        if projection and 'aid' in projection:
+            self.account_cache.set(self.__aid_key(projection['aid']), dict(projection))
+
+    async def __batch_read_through(self, cache: LRUTTLCache, keys: List, to_key: Callable, item_key: str, fetch: Callable) -> List[Dict]:
+        items = []
+        misses = []
+        for key in dict.fromkeys(keys):
+            item = cache.get(to_key(key))
+            if item is None:
+                misses.append(key)
+            else:
+                items.append(dict(item))
+
+        if misses:
+            for item in await fetch(misses):
+                cache.set(to_key(item[item_key]), dict(item))
+                items.append(item)
+
+        return items
+
+    def __aid_key(self, aid: Decimal) -> int:
+        return int(aid)
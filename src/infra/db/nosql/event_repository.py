@@ -1,5 +1,5 @@
 import json
-from typing import Any, Tuple
+from typing import Any, Dict
 from botocore.exceptions import ClientError
 from boto3.dynamodb.conditions import Attr
 
@@ -28,50 +28,7 @@ class EventRepository(IEventRepository):
     INSERT event_log_entity
     '''
     async def append_pub_event_log(self, event: PubEventDetailVO):
-        event_dict = event.dict()
-        try:
-            event_entity: EventEntity = EventEntity \
-                .parse_obj(event_dict) \
-                .create_ts() # created_at
-            event_log_entity: EventLogEntity = EventLogEntity.parse_event_entity(event_entity)
-            db = await self.event_db.access()
-            client = db.meta.client
-
-            (last_created, last_updated) = \
-                await self.get_last_event_times(client, event_entity)
-            if event_entity.updated_at <= last_updated:
-                log.info('upsert_publish_event_log. updated_at is not newer than the existing one.\
-                            last_updated: %s, new: %s', last_updated, event_entity.updated_at)
-                return
-            
-            if last_created > 0:
-                event_entity.created_at = last_created
-
-            response = await client.transact_write_items(
-                TransactItems=[
-                    {
-                        'Put': {
-                            'TableName': TABLE_EVENT,
-                            'Item': event_entity.dict(),
-                        }
-                    },
-                    {
-                        'Put': {
-                            'TableName': TABLE_EVENT_LOG,
-                            'Item': event_log_entity.dict(),
-                        }
-                    },
-                ]
-            )
-            log.info('upsert_publish_event_log. Transaction successful: %s', json.dumps(response))
-            
-        except ClientError as e:
-            log.error(f'upsert_publish_event_log error. [create_req_error], event:{event_dict}, err:{client_err_msg(e)}')
-            raise Exception(f'create_req_error: {client_err_msg(e)}')
-        
-        except Exception as e:
-            log.error(f'upsert_publish_event_log error. [db_create_error], event:{event_dict}, err:{str(e)}')
-            raise Exception(f'db_create_error: {str(e)}')
+        await self.__append_event_log(event.dict(), 'upsert_publish_event_log')
 
 
     '''
@@ -79,7 +36,16 @@ class EventRepository(IEventRepository):
     INSERT event_log_entity
     '''
     async def append_sub_event_log(self, event: SubEventDetailVO):
-        event_dict = event.dict()
+        await self.__append_event_log(event.dict(), 'upsert_subscribe_event_log')
+
+
+    '''
+    one transact_write_items call:
+    - event_entity is updated only if updated_at is newer than the existing one,
+      created_at of the existing one is preserved
+    - event_log_entity is inserted only if the event_entity is updated
+    '''
+    async def __append_event_log(self, event_dict: Dict, label: str):
         try:
             event_entity: EventEntity = EventEntity \
                 .parse_obj(event_dict) \
@@ -88,23 +54,10 @@ class EventRepository(IEventRepository):
             db = await self.event_db.access()
             client = db.meta.client
 
-            (last_created, last_updated) = \
-                await self.get_last_event_times(client, event_entity)
-            if event_entity.updated_at <= last_updated:
-                log.info('upsert_subscribe_event_log. updated_at is not newer than the existing one.\
-                            last_updated: %s, new: %s', last_updated, event_entity.updated_at)
-                return
-            
-            if last_created > 0:
-                event_entity.created_at = last_created
-
             response = await client.transact_write_items(
                 TransactItems=[
                     {
-                        'Put': {
-                            'TableName': TABLE_EVENT,
-                            'Item': event_entity.dict(),
-                        }
+                        'Update': self.__newer_event_update(event_entity),
                     },
                     {
                         'Put': {
@@ -114,33 +67,51 @@ class EventRepository(IEventRepository):
                     },
                 ]
             )
-            log.info('upsert_subscribe_event_log. Transaction successful: %s', json.dumps(response))
-            
+            log.info('%s. Transaction successful: %s', label, json.dumps(response))
+
         except ClientError as e:
-            log.error(f'upsert_subscribe_event_log error. [create_req_error], event:{event_dict}, err:{client_err_msg(e)}')
+            if self.__is_not_newer(e):
+                log.info('%s. updated_at is not newer than the existing one. new: %s',
+                         label, event_entity.updated_at)
+                return
+
+            log.error(f'{label} error. [create_req_error], event:{event_dict}, err:{client_err_msg(e)}')
             raise Exception(f'create_req_error: {client_err_msg(e)}')
-        
+
         except Exception as e:
-            log.error(f'upsert_subscribe_event_log error. [db_create_error], event:{event_dict}, err:{str(e)}')
+            log.error(f'{label} error. [db_create_error], event:{event_dict}, err:{str(e)}')
             raise Exception(f'db_create_error: {str(e)}')
 
 
-    async def get_last_event_times(self, client: Any, event_entity: EventEntity) -> Tuple[int, int]:
-        response = await client.get_item(
-            TableName=TABLE_EVENT,
-            Key={
-                'role_id': event_entity.role_id,
-                'event_id': event_entity.event_id,
-            },
-            ProjectionExpression='created_at, updated_at',
-        )
-        if 'Item' in response:
-            item = dict(response['Item'])
-            created_at = item.get('created_at', 0)
-            updated_at = item.get('updated_at', 0)
-            return (
-                created_at if created_at else 0,
-                updated_at if updated_at else 0,
-            )
-        else:
-            return (0, 0)
+    def __newer_event_update(self, event_entity: EventEntity) -> Dict:
+        item = event_entity.dict()
+        key = {
+            'role_id': item.pop('role_id'),
+            'event_id': item.pop('event_id'),
+        }
+        created_at = item.pop('created_at')
+
+        names = {f'#{field}': field for field in item}
+        names['#created_at'] = 'created_at'
+        values = {f':{field}': value for field, value in item.items()}
+        values[':created_at'] = created_at
+
+        assignments = [f'#{field} = :{field}' for field in item]
+        assignments.append('#created_at = if_not_exists(#created_at, :created_at)')
+        return {
+            'TableName': TABLE_EVENT,
+            'Key': key,
+            'UpdateExpression': 'SET ' + ', '.join(assignments),
+            'ConditionExpression': 'attribute_not_exists(#updated_at) OR #updated_at < :updated_at',
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values,
+        }
+
+
+    # the event_entity condition (first transact item) failed
+    def __is_not_newer(self, e: ClientError) -> bool:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            return False
+
+        reasons = e.response.get('CancellationReasons', [])
+        return len(reasons) > 0 and reasons[0].get('Code', None) == 'ConditionalCheckFailed'
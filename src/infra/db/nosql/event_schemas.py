@@ -1,6 +1,6 @@
 import json
 from typing import Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from .public_schemas import BaseEntity
 from ...utils.auth_util import gen_snowflake_id
 from ...utils.time_util import gen_timestamp
@@ -17,7 +17,7 @@ class EventEntity(BaseEntity):
 
 
 class EventLogEntity(BaseModel):
-    log_id: int = gen_snowflake_id() # sort key
+    log_id: int = Field(default_factory=gen_snowflake_id) # sort key
     event_id: int   # partition key
     event_type: str
     details: Dict[Any, Any]
@@ -0,0 +1,115 @@
+from typing import Any, Dict, Optional
+from botocore.exceptions import ClientError
+
+from .ddb_error_handler import *
+from ....configs.conf import TABLE_EVENT_IDEMPOTENCY
+from ....configs.constants import IdempotencyStatus
+from ....repositories.idempotency_repository import IIdempotencyRepository
+from ...resources.handlers.db_resource import DynamoDBResourceHandler
+from ...utils.time_util import current_seconds
+import logging
+
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+'''
+table: TABLE_EVENT_IDEMPOTENCY, partition key: idempotency_key (S),
+TTL attribute: expires_at (epoch secs)
+
+DynamoDB TTL deletes the expired items lazily (up to days later),
+so an expired claim is treated as absent by the condition, not by the TTL
+'''
+class IdempotencyRepository(IIdempotencyRepository):
+
+    def __init__(self, db: DynamoDBResourceHandler):
+        self.__cls_name = self.__class__.__name__
+        self.idempotency_db = db
+
+    async def claim(self, key: str, owner: str, lease_secs: int) -> Optional[IdempotencyStatus]:
+        now = current_seconds()
+        try:
+            table = await self.__table()
+            await table.put_item(
+                Item={
+                    'idempotency_key': key,
+                    'status': IdempotencyStatus.IN_PROGRESS.value,
+                    'owner': owner,
+                    'expires_at': now + lease_secs,
+                },
+                ConditionExpression='attribute_not_exists(idempotency_key) OR expires_at < :now',
+                ExpressionAttributeValues={':now': now},
+                ReturnValuesOnConditionCheckFailure='ALL_OLD',
+            )
+            return None
+
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return self.__status(e.response.get('Item', None))
+
+            log.error(f'{self.__cls_name}.claim error. [claim_req_error], key:%s, err:%s',
+                      key, client_err_msg(e))
+            raise Exception(f'claim_req_error: {client_err_msg(e)}')
+
+    async def complete(self, key: str, owner: str, ttl_secs: int):
+        try:
+            table = await self.__table()
+            await table.update_item(
+                Key={'idempotency_key': key},
+                UpdateExpression='SET #status = :completed, expires_at = :expires_at',
+                ConditionExpression='#owner = :owner',
+                ExpressionAttributeNames={'#status': 'status', '#owner': 'owner'},
+                ExpressionAttributeValues={
+                    ':completed': IdempotencyStatus.COMPLETED.value,
+                    ':expires_at': current_seconds() + ttl_secs,
+                    ':owner': owner,
+                },
+            )
+
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                # the lease expired and someone else claimed the key meanwhile
+                log.warning(f'{self.__cls_name}.complete: the claim is lost, key:%s', key)
+                return
+
+            log.error(f'{self.__cls_name}.complete error. [complete_req_error], key:%s, err:%s',
+                      key, client_err_msg(e))
+            raise Exception(f'complete_req_error: {client_err_msg(e)}')
+
+    async def release(self, key: str, owner: str):
+        try:
+            table = await self.__table()
+            await table.delete_item(
+                Key={'idempotency_key': key},
+                ConditionExpression='#owner = :owner AND #status = :in_progress',
+                ExpressionAttributeNames={'#status': 'status', '#owner': 'owner'},
+                ExpressionAttributeValues={
+                    ':owner': owner,
+                    ':in_progress': IdempotencyStatus.IN_PROGRESS.value,
+                },
+            )
+
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return
+
+            log.error(f'{self.__cls_name}.release error. [release_req_error], key:%s, err:%s',
+                      key, client_err_msg(e))
+            raise Exception(f'release_req_error: {client_err_msg(e)}')
+
+    async def __table(self):
+        db = await self.idempotency_db.access()
+        return await db.Table(TABLE_EVENT_IDEMPOTENCY)
+
+    # the old item of a failed condition is not deserialized: {'status': {'S': 'completed'}}
+    def __status(self, item: Optional[Dict[str, Any]]) -> IdempotencyStatus:
+        status = (item or {}).get('status', None)
+        if isinstance(status, dict):
+            status = status.get('S', None)
+
+        if status == IdempotencyStatus.COMPLETED.value:
+            return IdempotencyStatus.COMPLETED
+
+        # unknown: treat as in progress, the event is delivered again later
+        return IdempotencyStatus.IN_PROGRESS
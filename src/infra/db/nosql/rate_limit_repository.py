@@ -0,0 +1,83 @@
+import time
+from typing import Any, Dict
+from botocore.exceptions import ClientError
+
+from .ddb_error_handler import *
+from ....configs.conf import TABLE_RATE_LIMIT
+from ....repositories.rate_limit_repository import IRateLimitRepository
+from ...resources.handlers.db_resource import DynamoDBResourceHandler
+from ...cache import LRUTTLCache
+import logging
+
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+'''
+table: TABLE_RATE_LIMIT, partition key: rate_key (S) = <key>#<window>,
+TTL attribute: expires_at (epoch secs)
+
+shared sliding window counter, one conditional UpdateItem (ADD hits) per hit;
+the counter of the previous window is read once it's closed (it does not change
+anymore, up to the clock skew) and kept in prev_hits until the window passes;
+an expired window is removed by the TTL
+'''
+class RateLimitRepository(IRateLimitRepository):
+
+    def __init__(self, db: DynamoDBResourceHandler, prev_hits: LRUTTLCache):
+        self.__cls_name = self.__class__.__name__
+        self.rate_limit_db = db
+        self.prev_hits = prev_hits  # key -> (previous window, hits)
+
+    async def hit(self, key: str, limit: int, window_secs: int) -> bool:
+        now = time.time()
+        window = int(now // window_secs)
+        elapsed = (now % window_secs) / window_secs
+        try:
+            table = await self.__table()
+            prev = await self.__prev_hits(table, key, window)
+            allowed = limit - int(prev * (1 - elapsed))
+            if allowed <= 0:
+                return False
+
+            await table.update_item(
+                Key={'rate_key': f'{key}#{window}'},
+                UpdateExpression='ADD hits :one SET expires_at = :expires_at',
+                ConditionExpression='attribute_not_exists(hits) OR hits < :allowed',
+                ExpressionAttributeValues={
+                    ':one': 1,
+                    ':allowed': allowed,
+                    ':expires_at': (window + 2) * window_secs,
+                },
+            )
+            return True
+
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+
+            log.error(f'{self.__cls_name}.hit error. [rate_limit_req_error], key:%s, err:%s',
+                      key, client_err_msg(e))
+            raise Exception(f'rate_limit_req_error: {client_err_msg(e)}')
+
+    def stats(self) -> Dict[str, Any]:
+        return self.prev_hits.stats()
+
+    async def __table(self):
+        db = await self.rate_limit_db.access()
+        return await db.Table(TABLE_RATE_LIMIT)
+
+    async def __prev_hits(self, table: Any, key: str, window: int) -> int:
+        cached = self.prev_hits.get(key, None)
+        if cached is not None and cached[0] == window - 1:
+            return cached[1]
+
+        res = await table.get_item(
+            Key={'rate_key': f'{key}#{window - 1}'},
+            ProjectionExpression='hits',
+            ConsistentRead=True,
+        )
+        hits = int(res.get('Item', {}).get('hits', 0))
+        self.prev_hits.set(key, (window - 1, hits))
+        return hits
@@ -0,0 +1,90 @@
+from botocore.exceptions import ClientError
+
+from .ddb_error_handler import *
+from ....configs.conf import TABLE_WORKER_LEASE
+from ....repositories.worker_lease_repository import IWorkerLeaseRepository
+from ...resources.handlers.db_resource import DynamoDBResourceHandler
+from ...utils.time_util import current_seconds
+import logging
+
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+COUNTER_KEY = 'counter'
+
+
+'''
+table: TABLE_WORKER_LEASE, partition key: lease_key (S),
+TTL attribute: expires_at (epoch secs)
+
+- 'counter': atomic counter (ADD), spreads the candidates over the instances
+- 'worker#<id>': the lease of a worker id, an expired lease is treated as absent
+'''
+class WorkerLeaseRepository(IWorkerLeaseRepository):
+
+    def __init__(self, db: DynamoDBResourceHandler):
+        self.__cls_name = self.__class__.__name__
+        self.lease_db = db
+
+    async def next_candidate(self) -> int:
+        try:
+            table = await self.__table()
+            res = await table.update_item(
+                Key={'lease_key': COUNTER_KEY},
+                UpdateExpression='ADD seq :one',
+                ExpressionAttributeValues={':one': 1},
+                ReturnValues='UPDATED_NEW',
+            )
+            return int(res['Attributes']['seq'])
+
+        except ClientError as e:
+            log.error(f'{self.__cls_name}.next_candidate error. [lease_req_error], err:%s',
+                      client_err_msg(e))
+            raise Exception(f'lease_req_error: {client_err_msg(e)}')
+
+    async def acquire(self, worker_id: int, owner: str, lease_secs: int) -> bool:
+        now = current_seconds()
+        try:
+            table = await self.__table()
+            await table.put_item(
+                Item={
+                    'lease_key': f'worker#{worker_id}',
+                    'owner': owner,
+                    'expires_at': now + lease_secs,
+                },
+                ConditionExpression='attribute_not_exists(lease_key) OR expires_at < :now OR #owner = :owner',
+                ExpressionAttributeNames={'#owner': 'owner'},
+                ExpressionAttributeValues={':now': now, ':owner': owner},
+            )
+            return True
+
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+
+            log.error(f'{self.__cls_name}.acquire error. [lease_req_error], worker_id:%s, err:%s',
+                      worker_id, client_err_msg(e))
+            raise Exception(f'lease_req_error: {client_err_msg(e)}')
+
+    async def release(self, worker_id: int, owner: str):
+        try:
+            table = await self.__table()
+            await table.delete_item(
+                Key={'lease_key': f'worker#{worker_id}'},
+                ConditionExpression='#owner = :owner',
+                ExpressionAttributeNames={'#owner': 'owner'},
+                ExpressionAttributeValues={':owner': owner},
+            )
+
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return
+
+            log.error(f'{self.__cls_name}.release error. [lease_req_error], worker_id:%s, err:%s',
+                      worker_id, client_err_msg(e))
+            raise Exception(f'lease_req_error: {client_err_msg(e)}')
+
+    async def __table(self):
+        db = await self.lease_db.access()
+        return await db.Table(TABLE_WORKER_LEASE)
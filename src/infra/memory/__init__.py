@@ -0,0 +1,6 @@
+from .auth_repository import MemoryAuthRepository
+from .object_storage import MemoryObjectStorage
+from .event_repository import MemoryEventRepository
+from .idempotency_repository import MemoryIdempotencyRepository
+from .rate_limit_repository import MemoryRateLimitRepository
+from .worker_lease_repository import MemoryWorkerLeaseRepository
@@ -0,0 +1,171 @@
+import zlib
+from typing import Dict, List, Any, Tuple, Optional
+from decimal import Decimal
+from pydantic import EmailStr
+
+from .items import to_item, copy_item
+from ..db.nosql.auth_schemas import *
+from ...configs.conf import ACCOUNT_PROJECTION_ENABLED
+from ...configs.constants import ACCOUNT_PROJECTION
+from ...repositories.auth_repository import IAuthRepository
+from ...models.auth_value_objects import UpdatePasswordDTO
+import logging as log
+
+log.basicConfig(filemode='w', level=log.INFO)
+
+
+'''
+dict-backed IAuthRepository, for local load testing/profiling (no network, no credentials)
+
+tables: auths (email), accounts (aid), account_indexs (role_id);
+the db arguments are ignored
+
+asyncio-safe: there is no await between a check and its write,
+so a check-and-write runs as one step on the event loop, like a condition on DynamoDB
+- create_account: attribute_not_exists on all 3 rows, all or nothing (transaction)
+- batch_create_accounts/batch_delete_accounts: unconditional (BatchWriteItem)
+'''
+class MemoryAuthRepository(IAuthRepository):
+    def __init__(self):
+        self.__cls_name = self.__class__.__name__
+        self.auths: Dict[str, Dict] = {}
+        self.accounts: Dict[Decimal, Dict] = {}
+        self.account_indexs: Dict[Decimal, Dict] = {}
+
+    async def get_account_by_email(self, auth_db: Any, account_db: Any, email: EmailStr, fields: List):
+        auth = self.auths.get(email, None)
+        if auth is None:
+            return None
+
+        projection = auth.get(ACCOUNT_PROJECTION, None)
+        if projection:
+            return self.__project_fields(projection, fields)
+
+        account = self.accounts.get(auth['aid'], None)
+        if account is None:
+            log.error(f'{self.__cls_name}.get_account_by_email error [there_is_auth_data_but_no_account_data], \
+                email:%s fields:%s', email, fields)
+            raise Exception('there_is_auth_data_but_no_account_data')
+
+        return self.__project_fields(account, fields)
+
+    def __project_fields(self, item: Dict, fields: List) -> Dict:
+        return {field: copy_item(item[field]) for field in fields if field in item}
+
+    async def create_account(self, auth_db: Any, account_db: Any, auth: FTAuth, account: Account) -> Tuple[FTAuth, Account]:
+        auth_dict: Dict = to_item(auth.create_ts().dict())
+        account_dict: Dict = to_item(account.create_ts().dict())
+        account_index_dict: Dict = to_item(AccountIndex(
+            role_id=auth.role_id,
+            aid=auth.aid,
+        ).create_ts().dict())
+        if ACCOUNT_PROJECTION_ENABLED:
+            auth_dict[ACCOUNT_PROJECTION] = copy_item(account_dict)
+
+        if auth_dict['email'] in self.auths or \
+            account_dict['aid'] in self.accounts or \
+            account_index_dict['role_id'] in self.account_indexs:
+            log.error(f'{self.__cls_name}.create_account error [insert_req_error], \
+                auth:%s, account:%s, err:%s', auth, account, 'ConditionalCheckFailed')
+            raise Exception('insert_req_error')
+
+        self.auths[auth_dict['email']] = auth_dict
+        self.accounts[account_dict['aid']] = account_dict
+        self.account_indexs[account_index_dict['role_id']] = account_index_dict
+        return (auth, account)
+
+    async def delete_account(self, auth_db: Any, account_db: Any, auth: FTAuth):
+        self.__delete(auth)
+        return True
+
+    async def find_account(self, db: Any, aid: Decimal):
+        return copy_item(self.accounts.get(to_item(aid), None))
+
+    async def find_account_by_role_id(self, db: Any, role_id: Decimal):
+        index = self.account_indexs.get(to_item(role_id), None)
+        if index is None or 'aid' not in index:
+            return None
+
+        return copy_item(self.accounts.get(index['aid'], None))
+
+    async def find_auth(self, db: Any, email: EmailStr):
+        return copy_item(self.auths.get(email, None))
+
+    # update_item without a condition upserts a partial row on DynamoDB, which fails to parse
+    async def update_password(self, db: Any, update_password_params: UpdatePasswordDTO, expected_pass_hash: Optional[str] = None, newer_only: bool = False) -> Optional[FTAuth]:
+        auth = self.auths.get(update_password_params.email, None)
+        if auth is None:
+            log.error(f'{self.__cls_name}.update_password error [update_password_fail], \
+                update_password_params:%s', update_password_params)
+            raise Exception('update_password_fail')
+
+        if expected_pass_hash is not None and auth.get('pass_hash', None) != expected_pass_hash:
+            return None
+        updated_at = auth.get('updated_at', None)
+        if newer_only and updated_at is not None and updated_at >= update_password_params.updated_at:
+            return None
+
+        auth['pass_salt'] = update_password_params.pass_salt
+        auth['pass_hash'] = update_password_params.pass_hash
+        if expected_pass_hash is None:
+            auth['updated_at'] = to_item(update_password_params.updated_at)
+        return FTAuth.parse_obj(copy_item(auth))
+
+    async def batch_find_auths(self, db: Any, emails: List[EmailStr]) -> List[Dict]:
+        return self.__batch_get_items(self.auths, emails)
+
+    async def batch_find_accounts(self, db: Any, aids: List[Decimal]) -> List[Dict]:
+        return self.__batch_get_items(self.accounts, [to_item(aid) for aid in aids])
+
+    async def batch_find_by_role_ids(self, db: Any, role_ids: List[Decimal]) -> List[Dict]:
+        indexes = self.__batch_get_items(self.account_indexs, [to_item(role_id) for role_id in role_ids])
+        aids = [item['aid'] for item in indexes if 'aid' in item]
+        return self.__batch_get_items(self.accounts, aids)
+
+    async def batch_create_accounts(self, auth_db: Any, account_db: Any, accounts: List[Tuple[FTAuth, Account]]):
+        for (auth, account) in accounts:
+            auth_dict: Dict = to_item(auth.create_ts().dict())
+            account_dict: Dict = to_item(account.create_ts().dict())
+            account_index_dict: Dict = to_item(AccountIndex(
+                role_id=auth.role_id,
+                aid=auth.aid,
+            ).create_ts().dict())
+            if ACCOUNT_PROJECTION_ENABLED:
+                auth_dict[ACCOUNT_PROJECTION] = copy_item(account_dict)
+
+            self.accounts[account_dict['aid']] = account_dict
+            self.account_indexs[account_index_dict['role_id']] = account_index_dict
+            self.auths[auth_dict['email']] = auth_dict
+
+        return len(accounts)
+
+    async def batch_delete_accounts(self, auth_db: Any, account_db: Any, auths: List[FTAuth]):
+        for auth in auths:
+            self.__delete(auth)
+
+        return len(auths)
+
+    '''
+    one page of a "parallel scan": the emails are assigned to the segments by crc32,
+    the pages are in email order, last_evaluated_key is None on the last page
+    '''
+    async def scan_auths(self, db: Any, segment: int, total_segments: int, start_key: Optional[Dict] = None, limit: int = 100) -> Tuple[List[Dict], Optional[Dict]]:
+        emails = sorted(
+            email for email in self.auths
+            if zlib.crc32(email.encode('utf-8')) % total_segments == segment
+        )
+        if start_key:
+            emails = [email for email in emails if email > start_key['email']]
+
+        page = emails[:limit]
+        last_key = {'email': page[-1]} if len(emails) > limit else None
+        return ([copy_item(self.auths[email]) for email in page], last_key)
+
+    def __delete(self, auth: FTAuth):
+        self.auths.pop(auth.email, None)
+        self.accounts.pop(to_item(auth.aid), None)
+        self.account_indexs.pop(to_item(auth.role_id), None)
+
+    # duplicated keys are read once, like BatchGetItem
+    def __batch_get_items(self, table: Dict, keys: List) -> List[Dict]:
+        return [copy_item(table[key]) for key in dict.fromkeys(keys) if key in table]
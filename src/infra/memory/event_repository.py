@@ -0,0 +1,55 @@
+from collections import deque
+from typing import Deque, Dict, Tuple
+from decimal import Decimal
+
+from .items import to_item, copy_item
+from ..db.nosql.event_schemas import *
+from ...models.event_vos import *
+from ...repositories.event_repository import IEventRepository
+import logging
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+'''
+dict-backed IEventRepository, same semantics as EventRepository:
+- event_entity (role_id, event_id) is updated only if updated_at is newer than
+  the existing one, created_at of the existing one is preserved
+- event_log_entity is appended only if the event_entity is updated
+the logs are bounded (max_logs), the oldest ones are dropped
+'''
+class MemoryEventRepository(IEventRepository):
+
+    def __init__(self, max_logs: int):
+        self.events: Dict[Tuple[Decimal, Decimal], Dict] = {}
+        self.event_logs: Deque[Dict] = deque(maxlen=max_logs)
+
+    async def append_pub_event_log(self, event: PubEventDetailVO):
+        self.__append_event_log(event.dict(), 'upsert_publish_event_log')
+
+    async def append_sub_event_log(self, event: SubEventDetailVO):
+        self.__append_event_log(event.dict(), 'upsert_subscribe_event_log')
+
+    def find_event(self, role_id: int, event_id: int):
+        return copy_item(self.events.get((to_item(role_id), to_item(event_id)), None))
+
+    def __append_event_log(self, event_dict: Dict, label: str):
+        event_entity: EventEntity = EventEntity \
+            .parse_obj(event_dict) \
+            .create_ts() # created_at
+        item = to_item(event_entity.dict())
+        key = (item['role_id'], item['event_id'])
+
+        existing = self.events.get(key, None)
+        if existing is not None:
+            if existing.get('updated_at', None) is not None and \
+                existing['updated_at'] >= item['updated_at']:
+                log.info('%s. updated_at is not newer than the existing one. new: %s',
+                         label, event_entity.updated_at)
+                return
+
+            item['created_at'] = existing.get('created_at', item['created_at'])
+
+        self.events[key] = item
+        self.event_logs.append(to_item(EventLogEntity.parse_event_entity(event_entity).dict()))
@@ -0,0 +1,45 @@
+from typing import Dict, Optional
+
+from ...configs.constants import IdempotencyStatus
+from ...repositories.idempotency_repository import IIdempotencyRepository
+from ..utils.time_util import current_seconds
+
+
+'''
+dict-backed IIdempotencyRepository, same conditions as IdempotencyRepository:
+an expired claim is treated as absent, complete/release only by the owner;
+there is no TTL, an expired item stays until its key is claimed again
+'''
+class MemoryIdempotencyRepository(IIdempotencyRepository):
+
+    def __init__(self):
+        self.items: Dict[str, Dict] = {}
+
+    async def claim(self, key: str, owner: str, lease_secs: int) -> Optional[IdempotencyStatus]:
+        now = current_seconds()
+        item = self.items.get(key, None)
+        if item is not None and item['expires_at'] >= now:
+            return IdempotencyStatus(item['status'])
+
+        self.items[key] = {
+            'status': IdempotencyStatus.IN_PROGRESS.value,
+            'owner': owner,
+            'expires_at': now + lease_secs,
+        }
+        return None
+
+    async def complete(self, key: str, owner: str, ttl_secs: int):
+        item = self.items.get(key, None)
+        if item is None or item['owner'] != owner:
+            return
+
+        item['status'] = IdempotencyStatus.COMPLETED.value
+        item['expires_at'] = current_seconds() + ttl_secs
+
+    async def release(self, key: str, owner: str):
+        item = self.items.get(key, None)
+        if item is None or item['owner'] != owner or \
+            item['status'] != IdempotencyStatus.IN_PROGRESS.value:
+            return
+
+        self.items.pop(key, None)
@@ -0,0 +1,32 @@
+import copy
+from enum import Enum
+from decimal import Decimal
+from typing import Any
+
+
+'''
+the items are stored the way boto3 returns them from DynamoDB:
+numbers as Decimal, enums as their values, containers copied, so the callers never share
+a stored item (read: copy_item, write: to_item)
+'''
+def to_item(value: Any) -> Any:
+    if isinstance(value, bool):
+        return value
+
+    if isinstance(value, Enum):
+        return to_item(value.value)
+
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+
+    if isinstance(value, dict):
+        return {k: to_item(v) for (k, v) in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [to_item(v) for v in value]
+
+    return value
+
+
+def copy_item(item: Any) -> Any:
+    return copy.deepcopy(item) if item is not None else None
@@ -0,0 +1,59 @@
+import json
+from typing import Dict
+from .items import copy_item
+from ...repositories.object_storage import IObjectStorage
+from ...configs.exceptions import *
+import logging as log
+
+log.basicConfig(filemode='w', level=log.INFO)
+
+
+'''
+dict-backed IObjectStorage: bucket -> email_info (the json of <bucket>/email_info.json)
+
+same semantics as GlobalObjectStorage:
+- update: NotFoundException if the file is missing or the version does not match,
+  otherwise merges newdata and returns the json
+- init_if_absent: atomic create-if-absent (like If-None-Match: *)
+no await between the version check and the write, so it is a compare-and-swap
+'''
+class MemoryObjectStorage(IObjectStorage):
+    def __init__(self):
+        self.__cls_name = self.__class__.__name__
+        self.objects: Dict[str, Dict] = {}
+
+    async def init(self, bucket, version):
+        self.objects[str(bucket)] = {'version': version}
+        return version
+
+    async def init_if_absent(self, bucket, version):
+        data = self.objects.get(str(bucket), None)
+        if data is not None:
+            return copy_item(data)
+
+        self.objects[str(bucket)] = {'version': version}
+        return None
+
+    async def update(self, bucket, version, newdata):
+        data = self.objects.get(str(bucket), None)
+        if data is None:
+            log.error(f'{self.__cls_name}.update [no version found] \
+                bucket:%s, version:%s, newdata:%s', bucket, version, newdata)
+            raise NotFoundException(msg=f'file:{bucket} not found')
+
+        if 'version' in data and data['version'] != version:
+            log.error(f'{self.__cls_name}.update [no version found] \
+                bucket:%s, version:%s, newdata:%s, data:%s', bucket, version, newdata, data)
+            raise NotFoundException(msg='no version there OR invalid version')
+
+        # json round trip: the same types as the file on S3
+        data = json.loads(json.dumps({**data, **newdata}))
+        self.objects[str(bucket)] = data
+        return json.dumps(data)
+
+    async def delete(self, bucket):
+        self.objects.pop(str(bucket), None)
+        return True
+
+    async def find(self, bucket):
+        return copy_item(self.objects.get(str(bucket), None))
@@ -0,0 +1,46 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict
+
+from ...repositories.rate_limit_repository import IRateLimitRepository
+
+
+'''
+sliding window counter per key: [window, previous hits, current hits]
+the hits of the previous window are weighted by the part of it still in the sliding window,
+O(1) memory per key, the least recently used keys are dropped above max_keys
+'''
+class MemoryRateLimitRepository(IRateLimitRepository):
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max(1, int(max_keys))
+        self.windows: OrderedDict = OrderedDict()  # key -> [window, prev, curr]
+        self.evictions = 0
+
+    async def hit(self, key: str, limit: int, window_secs: int) -> bool:
+        now = time.time()
+        window = int(now // window_secs)
+        entry = self.windows.get(key, None)
+        if entry is None:
+            entry = self.windows[key] = [window, 0, 0]
+            while len(self.windows) > self.max_keys:
+                self.windows.popitem(last=False)
+                self.evictions += 1
+
+        elif entry[0] != window:
+            prev = entry[2] if entry[0] == window - 1 else 0
+            entry[:] = [window, prev, 0]
+
+        self.windows.move_to_end(key)
+        elapsed = (now % window_secs) / window_secs
+        if entry[1] * (1 - elapsed) + entry[2] >= limit:
+            return False
+
+        entry[2] += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'keys': len(self.windows),
+            'evictions': self.evictions,
+        }
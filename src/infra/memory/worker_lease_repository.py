@@ -0,0 +1,33 @@
+from typing import Dict
+
+from ...repositories.worker_lease_repository import IWorkerLeaseRepository
+from ..utils.time_util import current_seconds
+
+
+'''
+dict-backed IWorkerLeaseRepository, same conditions as WorkerLeaseRepository
+(one process only, so it never has to share the worker ids)
+'''
+class MemoryWorkerLeaseRepository(IWorkerLeaseRepository):
+
+    def __init__(self):
+        self.counter = 0
+        self.leases: Dict[int, Dict] = {}
+
+    async def next_candidate(self) -> int:
+        self.counter += 1
+        return self.counter
+
+    async def acquire(self, worker_id: int, owner: str, lease_secs: int) -> bool:
+        now = current_seconds()
+        lease = self.leases.get(worker_id, None)
+        if lease is not None and lease['expires_at'] >= now and lease['owner'] != owner:
+            return False
+
+        self.leases[worker_id] = {'owner': owner, 'expires_at': now + lease_secs}
+        return True
+
+    async def release(self, worker_id: int, owner: str):
+        lease = self.leases.get(worker_id, None)
+        if lease is not None and lease['owner'] == owner:
+            self.leases.pop(worker_id, None)
@@ -1,2 +1,3 @@
 from .event_bridge_mq_adapter import EventBridgeMqAdapter
 from .sqs_mq_adapter import SqsMqAdapter
+from .batch_buffer import COALESCED
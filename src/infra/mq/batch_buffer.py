@@ -0,0 +1,157 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+'''
+coalesce single submits into batch calls
+
+- a batch is sent when it reaches max_items / max_bytes,
+  or linger_secs after its first item arrived
+- send_batch(items) returns one result per item (same order),
+  an Exception instance marks the failure of that item only
+- submit() waits until its own item is sent and returns/raises its result
+- compaction: a pending item with the same key is replaced by the newer one (version),
+  the superseded submit returns COALESCED without being sent; a larger replacement
+  which would overflow max_bytes is enqueued as a new item instead (the old one is dropped)
+'''
+COALESCED = 'coalesced'
+
+
+class BatchBuffer:
+    def __init__(
+        self,
+        label: str,
+        send_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_items: int,
+        max_bytes: int,
+        linger_secs: float,
+    ):
+        self.label = label
+        self.send_batch = send_batch
+        self.max_items = max(1, max_items)
+        self.max_bytes = max_bytes
+        self.linger_secs = linger_secs
+        self.pending: List = []  # [(item, size, future)]
+        self.pending_bytes = 0
+        self.pending_keys: Dict[Hashable, Tuple[int, int]] = {}  # key -> (index in pending, version)
+        self.coalesced = 0
+        self.timer: asyncio.TimerHandle = None
+        self.inflight: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any, size: int, key: Optional[Hashable] = None, version: int = 0) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        if key is not None and key in self.pending_keys:
+            (index, pending_version) = self.pending_keys[key]
+            if version < pending_version:
+                self.coalesced += 1
+                log.info('[%s] coalesced, a newer item is pending, key:%s', self.label, key)
+                return COALESCED
+
+            if self.pending_bytes + size - self.pending[index][1] <= self.max_bytes:
+                self.__replace(key, version, item, size, future)
+            else:
+                self.__drop(key)
+                self.__enqueue(item, size, key, version, future)
+
+        else:
+            self.__enqueue(item, size, key, version, future)
+
+        if len(self.pending) >= self.max_items or self.pending_bytes >= self.max_bytes:
+            self.__flush_now()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.linger_secs, self.__flush_now)
+
+        return await future
+
+    async def flush(self):
+        self.__flush_now()
+        if self.inflight:
+            await asyncio.gather(*self.inflight, return_exceptions=True)
+
+    async def close(self):
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'label': self.label,
+            'pending': len(self.pending),
+            'inflight_batches': len(self.inflight),
+            'coalesced': self.coalesced,
+        }
+
+    def __flush_now(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        if not self.pending:
+            return
+
+        batch = self.pending
+        self.pending = []
+        self.pending_bytes = 0
+        self.pending_keys = {}
+
+        task = asyncio.get_running_loop().create_task(self.__send(batch))
+        self.inflight.add(task)
+        task.add_done_callback(self.inflight.discard)
+
+    def __enqueue(self, item: Any, size: int, key: Optional[Hashable], version: int, future: asyncio.Future):
+        if self.pending and self.pending_bytes + size > self.max_bytes:
+            self.__flush_now()
+
+        if key is not None:
+            self.pending_keys[key] = (len(self.pending), version)
+        self.pending.append((item, size, future))
+        self.pending_bytes += size
+
+    # the replacement fits in max_bytes
+    def __replace(self, key: Hashable, version: int, item: Any, size: int, future: asyncio.Future):
+        self.coalesced += 1
+        (index, _) = self.pending_keys[key]
+        (_, pending_size, pending_future) = self.pending[index]
+        self.pending[index] = (item, size, future)
+        self.pending_keys[key] = (index, version)
+        self.pending_bytes += size - pending_size
+        if not pending_future.done():
+            pending_future.set_result(COALESCED)
+        log.info('[%s] coalesced, replaced by the newer item, key:%s', self.label, key)
+
+    # the replacement would overflow max_bytes: drop the pending one, the new one is enqueued
+    def __drop(self, key: Hashable):
+        self.coalesced += 1
+        (index, _) = self.pending_keys.pop(key)
+        (_, pending_size, pending_future) = self.pending.pop(index)
+        self.pending_bytes -= pending_size
+        for (other, (other_index, other_version)) in self.pending_keys.items():
+            if other_index > index:
+                self.pending_keys[other] = (other_index - 1, other_version)
+        if not pending_future.done():
+            pending_future.set_result(COALESCED)
+        log.info('[%s] coalesced, dropped for a larger newer item, key:%s', self.label, key)
+
+    async def __send(self, batch: List):
+        items = [item for (item, _, _) in batch]
+        try:
+            results = await self.send_batch(items)
+            if len(results) != len(items):
+                raise Exception(f'expect {len(items)} results, got {len(results)}')
+
+        except Exception as e:
+            log.error('[%s] send batch error, size:%s, err:%s', self.label, len(items), e)
+            results = [e] * len(items)
+
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
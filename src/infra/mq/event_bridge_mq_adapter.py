@@ -1,5 +1,5 @@
 import json
-from typing import Callable
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
 from ..resources.handlers import EventBridgeResourceHandler
 from ...models.event_vos import EventDetailVO
 from ...configs.conf import (
@@ -9,18 +9,44 @@ from ...configs.conf import (
     EVENT_DETAIL_TYPE,
 )
 from ..utils.time_util import current_utc_time
+from .batch_buffer import BatchBuffer
 import logging
 
 logging.basicConfig(level=logging.DEBUG)
 log = logging.getLogger(__name__)
 
+# PutEvents limits
+MAX_ENTRIES = 10
+MAX_BYTES = 256 * 1024
+TIME_BYTES = 14
+
+
 class EventBridgeMqAdapter:
-    def __init__(self, event_bus_rsc: EventBridgeResourceHandler):
+    '''
+    linger_secs > 0: events are buffered and sent by put_events in batches,
+    publish_message still returns/raises per event
+    compaction(event_dict) -> (key, version) | None: buffered events with the same key
+    are collapsed into the newest one, the others return COALESCED
+    '''
+    def __init__(
+        self,
+        event_bus_rsc: EventBridgeResourceHandler,
+        linger_secs: float = 0,
+        compaction: Optional[Callable[[Dict], Optional[Tuple[Hashable, int]]]] = None,
+    ):
         self.event_bus_rsc = event_bus_rsc
+        self.compaction = compaction
+        self.buffer = None
+        if linger_secs > 0:
+            self.buffer = BatchBuffer(
+                label='EventBridge',
+                send_batch=self.__put_events,
+                max_items=MAX_ENTRIES,
+                max_bytes=MAX_BYTES,
+                linger_secs=linger_secs,
+            )
 
     async def publish_message(self, event: EventDetailVO):
-        events_client = await  self.event_bus_rsc.access()
-            
         # TODO: 配置或自定義重試機制
         event_dict = event.dict()
         event_dict.update({
@@ -34,9 +60,55 @@ class EventBridgeMqAdapter:
             'Resources': [],
             'Time': current_utc_time(),
         }
-        
-        response = await events_client.put_events(Entries=[entry])
-        log.info('Event sent: %s', json.dumps(response))
+
+        if self.buffer:
+            (key, version) = self.__compaction_key(event_dict)
+            return await self.buffer.submit(entry, self.__entry_size(entry), key, version)
+
+        result = (await self.__put_events([entry]))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
 
     async def subscribe_messages(self, callee: Callable, **kwargs):
-        pass
\ No newline at end of file
+        pass
+
+    def __compaction_key(self, event_dict: Dict) -> Tuple[Optional[Hashable], int]:
+        compaction = self.compaction(event_dict) if self.compaction else None
+        return compaction if compaction is not None else (None, 0)
+
+    # flush buffered events, call it on shutdown
+    async def close(self):
+        if self.buffer:
+            await self.buffer.close()
+
+    '''
+    return one result per entry:
+    EventId, or an Exception for the failed entry (FailedEntryCount > 0)
+    '''
+    async def __put_events(self, entries: List[Dict]) -> List[Any]:
+        events_client = await self.event_bus_rsc.access()
+        response = await events_client.put_events(Entries=entries)
+        log.info('Events sent: %s, FailedEntryCount: %s',
+                 len(entries), response.get('FailedEntryCount', 0))
+
+        results = []
+        for entry, entry_res in zip(entries, response['Entries']):
+            if entry_res.get('ErrorCode', None):
+                log.error('Event sent fail, ErrorCode: %s, ErrorMessage: %s, Detail: %s',
+                          entry_res['ErrorCode'], entry_res.get('ErrorMessage', None), entry['Detail'])
+                results.append(Exception(
+                    f"put_events failed: {entry_res['ErrorCode']} {entry_res.get('ErrorMessage', '')}"))
+            else:
+                results.append(entry_res.get('EventId', None))
+
+        return results
+
+    # PutEvents entry size
+    def __entry_size(self, entry: Dict) -> int:
+        size = TIME_BYTES
+        for field in ('Source', 'DetailType', 'Detail'):
+            size += len(entry[field].encode('utf-8'))
+        for resource in entry['Resources']:
+            size += len(resource.encode('utf-8'))
+        return size
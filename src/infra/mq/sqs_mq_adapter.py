@@ -2,30 +2,80 @@ import json
 import asyncio
 import aioboto3
 from botocore.exceptions import ClientError
-from typing import Callable
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
 from ...models.event_vos import EventDetailVO
 from ..resources.handlers import SQSResourceHandler
 from ...configs.conf import (
     SQS_MAX_MESSAGES,
     SQS_WAIT_SECS,
+    SQS_CONSUMER_CONCURRENCY,
+    SQS_VISIBILITY_TIMEOUT,
+    SQS_DELETE_LINGER_SECS,
 )
+from .batch_buffer import BatchBuffer
 import logging
 
 logging.basicConfig(level=logging.DEBUG)
 log = logging.getLogger(__name__)
 
+# SendMessageBatch/DeleteMessageBatch limits
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 256 * 1024
+
 
 class SqsMqAdapter:
-    def __init__(self, sqs_rsc: SQSResourceHandler):
+    '''
+    linger_secs > 0: messages are buffered and sent by send_message_batch,
+    publish_message still returns/raises per message
+    compaction(event_dict) -> (key, version) | None: messages with the same key
+    are collapsed into the newest one, in the producer buffer and in each received batch
+    (the superseded ones are acked without calling the callee)
+
+    consumer: up to SQS_CONSUMER_CONCURRENCY messages in flight, the receive loop
+    asks for the free slots only; an acked message is deleted right after its handler
+    (coalesced into delete_message_batch calls), its heartbeat runs until the delete is done
+    '''
+    def __init__(
+        self,
+        sqs_rsc: SQSResourceHandler,
+        linger_secs: float = 0,
+        compaction: Optional[Callable[[Dict], Optional[Tuple[Hashable, int]]]] = None,
+    ):
         self.sqs_rsc = sqs_rsc
+        self.compaction = compaction
         self.sqs_label = self.sqs_rsc.label
         self.ratio = 0.2
         self.delay = float(SQS_WAIT_SECS * self.ratio)
         self.lock = asyncio.Lock()
         self.loop = False
         self.callee = None
+        self.concurrency = max(1, SQS_CONSUMER_CONCURRENCY)
+        self.inflight: Set[asyncio.Task] = set()
+        self.buffer = None
+        self.deletes = BatchBuffer(
+            label=f'SQS[{self.sqs_label}] delete',
+            send_batch=self.__delete_messages,
+            max_items=MAX_BATCH_ENTRIES,
+            max_bytes=MAX_BATCH_BYTES,
+            linger_secs=SQS_DELETE_LINGER_SECS,
+        )
+        if linger_secs > 0:
+            self.buffer = BatchBuffer(
+                label=f'SQS[{self.sqs_label}]',
+                send_batch=self.__send_messages,
+                max_items=MAX_BATCH_ENTRIES,
+                max_bytes=MAX_BATCH_BYTES,
+                linger_secs=linger_secs,
+            )
 
     async def publish_message(self, event: EventDetailVO):
+        if self.buffer:
+            event_dict = event.dict()
+            message_body = json.dumps(event_dict)
+            (key, version) = self.__compaction_key(event_dict)
+            return await self.buffer.submit(
+                message_body, len(message_body.encode('utf-8')), key, version)
+
         try:
             sqs_client = await self.sqs_rsc.access()
             message_body = json.dumps(event.dict())
@@ -43,6 +93,46 @@ class SqsMqAdapter:
                       self.sqs_label, str(e))
             raise e
 
+    def __compaction_key(self, event_dict: Dict) -> Tuple[Optional[Hashable], int]:
+        compaction = self.compaction(event_dict) if self.compaction else None
+        return compaction if compaction is not None else (None, 0)
+
+    # flush buffered messages & pending deletes, call it on shutdown
+    async def close(self):
+        if self.buffer:
+            await self.buffer.close()
+        await self.deletes.close()
+
+    '''
+    return one result per message body:
+    {'MessageId': ...}, or an Exception for the failed message
+    '''
+    async def __send_messages(self, message_bodies: List[str]) -> List[Any]:
+        sqs_client = await self.sqs_rsc.access()
+        response = await sqs_client.send_message_batch(
+            QueueUrl=self.sqs_rsc.queue_url,
+            Entries=[
+                {'Id': str(i), 'MessageBody': body}
+                for i, body in enumerate(message_bodies)
+            ],
+        )
+
+        results: List[Any] = [None] * len(message_bodies)
+        for successful in response.get('Successful', []):
+            results[int(successful['Id'])] = {'MessageId': successful['MessageId']}
+        for failed in response.get('Failed', []):
+            log.error('SQS[%s]: Error sending message to SQS, Code: %s, Message: %s',
+                      self.sqs_label, failed.get('Code', None), failed.get('Message', None))
+            results[int(failed['Id'])] = Exception(
+                f"send_message_batch failed: {failed.get('Code', '')} {failed.get('Message', '')}")
+
+        log.info('SQS[%s]: msgs are sent. sent: %s, failed: %s', self.sqs_label,
+                 len(response.get('Successful', [])), len(response.get('Failed', [])))
+        return [
+            result if result is not None else Exception('send_message_batch: no result')
+            for result in results
+        ]
+
     async def trigger_subscribe_messages(self):
         await self.subscribe_messages(self.callee)
 
@@ -55,7 +145,7 @@ class SqsMqAdapter:
             self.loop = False
 
     async def access_sqs_client(self):
-        # promise `sqs_client` only initialized once by sqs_rsc.lock
+        # `sqs_client` is initialized once (single flight) by sqs_rsc
         sqs_client = await self.sqs_rsc.access(
             trigger_subscription=self.trigger_subscribe_messages
         )
@@ -69,41 +159,42 @@ class SqsMqAdapter:
                 return
             self.loop = True
 
-        self.callee = callee
-        sqs_client = await self.access_sqs_client()
+        try:
+            self.callee = callee
+            sqs_client = await self.access_sqs_client()
+
+            # apply asyncio.lock to protect the loop
+            # no fixed sleep: keep receiving while messages are flowing
+            while await self.is_listening():
+                await self.__receive_batch_messages(sqs_client, callee, **kwargs)
 
-        # apply asyncio.lock to protect the loop
-        while await self.is_listening():
-            await self.__receive_batch_messages(sqs_client, callee, **kwargs)
-            await asyncio.sleep(1)  # Avoid busy waiting
+        finally:
+            # also on CancelledError/errors: a later subscribe enters the loop again
+            self.loop = False
 
 
     async def __receive_batch_messages(self, sqs_client: aioboto3.Session.client, callee: Callable, **kwargs):
         try:
+            # wait for a free slot, then receive as many messages as the free slots
+            while len(self.inflight) >= self.concurrency:
+                await asyncio.wait(self.inflight, return_when=asyncio.FIRST_COMPLETED)
+
             response = await sqs_client.receive_message(
                 QueueUrl=self.sqs_rsc.queue_url,
-                MaxNumberOfMessages=SQS_MAX_MESSAGES,
+                MaxNumberOfMessages=min(SQS_MAX_MESSAGES, self.concurrency - len(self.inflight)),
                 WaitTimeSeconds=SQS_WAIT_SECS,
+                VisibilityTimeout=SQS_VISIBILITY_TIMEOUT,
             )
 
+            # main process: each message is handled in its own task,
+            # the loop goes on receiving without waiting for them
             messages = response.get('Messages', [])
+            messages = self.__compact_messages(messages)
             for message in messages:
-                log.info("SQS[%s]: Message received: %s",
-                         self.sqs_label, message['Body'])
-                request_body = json.loads(message['Body'])
-
-                async def ack():
-                    await sqs_client.delete_message(
-                        QueueUrl=self.sqs_rsc.queue_url,
-                        ReceiptHandle=message['ReceiptHandle'],
-                    )
-
-                # ack: handled by callee
-                request_body.update({'ack': ack})
-
-                # main process
-                await callee(request_body, **kwargs)
-                # await ack() >> ack: handled by callee
+                task = asyncio.create_task(
+                    self.__process_message(sqs_client, callee, message, **kwargs))
+                self.inflight.add(task)
+                task.add_done_callback(self.inflight.discard)
 
             # sleep 1 secs if there's no msgs
             if not messages:
@@ -123,3 +214,116 @@ class SqsMqAdapter:
             log.info('SQS[%s]: break loop due to Exception ...',
                         self.sqs_label)
             await self.stop_listening()
+
+    async def __process_message(self, sqs_client: aioboto3.Session.client, callee: Callable, message: Dict, **kwargs):
+        log.info("SQS[%s]: Message received: %s",
+                 self.sqs_label, message['Body'])
+        heartbeat = asyncio.create_task(
+            self.__heartbeat(sqs_client, message['ReceiptHandle']))
+        acked = False
+        try:
+            request_body = json.loads(message['Body'])
+
+            async def ack():
+                nonlocal acked
+                acked = True
+
+            # ack: handled by callee
+            request_body.update({'ack': ack})
+            await callee(request_body, **kwargs)
+
+        except Exception as e:
+            # not acked: the message is received again after the visibility timeout
+            log.error('SQS[%s]: process message error: %s, msg ID: %s',
+                      self.sqs_label, str(e), message.get('MessageId', None))
+
+        try:
+            # still invisible (heartbeat) until it is deleted
+            if acked:
+                await self.__delete_message(message)
+
+        finally:
+            heartbeat.cancel()
+
+    async def __delete_message(self, message: Dict):
+        try:
+            await self.deletes.submit(message['ReceiptHandle'], len(message['ReceiptHandle']))
+
+        except Exception as e:
+            # received again after the visibility timeout
+            log.error('SQS[%s]: delete message error: %s, msg ID: %s',
+                      self.sqs_label, str(e), message.get('MessageId', None))
+
+    # keep the newest message per compaction key, the superseded ones are acked
+    def __compact_messages(self, messages: List[Dict]) -> List[Dict]:
+        if self.compaction is None or len(messages) < 2:
+            return messages
+
+        newest: Dict[Hashable, Tuple[int, int]] = {}  # key -> (version, index)
+        superseded = set()
+        for (i, message) in enumerate(messages):
+            try:
+                compaction = self.compaction(json.loads(message['Body']))
+            except Exception:
+                # processed (and reported) as usual
+                continue
+
+            if compaction is None:
+                continue
+
+            (key, version) = compaction
+            if key in newest:
+                (newest_version, newest_index) = newest[key]
+                if version < newest_version:
+                    superseded.add(i)
+                    continue
+                superseded.add(newest_index)
+
+            newest[key] = (version, i)
+
+        for i in superseded:
+            log.info('SQS[%s]: message coalesced by a newer one, msg ID: %s',
+                     self.sqs_label, messages[i].get('MessageId', None))
+            task = asyncio.create_task(self.__delete_message(messages[i]))
+            self.inflight.add(task)
+            task.add_done_callback(self.inflight.discard)
+
+        return [message for (i, message) in enumerate(messages) if not i in superseded]
+
+    # keep a slow message invisible while its handler is still running
+    async def __heartbeat(self, sqs_client: aioboto3.Session.client, receipt_handle: str):
+        interval = max(1.0, SQS_VISIBILITY_TIMEOUT / 2)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await sqs_client.change_message_visibility(
+                    QueueUrl=self.sqs_rsc.queue_url,
+                    ReceiptHandle=receipt_handle,
+                    VisibilityTimeout=SQS_VISIBILITY_TIMEOUT,
+                )
+            except Exception as e:
+                log.error('SQS[%s]: heartbeat error: %s', self.sqs_label, str(e))
+                return
+
+    '''
+    return one result per receipt handle:
+    True, or an Exception for the message not deleted
+    '''
+    async def __delete_messages(self, receipt_handles: List[str]) -> List[Any]:
+        sqs_client = await self.sqs_rsc.access()
+        response = await sqs_client.delete_message_batch(
+            QueueUrl=self.sqs_rsc.queue_url,
+            Entries=[
+                {'Id': str(i), 'ReceiptHandle': receipt_handle}
+                for i, receipt_handle in enumerate(receipt_handles)
+            ],
+        )
+
+        results: List[Any] = [True] * len(receipt_handles)
+        for failed in response.get('Failed', []):
+            log.error('SQS[%s]: delete message fail, Id: %s, Code: %s, Message: %s',
+                      self.sqs_label, failed['Id'], failed.get('Code', None), failed.get('Message', None))
+            results[int(failed['Id'])] = Exception(
+                f"delete_message_batch failed: {failed.get('Code', '')} {failed.get('Message', '')}")
+
+        return results
@@ -1,6 +1,9 @@
-from ._resource import ResourceHandler
+from ._resource import ResourceHandler, ClientResourceHandler
 from .storage_resource import S3ResourceHandler
-from .db_resource import DynamoDBResourceHandler
+from .db_resource import (
+    DynamoDBResourceHandler,
+    PooledDynamoDBResourceHandler,
+)
 from .email_resource import SESResourceHandler
 from .mq_resource import (
     SQSResourceHandler, 
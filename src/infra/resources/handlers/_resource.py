@@ -1,5 +1,17 @@
+import asyncio
 from abc import ABC, abstractmethod
+from contextlib import AsyncExitStack
+from typing import Any, Dict, Optional
 from ...utils.time_util import current_seconds
+import logging
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+# the longest a call can take on a client: every attempt (botocore retries) times out
+def call_timeout_secs(connect_timeout: float, read_timeout: float, max_attempts: int) -> float:
+    return (connect_timeout + read_timeout) * max(1, max_attempts)
 
 
 class ResourceHandler(ABC):
@@ -26,10 +38,16 @@ class ResourceHandler(ABC):
     async def accessing(self, **kwargs):
         pass
 
+    # False: not initialized yet (lazy), nothing to probe
+    @abstractmethod
+    def initialized(self) -> bool:
+        pass
+
     # 定期激活，維持連線和連線池
     # Regular activation to maintain connections and connection pools
+    # return True if the resource is healthy, False if it had to be re-initialized
     @abstractmethod
-    async def probe(self):
+    async def probe(self) -> bool:
         pass
 
     @abstractmethod
@@ -42,3 +60,137 @@ class ResourceHandler(ABC):
     def timeout(self) -> bool:
         connect_time = current_seconds() - self.access_time
         return self.max_timeout < connect_time
+
+
+class ClientResourceHandler(ResourceHandler):
+    '''
+    lifecycle of one client/resource (aioboto3 client or resource):
+
+    - fast path: once initialized, access() returns the resource without any lock
+    - single flight: the first caller starts the init task, the concurrent callers
+      await the same task; a failed probe re-initializes the same way
+    - the client context is kept open in an AsyncExitStack until close()/re-init
+      (leaving `async with session.client(...)` would close the client)
+    - on re-init, the replaced client is closed after close_grace_secs
+      (longer than a call can take), so its in-flight calls complete
+
+    child classes implement _open() and _validate()
+    '''
+    LABEL = 'Resource'
+
+    def __init__(self) -> None:
+        super().__init__()
+        # child classes set it by their timeouts (call_timeout_secs)
+        self.close_grace_secs: float = 120.0
+
+        self._resource: Any = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._init_task: Optional[asyncio.Task] = None
+        # replaced clients waiting for their in-flight calls: close task -> stack
+        self._retired: Dict[asyncio.Task, AsyncExitStack] = {}
+
+    async def initial(self):
+        if self._resource is None:
+            await self._single_flight(reset=False)
+
+
+    # child class may override this function
+    async def accessing(self, **kwargs):
+        resource = self._resource
+        if resource is not None:
+            return resource
+
+        return await self._single_flight(reset=False)
+
+    def initialized(self) -> bool:
+        return self._resource is not None
+
+    async def probe(self) -> bool:
+        try:
+            await self._validate(self._resource)
+            return True
+
+        except Exception as e:
+            log.error(f'{self.LABEL} Client Error: %s', e.__str__())
+            await self.reinitial()
+            return False
+
+    # re-create the client, the one in use is closed close_grace_secs after the new one is ready
+    async def reinitial(self):
+        await self._single_flight(reset=True)
+
+    async def close(self):
+        self._resource = None
+        stack = self._exit_stack
+        self._exit_stack = None
+
+        # shutting down: the replaced clients are not waited for
+        retired = list(self._retired.items())
+        self._retired = {}
+        for (task, _) in retired:
+            task.cancel()
+        for (_, retired_stack) in retired:
+            await self.__close_stack(retired_stack)
+
+        if stack is not None:
+            await self.__close_stack(stack)
+
+    # open the client within the stack, e.g. stack.enter_async_context(session.client(...))
+    @abstractmethod
+    async def _open(self, stack: AsyncExitStack) -> Any:
+        pass
+
+    # a network call, raises if the resource is unhealthy
+    @abstractmethod
+    async def _validate(self, resource: Any):
+        pass
+
+    async def _single_flight(self, reset: bool) -> Any:
+        task = self._init_task
+        if task is None or task.done():
+            if not reset and self._resource is not None:
+                return self._resource
+
+            task = self._init_task = asyncio.get_running_loop().create_task(self.__connect(reset))
+
+        # a cancelled caller doesn't cancel the init of the others
+        return await asyncio.shield(task)
+
+    async def __connect(self, reset: bool) -> Any:
+        stack = AsyncExitStack()
+        try:
+            resource = await self._open(stack)
+        except Exception as e:
+            log.error(f'{self.LABEL} open client error: %s', e.__str__())
+            await stack.aclose()
+            raise e
+
+        try:
+            await self._validate(resource)
+        except Exception as e:
+            # keep the client, the following calls/probes retry the connection
+            log.error(f'{self.LABEL} initial validation error: %s', e.__str__())
+
+        old_stack = self._exit_stack if reset else None
+        self._resource = resource
+        self._exit_stack = stack
+        if old_stack is not None:
+            self.__retire(old_stack)
+
+        return resource
+
+    # the calls which got the old client before the swap may still be running on it
+    def __retire(self, stack: AsyncExitStack):
+        task = asyncio.get_running_loop().create_task(self.__close_later(stack))
+        self._retired[task] = stack
+        task.add_done_callback(lambda done: self._retired.pop(done, None))
+
+    async def __close_later(self, stack: AsyncExitStack):
+        await asyncio.sleep(self.close_grace_secs)
+        await self.__close_stack(stack)
+
+    async def __close_stack(self, stack: AsyncExitStack):
+        try:
+            await stack.aclose()
+        except Exception as e:
+            log.error(e.__str__())
@@ -1,12 +1,17 @@
 import asyncio
+import time
 import aioboto3
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Tuple
 from botocore.config import Config
-from ._resource import ResourceHandler
+from ._resource import ResourceHandler, ClientResourceHandler, call_timeout_secs
+from ...utils.histogram import Histogram
 from ....configs.conf import (
     TABLE_ACCOUNT,
     DDB_CONNECT_TIMEOUT,
     DDB_READ_TIMEOUT,
     DDB_MAX_ATTEMPTS,
+    DDB_MAX_POOL_CONNECTIONS,
 )
 import logging
 
@@ -17,63 +22,173 @@ log = logging.getLogger(__name__)
 ddb_config = Config(
     connect_timeout=DDB_CONNECT_TIMEOUT,
     read_timeout=DDB_READ_TIMEOUT,
-    retries={'max_attempts': DDB_MAX_ATTEMPTS}
+    retries={'max_attempts': DDB_MAX_ATTEMPTS},
+    max_pool_connections=DDB_MAX_POOL_CONNECTIONS,
 )
 
 
-class DynamoDBResourceHandler(ResourceHandler):
+class DynamoDBResourceHandler(ClientResourceHandler):
+    LABEL = 'DynamoDB'
 
     def __init__(self, session: aioboto3.Session):
         super().__init__()
         self.max_timeout = DDB_CONNECT_TIMEOUT
+        self.close_grace_secs = call_timeout_secs(
+            DDB_CONNECT_TIMEOUT, DDB_READ_TIMEOUT, DDB_MAX_ATTEMPTS)
 
         self.session = session
-        self.lock = asyncio.Lock()
-        self.db_rsc = None
 
 
-    async def initial(self):
-        try:
-            async with self.lock:
-                if self.db_rsc is None:
-                    async with self.session.resource('dynamodb', config=ddb_config) as db_resource:
-                        self.db_rsc = db_resource
-                        meta = await self.db_rsc.meta.client.describe_table(TableName=TABLE_ACCOUNT)
-                        log.info('Initial DynamoDB describe_table ResponseMetadata: %s', meta['ResponseMetadata'])
+    async def _open(self, stack: AsyncExitStack):
+        return await stack.enter_async_context(
+            self.session.resource('dynamodb', config=ddb_config))
 
-        except Exception as e:
-            log.error(e.__str__())
-            async with self.lock:
-                async with self.session.resource('dynamodb', config=ddb_config) as db_resource:
-                    self.db_rsc = db_resource
 
+    # Regular activation to maintain connections and connection pools
+    async def _validate(self, db_rsc):
+        # meta = await db_rsc.Table(TABLE_CACHE).load()  # 替換 'YourTableName' 為你的表名
+        meta = await db_rsc.meta.client.describe_table(TableName=TABLE_ACCOUNT)
+        log.info('DynamoDB describe_table HTTPStatusCode: %s', meta['ResponseMetadata']['HTTPStatusCode'])
+
+
+class TrackedDynamoDBResourceHandler(DynamoDBResourceHandler):
+    '''
+    one client of PooledDynamoDBResourceHandler,
+    counts its in-flight calls with the before-call/after-call(-error) events of the client;
+    a cancelled call (CancelledError) emits neither after-call event,
+    so the calls started more than close_grace_secs ago (max. time of a call with retries) are dropped
+    '''
+
+    def __init__(self, session: aioboto3.Session, index: int):
+        super().__init__(session)
+        self.index = index
+        # call id -> (start, saturated), in start order
+        self.started: Dict[int, Tuple[float, bool]] = {}
+        self.call_id = 0
+        self.max_inflight = 0
+        self.calls = 0
+        # started while all the connections of the client were busy (queued in the client)
+        self.saturated_calls = 0
+        # cancelled/lost calls, dropped without an after-call event
+        self.dropped_calls = 0
+        self.latency = Histogram(f'dynamodb[{index}]')
+        self.saturated_latency = Histogram(f'dynamodb[{index}].saturated')
+
+    async def _open(self, stack: AsyncExitStack):
+        db_rsc = await super()._open(stack)
+        events = db_rsc.meta.client.meta.events
+        events.register('before-call.dynamodb', self.__before_call)
+        events.register('after-call.dynamodb', self.__after_call)
+        events.register('after-call-error.dynamodb', self.__after_call)
+        return db_rsc
+
+    @property
+    def inflight(self) -> int:
+        self.__drop_stale_calls()
+        return len(self.started)
+
+    def stats(self) -> Dict[str, Any]:
+        latency = self.latency.snapshot()
+        saturated = self.saturated_latency.snapshot()
+        return {
+            'inflight': self.inflight,
+            'max_inflight': self.max_inflight,
+            'calls': self.calls,
+            'saturated_calls': self.saturated_calls,
+            'dropped_calls': self.dropped_calls,
+            'latency_ms': latency,
+            # queueing inside the client: extra latency of the saturated calls
+            'est_wait_ms': round(max(0.0, saturated['p50'] - latency['p50']), 3) \
+                if saturated['count'] else 0.0,
+        }
+
+    def __before_call(self, context: Dict, **kwargs):
+        inflight = self.inflight
+        saturated = inflight >= DDB_MAX_POOL_CONNECTIONS
+        self.call_id += 1
+        context['pool_call_id'] = self.call_id
+        self.started[self.call_id] = (time.perf_counter(), saturated)
+        self.max_inflight = max(self.max_inflight, inflight + 1)
+        self.calls += 1
+        if saturated:
+            self.saturated_calls += 1
+
+    def __after_call(self, context: Dict, **kwargs):
+        call = self.started.pop(context.get('pool_call_id', None), None)
+        if call is None:
+            return
+
+        start, saturated = call
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.latency.record(elapsed_ms)
+        if saturated:
+            self.saturated_latency.record(elapsed_ms)
+
+    def __drop_stale_calls(self):
+        deadline = time.perf_counter() - self.close_grace_secs
+        while self.started:
+            call_id = next(iter(self.started))
+            if self.started[call_id][0] > deadline:
+                break
+            del self.started[call_id]
+            self.dropped_calls += 1
+
+
+class PooledDynamoDBResourceHandler(ResourceHandler):
+    '''
+    N DynamoDB clients (each with DDB_MAX_POOL_CONNECTIONS connections),
+    access() returns the client with the least in-flight calls,
+    ties are broken round-robin (bursts of access() before any call starts)
+    '''
+    LABEL = 'DynamoDB pool'
+
+    def __init__(self, session: aioboto3.Session, size: int):
+        super().__init__()
+        self.max_timeout = DDB_CONNECT_TIMEOUT
 
-    async def accessing(self, **kwargs):
-        async with self.lock:
-            if self.db_rsc is None:
-                await self.initial()
+        self.members: List[TrackedDynamoDBResourceHandler] = [
+            TrackedDynamoDBResourceHandler(session, index) for index in range(max(1, size))
+        ]
+        self.next = 0
 
-            return self.db_rsc
+    async def initial(self):
+        await asyncio.gather(*[member.initial() for member in self.members])
+
+    async def accessing(self, **kwargs):
+        member = self.__pick()
+        # the members are not accessed through access(), which updates access_time
+        member._update_access_time()
+        return await member.accessing(**kwargs)
 
+    def initialized(self) -> bool:
+        return any(member.initialized() for member in self.members)
 
     # Regular activation to maintain connections and connection pools
-    async def probe(self):
-        try:
-            # meta = await self.db_rsc.Table(TABLE_CACHE).load()  # 替換 'YourTableName' 為你的表名
-            meta = await self.db_rsc.meta.client.describe_table(TableName=TABLE_ACCOUNT)
-            log.info('DynamoDB describe_table HTTPStatusCode: %s', meta['ResponseMetadata']['HTTPStatusCode'])
-        except Exception as e:
-            log.error(f'DynamoDB Client Error: %s', e.__str__())
-            await self.initial()
-
+    async def probe(self) -> bool:
+        results = await asyncio.gather(*[
+            member.probe() for member in self.members if member.initialized()
+        ])
+        log.info('DynamoDB pool stats: %s', self.stats())
+        return all(results)
 
     async def close(self):
-        try:
-            async with self.lock:
-                if self.db_rsc is None:
-                    return
-                await self.db_rsc.meta.client.close()
-                # log.info('DynamoDB client is closed')
-
-        except Exception as e:
-            log.error(e.__str__())
+        await asyncio.gather(*[member.close() for member in self.members])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'size': len(self.members),
+            'max_pool_connections': DDB_MAX_POOL_CONNECTIONS,
+            'inflight': sum(member.inflight for member in self.members),
+            'clients': [member.stats() for member in self.members],
+        }
+
+    def __pick(self) -> TrackedDynamoDBResourceHandler:
+        size = len(self.members)
+        start = self.next
+        self.next = (start + 1) % size
+        picked = self.members[start]
+        for i in range(1, size):
+            member = self.members[(start + i) % size]
+            if member.inflight < picked.inflight:
+                picked = member
+        return picked
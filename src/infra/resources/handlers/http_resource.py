@@ -1,30 +1,86 @@
 import asyncio
+import time
 import httpx
 import json
-from typing import List, Dict
+from typing import Any, List, Dict
 from urllib.parse import urlparse
 from ._resource import ResourceHandler
+from ...utils.time_util import current_seconds
 from ....configs.conf import (
     HTTP_TIMEOUT,
     HTTP_MAX_CONNECTS,
     HTTP_MAX_KEEPALIVE_CONNECTS,
     HTTP_KEEPALIVE_EXPIRY,
+    HTTP_SHARED_POOL,
+    HTTP2_ENABLED,
+    HTTP_MAX_CONNECTS_PER_HOST,
 )
 import logging
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
+try:
+    import h2  # noqa: F401, httpx[http2]
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 
 timeout=httpx.Timeout(timeout=HTTP_TIMEOUT)
 limits=httpx.Limits(
     max_connections=HTTP_MAX_CONNECTS,
-    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTS, 
+    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTS,
     keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
 )
 
 
+class HostClient:
+    '''
+    the shared client bound to one host,
+    has the request methods of httpx.AsyncClient used by RequestClientAdapter
+    '''
+
+    def __init__(self, handler: 'HttpResourceHandler', host: str):
+        self.handler = handler
+        self.host = host
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        return await self.handler.send(self.host, method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('PUT', url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('DELETE', url, **kwargs)
+
+    async def head(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('HEAD', url, **kwargs)
+
+    @property
+    def is_closed(self) -> bool:
+        client = self.handler.shared_client
+        return client is None or client.is_closed
+
+
 class HttpResourceHandler(ResourceHandler):
+    '''
+    shared pool mode (HTTP_SHARED_POOL):
+    - one httpx.AsyncClient (one transport / connection pool) for all hosts,
+      HTTP/2 on https hosts, so the OAuth providers multiplex on a few connections
+    - at most HTTP_MAX_CONNECTS_PER_HOST requests per host, the others wait
+    - no synthetic HEAD probes: idle connections expire by HTTP_KEEPALIVE_EXPIRY,
+      the pool is closed after being idle for that long
+    - stats(): in-use/idle connections, in-flight/waiting requests and wait time per host
+
+    per domain mode: one client per domain, probed by HEAD while idle
+    '''
 
     def __init__(self, domains: List[str] = [
         # TODO: 從 region_hosts 取得所有微服務的 domains
@@ -37,18 +93,46 @@ class HttpResourceHandler(ResourceHandler):
         domains = [self.parse_domain(domain) for domain in domains]
         self.locks: Dict = {domain: asyncio.Lock() for domain in domains}  # 为每个域名创建锁
         self.domain_clients: Dict = {domain: None for domain in domains}
+        self.domain_access: Dict[str, float] = {}
+
+        self.shared = HTTP_SHARED_POOL
+        self.http2 = HTTP2_ENABLED and HTTP2_AVAILABLE
+        if HTTP2_ENABLED and not HTTP2_AVAILABLE:
+            log.warning('HTTP2_ENABLED but h2 is not installed, use HTTP/1.1')
+        self.shared_client: httpx.AsyncClient = None
+        self.host_clients: Dict[str, HostClient] = {}
+        self.host_sems: Dict[str, asyncio.Semaphore] = {}
+        self.host_stats: Dict[str, Dict[str, Any]] = {}
+        if self.shared:
+            # idle-aware: keep the pool while its connections are kept alive
+            self.max_timeout = max(HTTP_TIMEOUT, HTTP_KEEPALIVE_EXPIRY)
 
 
     async def initial(self):
+        if self.shared:
+            self.__shared_client()
+            return
+
         for domain in self.domain_clients.keys():
             self.domain_clients[domain] = httpx.AsyncClient(timeout=timeout, limits=limits)
 
 
+    def initialized(self) -> bool:
+        if self.shared:
+            return self.shared_client is not None
+        return any(client is not None for client in self.domain_clients.values())
+
+
     async def accessing(self, url: str):
         if url is None:
             raise Exception('url is a must')
 
         domain = self.parse_domain(url)
+        if self.shared:
+            self.__shared_client()
+            return self.__host_client(domain)
+
+        self.domain_access[domain] = current_seconds()
         if not domain in self.domain_clients:
             await self.__init_lock(domain)
             client = await self.__init_client(domain)
@@ -61,9 +145,46 @@ class HttpResourceHandler(ResourceHandler):
         return client
 
 
+    # shared pool mode: send a request of the host within its connection cap
+    async def send(self, host: str, method: str, url: str, **kwargs) -> httpx.Response:
+        sem = self.host_sems[host]
+        stats = self.host_stats[host]
+
+        start = time.perf_counter()
+        stats['waiting'] += 1
+        try:
+            await sem.acquire()
+        finally:
+            stats['waiting'] -= 1
+
+        wait_secs = time.perf_counter() - start
+        stats['requests'] += 1
+        stats['wait_secs'] += wait_secs
+        stats['max_wait_secs'] = max(stats['max_wait_secs'], wait_secs)
+        stats['in_use'] += 1
+        try:
+            return await self.__shared_client().request(method, url, **kwargs)
+
+        finally:
+            stats['in_use'] -= 1
+            stats['last_used'] = current_seconds()
+            sem.release()
+
+
     # Regular activation to maintain connections and connection pools
     async def probe(self):
+        if self.shared:
+            # connections idle longer than HTTP_KEEPALIVE_EXPIRY are dropped by the pool itself
+            log.info('HttpX pool stats: %s', self.stats())
+            return True
+
+        healthy = True
+        now = current_seconds()
         for domain, client in self.domain_clients.items():
+            # used recently, the connections are alive already
+            if now - self.domain_access.get(domain, 0) < HTTP_KEEPALIVE_EXPIRY / 2:
+                continue
+
             try:
                 response = await client.head(f'http://{domain}/')  # 发送 HEAD 请求，使用 HEAD 请求检查域名是否可达
                 if response.status_code >= 400:
@@ -72,9 +193,18 @@ class HttpResourceHandler(ResourceHandler):
             except Exception as e:  # 捕捉 HTTP 錯誤
                 log.error('Http Connection Error: %s', e)
                 await self.__init_client(domain)  # 重新建立連線
+                healthy = False
+
+        return healthy
 
 
     async def close(self):
+        if self.shared_client is not None:
+            client = self.shared_client
+            self.shared_client = None
+            await client.aclose()
+            log.info('HttpX shared connection pool is closed')
+
         for domain, client in self.domain_clients.items():
             if client is None:
                 continue
@@ -82,9 +212,59 @@ class HttpResourceHandler(ResourceHandler):
             await client.aclose()
             self.domain_clients[domain] = None
             log.info('HttpX domain connection is closed: %s', domain)
-            
 
 
+    def stats(self) -> Dict[str, Any]:
+        clients = [self.shared_client] if self.shared else list(self.domain_clients.values())
+        connections = []
+        for client in clients:
+            if client is not None and not client.is_closed:
+                connections.extend(self.__pool_connections(client))
+        idle = sum(1 for conn in connections if conn.is_idle())
+
+        hosts = {}
+        for host, stats in self.host_stats.items():
+            hosts[host] = dict(stats)
+            hosts[host]['avg_wait_ms'] = round(
+                stats['wait_secs'] / stats['requests'] * 1000, 3) if stats['requests'] else 0.0
+
+        return {
+            'mode': 'shared' if self.shared else 'per_domain',
+            'http2': self.http2,
+            'connections': len(connections),
+            'in_use': len(connections) - idle,
+            'idle': idle,
+            'hosts': hosts,
+        }
+
+
+    def __shared_client(self) -> httpx.AsyncClient:
+        # no await in between, so there is one client only
+        if self.shared_client is None or self.shared_client.is_closed:
+            self.shared_client = httpx.AsyncClient(
+                timeout=timeout, limits=limits, http2=self.http2)
+        return self.shared_client
+
+    def __host_client(self, host: str) -> HostClient:
+        client = self.host_clients.get(host, None)
+        if client is None:
+            client = self.host_clients[host] = HostClient(self, host)
+            self.host_sems[host] = asyncio.Semaphore(HTTP_MAX_CONNECTS_PER_HOST)
+            self.host_stats[host] = {
+                'requests': 0,
+                'in_use': 0,
+                'waiting': 0,
+                'wait_secs': 0.0,
+                'max_wait_secs': 0.0,
+                'last_used': None,
+            }
+        return client
+
+    # connections of the httpcore pool behind the client
+    def __pool_connections(self, client: httpx.AsyncClient) -> List:
+        pool = getattr(getattr(client, '_transport', None), '_pool', None)
+        return list(getattr(pool, 'connections', []))
+
     async def __init_lock(self, domain: str):
         async with self.resource_lock: # 為一開始沒有 lock 的 domain 上 IO鎖
             if not domain in self.locks:
@@ -102,7 +282,7 @@ class HttpResourceHandler(ResourceHandler):
     # 從 url 解析 domain
     def parse_domain(self, url):
         return urlparse(url).netloc  # 返回解析出的 domain
-    
+
     @classmethod
     def Response(cls):
-        return httpx.Response 
+        return httpx.Response
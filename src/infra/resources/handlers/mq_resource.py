@@ -1,7 +1,9 @@
 import asyncio
 import aioboto3
+from contextlib import AsyncExitStack
+from typing import Optional
 from botocore.config import Config
-from ._resource import ResourceHandler
+from ._resource import ClientResourceHandler, call_timeout_secs
 from ....configs.conf import (
     MQ_CONNECT_TIMEOUT,
     MQ_READ_TIMEOUT,
@@ -20,136 +22,76 @@ mq_config = Config(
 )
 
 
-class SQSResourceHandler(ResourceHandler):
+class SQSResourceHandler(ClientResourceHandler):
+    LABEL = 'Message Queue[SQS]'
 
     def __init__(self, session: aioboto3.Session, label: str, queue_url: str):
         super().__init__()
         self.max_timeout = MQ_CONNECT_TIMEOUT
+        self.close_grace_secs = call_timeout_secs(
+            MQ_CONNECT_TIMEOUT, MQ_READ_TIMEOUT, MQ_MAX_ATTEMPTS)
 
-        self.lock = asyncio.Lock()
         self.session = session
         self.label = label
         self.queue_url = queue_url
-        self.sqs_client = None
         self.trigger_subscribe_messages = None
+        self.subscription: Optional[asyncio.Task] = None
 
     def timeout(self) -> bool:
         return False
 
-    async def initial(self):
-        try:
-            async with self.lock:
-                if self.sqs_client is None:
-                    async with self.session.client('sqs', config=mq_config) as sqs_client:
-                        self.sqs_client = sqs_client
-                        response = await self.sqs_client.get_queue_attributes(
-                            QueueUrl=self.queue_url,
-                            AttributeNames=['QueueArn']
-                        )
-                        log.info('Message Queue[SQS] Connection QueueArn: %s',
-                                 response['Attributes']['QueueArn'])
-
-        except Exception as e:
-            log.error(e.__str__())
-            async with self.lock:
-                async with self.session.client('sqs', config=mq_config) as sqs_client:
-                    self.sqs_client = sqs_client
+    async def _open(self, stack: AsyncExitStack):
+        return await stack.enter_async_context(
+            self.session.client('sqs', config=mq_config))
 
-    async def accessing(self, **kwargs):
-        async with self.lock:
-            if self.sqs_client is None:
-                await self.initial()
+    async def _validate(self, sqs_client):
+        response = await sqs_client.get_queue_attributes(
+            QueueUrl=self.queue_url,
+            AttributeNames=['QueueArn'],
+        )
+        log.info('Message Queue[SQS] Connection QueueArn: %s, HTTPStatusCode: %s',
+                 response['Attributes']['QueueArn'], response['ResponseMetadata']['HTTPStatusCode'])
 
-            # assign trigger_subscribe_messages function
-            trigger_subscribe_messages = kwargs.get(
-                'trigger_subscription', None)
-            if trigger_subscribe_messages:
-                self.trigger_subscribe_messages = trigger_subscribe_messages
+    async def accessing(self, **kwargs):
+        # assign trigger_subscribe_messages function
+        trigger_subscribe_messages = kwargs.get(
+            'trigger_subscription', None)
+        if trigger_subscribe_messages:
+            self.trigger_subscribe_messages = trigger_subscribe_messages
 
-            return self.sqs_client
+        return await super().accessing()
 
     # Regular activation to maintain connections and connection pools
-    async def probe(self):
+    async def probe(self) -> bool:
         try:
-            response = await self.sqs_client.get_queue_attributes(
-                QueueUrl=self.queue_url,
-                AttributeNames=['QueueArn'],
-            )
-            log.info('Message Queue[SQS] Connection HTTPStatusCode: %s',
-                     response['ResponseMetadata']['HTTPStatusCode'])
-        except Exception as e:
-            log.error(f'Message Queue[SQS] Connection Error: %s', e.__str__())
-            await self.initial()
+            return await super().probe()
 
         finally:
-            if self.trigger_subscribe_messages:
+            # the subscription is an endless loop: never awaited (nor cancelled) by the probe
+            if self.trigger_subscribe_messages and \
+                    (self.subscription is None or self.subscription.done()):
                 log.info(
                     'Probing Message Queue[SQS]: trigger_subscribe_messages!')
-                await self.trigger_subscribe_messages()
-
-    async def close(self):
-        try:
-            async with self.lock:
-                if self.sqs_client is None:
-                    return
-                await self.sqs_client.close()
-                # log.info('Message Queue[SQS] client is closed')
-
-        except Exception as e:
-            log.error(e.__str__())
+                self.subscription = asyncio.create_task(self.trigger_subscribe_messages())
 
 
-class EventBridgeResourceHandler(ResourceHandler):
+class EventBridgeResourceHandler(ClientResourceHandler):
+    LABEL = 'Event Bus[EventBridge]'
 
     def __init__(self, session: aioboto3.Session):
         super().__init__()
         self.max_timeout = MQ_CONNECT_TIMEOUT
+        self.close_grace_secs = call_timeout_secs(
+            MQ_CONNECT_TIMEOUT, MQ_READ_TIMEOUT, MQ_MAX_ATTEMPTS)
 
-        self.lock = asyncio.Lock()
         self.session = session
-        self.events_client = None
 
-    async def initial(self):
-        try:
-            async with self.lock:
-                if self.events_client is None:
-                    async with self.session.client('events', config=mq_config) as events_client:
-                        self.events_client = events_client
-                        response = await self.events_client.describe_event_bus()
-                        log.info('Event Bus[EventBridge] Connection is healthy, EventBusArn: %s',
-                                 response['Arn'])
-
-        except Exception as e:
-            log.error(e.__str__())
-            async with self.lock:
-                async with self.session.client('events', config=mq_config) as events_client:
-                    self.events_client = events_client
-
-    async def accessing(self, **kwargs):
-        async with self.lock:
-            if self.events_client is None:
-                await self.initial()
-
-            return self.events_client
+    async def _open(self, stack: AsyncExitStack):
+        return await stack.enter_async_context(
+            self.session.client('events', config=mq_config))
 
     # Regular activation to maintain connections and connection pools
-    async def probe(self):
-        try:
-            response = await self.events_client.describe_event_bus()
-            log.info('Event Bus[EventBridge] Connection is healthy, EventBusArn: %s',
-                     response['Arn'])
-        except Exception as e:
-            log.error(
-                f'Event Bus[EventBridge] Connection Error: %s', e.__str__())
-            await self.initial()
-
-    async def close(self):
-        try:
-            async with self.lock:
-                if self.events_client is None:
-                    return
-                await self.events_client.close()
-                # log.info('Event Bus[EventBridge] client is closed')
-
-        except Exception as e:
-            log.error(e.__str__())
+    async def _validate(self, events_client):
+        response = await events_client.describe_event_bus()
+        log.info('Event Bus[EventBridge] Connection is healthy, EventBusArn: %s',
+                 response['Arn'])
@@ -1,9 +1,16 @@
 import asyncio
+import time
 import aioboto3
-from typing import Dict
+from typing import Any, Dict, Set
 from .handlers import *
+from .probe_scheduler import ProbeScheduler
 from ...configs.conf import (
     PROBE_CYCLE_SECS,
+    PROBE_ADAPTIVE,
+    RESOURCE_PARALLEL_INIT,
+    RESOURCE_INIT_DEADLINE_SECS,
+    RESOURCE_LAZY_INIT,
+    DDB_CLIENT_POOL_SIZE,
     SQS_P_QUEUE_URL,  # for retry failed pub events
     SQS_S_QUEUE_URL,  # for retry failed sub events
 )
@@ -16,6 +23,10 @@ log = logging.getLogger(__name__)
 class GlobalResourceManager:
     def __init__(self, resources: Dict[str, ResourceHandler]):
         self.resources: Dict[str, ResourceHandler] = resources
+        self.scheduler = ProbeScheduler(resources)
+        # cold start breakdown: name -> {'status': ok/error/pending/lazy, 'ms': ...}
+        self.init_timings: Dict[str, Dict[str, Any]] = {}
+        self.init_tasks: Set[asyncio.Task] = set()
 
     def get(self, resource: str) -> ResourceHandler:
         if resource not in self.resources:
@@ -23,13 +34,62 @@ class GlobalResourceManager:
 
         return self.resources[resource]
 
+    '''
+    RESOURCE_PARALLEL_INIT:
+    - the resources in RESOURCE_LAZY_INIT are initialized on first use
+    - the others are initialized concurrently, startup waits RESOURCE_INIT_DEADLINE_SECS at most,
+      the slow ones keep connecting in background (accessing them waits for it)
+    otherwise one after another, as before
+    '''
     async def initial(self):
-        for resource in self.resources.values():
+        start = time.perf_counter()
+        eager = {}
+        for (name, resource) in self.resources.items():
+            if RESOURCE_PARALLEL_INIT and name in RESOURCE_LAZY_INIT:
+                self.init_timings[name] = {'status': 'lazy'}
+            else:
+                eager[name] = resource
+
+        if not RESOURCE_PARALLEL_INIT:
+            for (name, resource) in eager.items():
+                await self.__timed_initial(name, resource)
+
+        elif eager:
+            tasks = [
+                asyncio.create_task(self.__timed_initial(name, resource))
+                for (name, resource) in eager.items()
+            ]
+            (_, pending) = await asyncio.wait(tasks, timeout=RESOURCE_INIT_DEADLINE_SECS)
+            self.init_tasks.update(pending)
+            for task in pending:
+                task.add_done_callback(self.init_tasks.discard)
+
+        log.info('resources initialized in %.1f ms: %s',
+                 (time.perf_counter() - start) * 1000, self.init_timings)
+
+    async def __timed_initial(self, name: str, resource: ResourceHandler):
+        self.init_timings[name] = {'status': 'pending'}
+        start = time.perf_counter()
+        status = 'ok'
+        try:
             await resource.initial()
 
+        except Exception as e:
+            status = 'error'
+            log.error('resource initial error: %s, %s', name, e)
+
+        finally:
+            self.init_timings[name] = {
+                'status': status,
+                'ms': round((time.perf_counter() - start) * 1000, 1),
+            }
+
     async def probe(self):
         for resource in self.resources.values():
             try:
+                if not resource.initialized():
+                    continue
+
                 if not resource.timeout():
                     log.info(f' ==> probing {resource.__class__.__name__}')
                     await resource.probe()
@@ -42,11 +102,28 @@ class GlobalResourceManager:
     # Regular activation to maintain connections and connection pools
 
     async def keeping_probe(self):
+        if PROBE_ADAPTIVE:
+            await self.scheduler.run()
+            return
+
         while True:
             await asyncio.sleep(PROBE_CYCLE_SECS)
             await self.probe()
 
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'init': self.init_timings,
+            'probe': self.scheduler.stats(),
+            'resources': {
+                name: resource.stats()
+                for (name, resource) in self.resources.items() if hasattr(resource, 'stats')
+            },
+        }
+
     async def close(self):
+        for task in list(self.init_tasks):
+            task.cancel()
+
         for resource in self.resources.values():
             await resource.close()
 
@@ -54,7 +131,8 @@ class GlobalResourceManager:
 session = aioboto3.Session()
 resource_manager = GlobalResourceManager({
     'storage': S3ResourceHandler(session),
-    'dynamodb': DynamoDBResourceHandler(session),
+    'dynamodb': PooledDynamoDBResourceHandler(session, DDB_CLIENT_POOL_SIZE) \
+        if DDB_CLIENT_POOL_SIZE > 1 else DynamoDBResourceHandler(session),
     'email': SESResourceHandler(session),
     'event_bus': EventBridgeResourceHandler(session),
     'failed_pub_mq_rsc': SQSResourceHandler(session=session, label='failed pub events DLQ', queue_url=SQS_P_QUEUE_URL),
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from typing import Any, Dict
+from .handlers import ResourceHandler
+from ..utils.histogram import Histogram
+from ..utils.time_util import current_seconds
+from ...configs.conf import (
+    PROBE_CYCLE_SECS,
+    PROBE_MAX_CYCLE_SECS,
+    PROBE_TIMEOUT_SECS,
+    PROBE_REPORT_SECS,
+)
+import logging
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+class ProbeState:
+    def __init__(self, label: str):
+        self.interval = PROBE_CYCLE_SECS
+        self.next_due = 0.0
+        self.probes = 0
+        self.skipped = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = Histogram(f'probe.{label}')
+
+
+'''
+adaptive probing, instead of probing every resource every PROBE_CYCLE_SECS:
+- the due resources are probed concurrently, each bounded by PROBE_TIMEOUT_SECS
+- a resource accessed within its interval is warm, the probe is skipped
+- healthy: the interval doubles up to PROBE_MAX_CYCLE_SECS
+- failed (probe returned False/raised/timed out): back to PROBE_CYCLE_SECS
+- idle resources (ResourceHandler.timeout()) are closed, as before
+- probe latency per resource in a histogram, reported every PROBE_REPORT_SECS
+'''
+class ProbeScheduler:
+    def __init__(self, resources: Dict[str, ResourceHandler]):
+        self.resources = resources
+        self.states: Dict[str, ProbeState] = {
+            name: ProbeState(name) for name in resources.keys()
+        }
+
+    async def run(self):
+        last_report = time.monotonic()
+        while True:
+            await asyncio.sleep(PROBE_CYCLE_SECS)
+            await self.probe_due()
+
+            if time.monotonic() - last_report >= PROBE_REPORT_SECS:
+                last_report = time.monotonic()
+                log.info('probe stats: %s', self.stats())
+
+    async def probe_due(self):
+        now = time.monotonic()
+        due = [name for (name, state) in self.states.items() if state.next_due <= now]
+        if due:
+            await asyncio.gather(*[self.__probe(name) for name in due])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                'interval': state.interval,
+                'probes': state.probes,
+                'skipped': state.skipped,
+                'failures': state.failures,
+                'consecutive_failures': state.consecutive_failures,
+                'latency_ms': state.latency.snapshot(),
+            }
+            for (name, state) in self.states.items()
+        }
+
+    async def __probe(self, name: str):
+        resource = self.resources[name]
+        state = self.states[name]
+        try:
+            if resource.timeout():
+                await resource.close()
+                state.interval = PROBE_CYCLE_SECS
+                return
+
+            # lazy resources are connected on first use, not by probes
+            if not resource.initialized():
+                state.skipped += 1
+                return
+
+            # warm: the traffic keeps the connections alive
+            if current_seconds() - resource.access_time < state.interval:
+                state.skipped += 1
+                return
+
+            log.info(f' ==> probing {resource.__class__.__name__}')
+            start = time.perf_counter()
+            healthy = False
+            try:
+                healthy = await asyncio.wait_for(resource.probe(), PROBE_TIMEOUT_SECS) is not False
+
+            except asyncio.TimeoutError:
+                log.error('probe timeout: %s', name)
+
+            finally:
+                state.probes += 1
+                state.latency.record((time.perf_counter() - start) * 1000)
+
+            if healthy:
+                state.consecutive_failures = 0
+                state.interval = min(state.interval * 2, PROBE_MAX_CYCLE_SECS)
+            else:
+                state.failures += 1
+                state.consecutive_failures += 1
+                state.interval = PROBE_CYCLE_SECS
+
+        except Exception as e:
+            log.error('probe error: %s, %s', name, e)
+            state.failures += 1
+            state.consecutive_failures += 1
+            state.interval = PROBE_CYCLE_SECS
+
+        finally:
+            state.next_due = time.monotonic() + state.interval
@@ -1,19 +1,50 @@
 import io
 import json
+from typing import Any, Dict, Optional
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
 from ..resources.handlers.storage_resource import S3ResourceHandler
+from ..cache import LRUTTLCache
+from ..utils.timing import timed
+from ...repositories.object_storage import IObjectStorage
 from ...configs.conf import FT_BUCKET
 from ...configs.exceptions import *
 import logging as log
 
 log.basicConfig(filemode='w', level=log.INFO)
 
+# negative cache entry: email_info.json does not exist (404)
+NOT_FOUND = object()
+# S3 conditional write errors
+PRECONDITION_FAILED_CODES = set(['PreconditionFailed', 'ConditionalRequestConflict', '412', '409'])
 
-class GlobalObjectStorage:
-    def __init__(self, s3: S3ResourceHandler):
+
+class GlobalObjectStorage(IObjectStorage):
+    '''
+    cache(optional): email -> email_info, including negative entries for 404s;
+    init/update/delete on this instance write through to the cache;
+    init_if_absent/update never read from it (find_latest)
+
+    conditional_writes(optional): S3 conditional writes on ETag
+    - init_if_absent: a single create-if-absent PUT (If-None-Match: *)
+    - update: a single compare-and-swap PUT (If-Match: <etag>),
+      the etag of the object written by init is remembered in etags
+    '''
+    def __init__(
+        self,
+        s3: S3ResourceHandler,
+        cache: Optional[LRUTTLCache] = None,
+        negative_ttl_secs: float = 0,
+        etags: Optional[LRUTTLCache] = None,
+    ):
         self.s3 = s3
+        self.cache = cache
+        self.negative_ttl_secs = negative_ttl_secs
+        self.negative_hits = 0
+        self.etags = etags
+        self.conditional_writes = etags is not None
         self.__cls_name = self.__class__.__name__
 
+    @timed('s3.init')
     async def init(self, bucket, version):
         file = None
         key = None
@@ -23,6 +54,7 @@ class GlobalObjectStorage:
             storage = await self.s3.access()
             obj = await storage.Object(FT_BUCKET, key)
             await obj.put(Body=file)
+            self.__cache_set(bucket, {'version': version})
 
             return version
 
@@ -33,12 +65,60 @@ class GlobalObjectStorage:
             raise ServerException(msg='init file fail')
 
 
+    @timed('s3.init_if_absent')
+    async def init_if_absent(self, bucket, version):
+        if not self.conditional_writes:
+            return await super().init_if_absent(bucket, version)
+
+        file = None
+        key = None
+        try:
+            data = {'version': version}
+            file = json.dumps(data)
+            key = ''.join([str(bucket), '/email_info.json'])
+            storage = await self.s3.access()
+            obj = await storage.Object(FT_BUCKET, key)
+            res = await obj.put(Body=file, IfNoneMatch='*')
+            self.__cache_set(bucket, data)
+            self.etags.set(str(bucket), (res['ETag'], data))
+            return None
+
+        except ClientError as e:
+            if not self.__precondition_failed(e):
+                log.error(f'{self.__cls_name}.init_if_absent [init file error]\
+                    bucket:%s, version:%s, file:%s, key:%s, err:%s',
+                    bucket, version, file, key, e.__str__())
+                raise ServerException(msg='init file fail')
+
+        except Exception as e:
+            log.error(f'{self.__cls_name}.init_if_absent [init file error]\
+                bucket:%s, version:%s, file:%s, key:%s, err:%s',
+                bucket, version, file, key, e.__str__())
+            raise ServerException(msg='init file fail')
+
+        # registered already
+        data = await self.__download(bucket)
+        self.__cache_set(bucket, data)
+        if data is None:
+            # deleted right after the conflict (signup rollback)
+            log.error(f'{self.__cls_name}.init_if_absent [conflict without file]\
+                bucket:%s, version:%s', bucket, version)
+            raise ServerException(msg='init file fail')
+
+        return data
+
+
+    @timed('s3.update')
     async def update(self, bucket, version, newdata):
+        if self.conditional_writes:
+            return await self.__compare_and_swap(bucket, version, newdata)
+
         data = None
         result = None
         key = None
         try:
-            data = await self.find(bucket)
+            # version check needs the latest data, never the cached one
+            data = await self.__download(bucket)
             if data is None:
                 raise NotFoundException(msg=f'file:{bucket} not found')
             
@@ -52,6 +132,7 @@ class GlobalObjectStorage:
             storage = await self.s3.access()
             obj = await storage.Object(FT_BUCKET, key)
             await obj.put(Body=result)
+            self.__cache_set(bucket, data)
             return result
         
         except NotFoundException as e:
@@ -67,6 +148,7 @@ class GlobalObjectStorage:
             raise ServerException(msg='update file fail')
 
 
+    @timed('s3.delete')
     async def delete(self, bucket):
         key = None
         result = False
@@ -75,6 +157,9 @@ class GlobalObjectStorage:
             storage = await self.s3.access()
             obj = await storage.Object(FT_BUCKET, key)
             await obj.delete()
+            self.__cache_invalidate(bucket)
+            if self.etags is not None:
+                self.etags.invalidate(str(bucket))
             result = True
             return result
 
@@ -92,7 +177,123 @@ class GlobalObjectStorage:
         }, None
     '''
 
+    @timed('s3.find')
     async def find(self, bucket):
+        if self.cache is None:
+            return await self.__download(bucket)
+
+        cached = self.cache.get(str(bucket))
+        if cached is NOT_FOUND:
+            self.negative_hits += 1
+            return None
+        if cached is not None:
+            return dict(cached)
+
+        result = await self.__download(bucket)
+        self.__cache_set(bucket, result)
+        return result
+
+    # bypasses the cache: a cached 'registered' may be rolled back by another container
+    @timed('s3.find_latest')
+    async def find_latest(self, bucket):
+        result = await self.__download(bucket)
+        self.__cache_set(bucket, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        if self.cache is None:
+            return {}
+
+        stats = self.cache.stats()
+        stats['negative_hits'] = self.negative_hits
+        return stats
+
+    async def __compare_and_swap(self, bucket, version, newdata):
+        data = None
+        etag = None
+        result = None
+        key = None
+        try:
+            key = ''.join([str(bucket), '/email_info.json'])
+            storage = await self.s3.access()
+            obj = await storage.Object(FT_BUCKET, key)
+
+            # the etag written by init on this instance saves the read
+            known = self.etags.get(str(bucket))
+            if known is not None and known[1].get('version', None) == version:
+                (etag, data) = known
+            else:
+                (data, etag) = await self.__download_with_etag(obj)
+
+            if data is None:
+                raise NotFoundException(msg=f'file:{bucket} not found')
+
+            if 'version' in data and data['version'] != version:
+                raise NotFoundException(msg='no version there OR invalid version')
+
+            data = dict(data)
+            data.update(newdata)
+            result = json.dumps(data)
+            res = await obj.put(Body=result, IfMatch=etag)
+            self.__cache_set(bucket, data)
+            self.etags.set(str(bucket), (res['ETag'], data))
+            return result
+
+        except NotFoundException as e:
+            log.error(f'{self.__cls_name}.update [no version found] \
+                bucket:%s, version:%s, newdata:%s, data:%s, result:%s, key:%s, err:%s',
+                bucket, version, newdata, data, result, key, e.__str__())
+            raise NotFoundException(msg=e.msg)
+
+        except ClientError as e:
+            if self.__precondition_failed(e):
+                # someone else wrote the file after our read/init
+                log.error(f'{self.__cls_name}.update [etag mismatch] \
+                    bucket:%s, version:%s, newdata:%s, etag:%s, key:%s, err:%s',
+                    bucket, version, newdata, etag, key, e.__str__())
+                self.__cache_invalidate(bucket)
+                self.etags.invalidate(str(bucket))
+                raise NotFoundException(msg='no version there OR invalid version')
+
+            log.error(f'{self.__cls_name}.update [update file error] \
+                bucket:%s, version:%s, newdata:%s, data:%s, result:%s, key:%s, err:%s',
+                bucket, version, newdata, data, result, key, e.__str__())
+            raise ServerException(msg='update file fail')
+
+        except Exception as e:
+            log.error(f'{self.__cls_name}.update [update file error] \
+                bucket:%s, version:%s, newdata:%s, data:%s, result:%s, key:%s, err:%s',
+                bucket, version, newdata, data, result, key, e.__str__())
+            raise ServerException(msg='update file fail')
+
+    async def __download_with_etag(self, obj):
+        try:
+            res = await obj.get()
+            body = await res['Body'].read()
+            return (json.loads(body.decode('utf-8')), res['ETag'])
+
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return (None, None)
+            raise e
+
+    def __precondition_failed(self, e: ClientError) -> bool:
+        return e.response['Error']['Code'] in PRECONDITION_FAILED_CODES
+
+    def __cache_set(self, bucket, data: Optional[Dict]):
+        if self.cache is None:
+            return
+
+        if data is None:
+            self.cache.set(str(bucket), NOT_FOUND, ttl_secs=self.negative_ttl_secs)
+        else:
+            self.cache.set(str(bucket), dict(data))
+
+    def __cache_invalidate(self, bucket):
+        if self.cache is not None:
+            self.cache.invalidate(str(bucket))
+
+    async def __download(self, bucket):
         key = None
         result = None
         try:
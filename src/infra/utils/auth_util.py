@@ -4,11 +4,11 @@ import random
 import time
 from pydantic import BaseModel
 from datetime import date, datetime
-from typing import List, Tuple
-from snowflake import SnowflakeGenerator
-import hashlib
+from typing import List, Optional, Tuple
 from src.configs.constants import AccountType
 from ..db.nosql.auth_schemas import FTAuth, Account
+from .password_hasher import password_hasher
+from .snowflake_id import gen_id, gen_ids
 from ...configs.exceptions import *
 import logging as log
 
@@ -33,20 +33,8 @@ def decrypt_meta(meta, pubkey):
     return json.loads(meta)
 
 
-'''SnowflakeGenerator group
-'''
-instances = 100
-snowflake_generator_dict = {}
-for i in range(instances):
-    snowflake_generator_dict[i] = SnowflakeGenerator(i)
-
-
 def gen_snowflake_id():
-    millisecs = datetime.now().timestamp()
-    i = int(millisecs * 100000) % instances
-    gen = snowflake_generator_dict[i]
-    num = next(gen)
-    return int(num / 1000)
+    return gen_id()
 
 
 letters = '0123456789abcdefghijklmnopqrstuvwxyz'
@@ -62,13 +50,76 @@ def gen_pass_salt():
 
 
 def gen_password_hash(pw: str, pass_salt: str):
-    password_data = str(pw + pass_salt).encode('utf-8')
-    return hashlib.sha224(password_data).hexdigest()
+    return password_hasher.hash(pw, pass_salt)
+
+
+# hash in the password hasher's thread pool, doesn't block the event loop
+async def gen_password_hash_async(pw: str, pass_salt: str):
+    return await password_hasher.hash_async(pw, pass_salt)
 
 
 def gen_account_data(data: dict, account_type: AccountType) -> Tuple[FTAuth, Account]:
-    aid = gen_snowflake_id()
-    role_id = gen_snowflake_id()
+    pass_salt = None
+    pass_hash = None
+    if account_type == AccountType.FT:
+        pass_salt = gen_pass_salt()
+        pass_hash = gen_password_hash(pw=data['pass'], pass_salt=pass_salt)
+
+    return _build_account_data(data, account_type, pass_hash, pass_salt)
+
+
+async def gen_account_data_async(data: dict, account_type: AccountType) -> Tuple[FTAuth, Account]:
+    pass_salt = None
+    pass_hash = None
+    if account_type == AccountType.FT:
+        pass_salt = gen_pass_salt()
+        pass_hash = await gen_password_hash_async(pw=data['pass'], pass_salt=pass_salt)
+
+    return _build_account_data(data, account_type, pass_hash, pass_salt)
+
+
+# (pass_salt, pass_hash) per password, CPU bound: run it in a process pool for bulk imports
+def gen_password_hashes(pws: List[str]) -> List[Tuple[str, str]]:
+    result = []
+    for pw in pws:
+        pass_salt = gen_pass_salt()
+        result.append((pass_salt, gen_password_hash(pw=pw, pass_salt=pass_salt)))
+    return result
+
+
+'''
+bulk version of gen_account_data, the passwords are hashed already
+- rows: data of gen_account_data, plus optional 'aid' & 'role_id' to keep (migrations)
+- credentials: (pass_salt, pass_hash) per row, None for SSO accounts
+- the missing ids are allocated in one gen_ids() call
+'''
+def gen_bulk_account_data(
+    rows: List[dict],
+    account_types: List[AccountType],
+    credentials: List[Optional[Tuple[str, str]]],
+) -> List[Tuple[FTAuth, Account]]:
+    ids = iter(gen_ids(2 * sum(1 for data in rows if not data.get('aid', None))))
+    result = []
+    for (data, account_type, credential) in zip(rows, account_types, credentials):
+        (pass_salt, pass_hash) = credential or (None, None)
+        if data.get('aid', None):
+            account_ids = (data['aid'], data['role_id'])
+        else:
+            account_ids = (next(ids), next(ids))
+        result.append(_build_account_data(
+            data, account_type, pass_hash, pass_salt, ids=account_ids))
+
+    return result
+
+
+def _build_account_data(
+    data: dict,
+    account_type: AccountType,
+    pass_hash: str,
+    pass_salt: str,
+    ids: Optional[Tuple[int, int]] = None,
+) -> Tuple[FTAuth, Account]:
+    (aid, role_id) = ids or gen_ids(2)
     ft_auth = FTAuth(
         email=data['email'],
         aid=aid,
@@ -76,10 +127,8 @@ def gen_account_data(data: dict, account_type: AccountType) -> Tuple[FTAuth, Acc
     )
 
     if account_type == AccountType.FT:
-        pass_salt = gen_pass_salt()
         ft_auth.pass_salt = pass_salt
-        ft_auth.pass_hash = gen_password_hash(
-            pw=data['pass'], pass_salt=pass_salt)
+        ft_auth.pass_hash = pass_hash
     else:
         ft_auth.sso_id = data['sso_id']
 
@@ -96,8 +145,16 @@ def gen_account_data(data: dict, account_type: AccountType) -> Tuple[FTAuth, Acc
 
 
 def match_password(pass_hash, pw, pass_salt):
-    password_data = str(pw + pass_salt).encode("utf-8")
-    return pass_hash == hashlib.sha224(password_data).hexdigest()
+    return password_hasher.verify(pass_hash, pw, pass_salt)
+
+
+async def match_password_async(pass_hash, pw, pass_salt):
+    return await password_hasher.verify_async(pass_hash, pw, pass_salt)
+
+
+# hashed by a legacy scheme or with outdated cost settings
+def password_needs_rehash(pass_hash):
+    return password_hasher.needs_rehash(pass_hash)
 
 
 def filter_by_keys(data, ary):
@@ -0,0 +1,67 @@
+import math
+from bisect import bisect_left
+from typing import Any, Dict, List
+
+
+'''
+log-bucketed latency histogram (ms), fixed memory:
+bucket i counts the values in (bounds[i-1], bounds[i]], bounds grow by `growth`,
+so a percentile is accurate within one bucket (~ growth - 1, 19% by default)
+'''
+class Histogram:
+    def __init__(
+        self,
+        label: str,
+        min_value: float = 0.1,
+        max_value: float = 60000.0,
+        growth: float = 1.19,
+    ):
+        self.label = label
+        size = int(math.ceil(math.log(max_value / min_value, growth))) + 1
+        self.bounds: List[float] = [min_value * growth ** i for i in range(size)]
+        self.counts: List[int] = [0] * (size + 1)  # the last one: > max_value
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    # upper bound of the bucket holding the p-th percentile, p in [0, 100]
+    def percentile(self, p: float) -> float:
+        if self.count == 0:
+            return 0.0
+
+        rank = max(1, int(math.ceil(self.count * p / 100)))
+        seen = 0
+        for (i, count) in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                bound = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(bound, self.max)
+
+        return self.max
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'label': self.label,
+            'count': self.count,
+            'avg': round(self.sum / self.count, 3) if self.count else 0.0,
+            'min': round(self.min, 3) if self.min is not None else 0.0,
+            'max': round(self.max, 3) if self.max is not None else 0.0,
+            'p50': round(self.percentile(50), 3),
+            'p90': round(self.percentile(90), 3),
+            'p99': round(self.percentile(99), 3),
+        }
@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import hmac
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from ...configs.conf import (
+    PWD_HASH_SCHEME,
+    PWD_HASH_WORKERS,
+    PWD_PBKDF2_ITERATIONS,
+    PWD_SCRYPT_N,
+    PWD_SCRYPT_R,
+    PWD_SCRYPT_P,
+)
+
+
+'''
+password hash strings are self-describing:
+    legacy:  <sha224 hexdigest>                        (no separator)
+    pbkdf2:  pbkdf2_sha256$<iterations>$<hexdigest>
+    scrypt:  scrypt$<n>$<r>$<p>$<hexdigest>
+the salt is still stored separately (auth.pass_salt)
+'''
+SEPARATOR = '$'
+DKLEN = 32
+
+
+class IPasswordEngine(ABC):
+    scheme: str = None
+
+    @abstractmethod
+    def hash(self, pw: str, pass_salt: str) -> str:
+        pass
+
+    # the hash was produced by this engine with the current cost settings
+    @abstractmethod
+    def is_current(self, pass_hash: str) -> bool:
+        pass
+
+    @abstractmethod
+    def verify(self, pass_hash: str, pw: str, pass_salt: str) -> bool:
+        pass
+
+
+class Sha224Engine(IPasswordEngine):
+    scheme = 'sha224'
+
+    def hash(self, pw: str, pass_salt: str) -> str:
+        password_data = str(pw + pass_salt).encode('utf-8')
+        return hashlib.sha224(password_data).hexdigest()
+
+    def is_current(self, pass_hash: str) -> bool:
+        return SEPARATOR not in pass_hash
+
+    def verify(self, pass_hash: str, pw: str, pass_salt: str) -> bool:
+        return hmac.compare_digest(pass_hash, self.hash(pw, pass_salt))
+
+
+class Pbkdf2Engine(IPasswordEngine):
+    scheme = 'pbkdf2_sha256'
+
+    def __init__(self, iterations: int):
+        self.iterations = iterations
+
+    def hash(self, pw: str, pass_salt: str) -> str:
+        return self.__hash(pw, pass_salt, self.iterations)
+
+    def is_current(self, pass_hash: str) -> bool:
+        params = pass_hash.split(SEPARATOR)
+        return len(params) == 3 and params[0] == self.scheme \
+            and params[1] == str(self.iterations)
+
+    def verify(self, pass_hash: str, pw: str, pass_salt: str) -> bool:
+        _, iterations, _ = pass_hash.split(SEPARATOR)
+        return hmac.compare_digest(pass_hash, self.__hash(pw, pass_salt, int(iterations)))
+
+    def __hash(self, pw: str, pass_salt: str, iterations: int) -> str:
+        digest = hashlib.pbkdf2_hmac(
+            'sha256', pw.encode('utf-8'), pass_salt.encode('utf-8'), iterations, DKLEN)
+        return SEPARATOR.join([self.scheme, str(iterations), digest.hex()])
+
+
+class ScryptEngine(IPasswordEngine):
+    scheme = 'scrypt'
+
+    def __init__(self, n: int, r: int, p: int):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    def hash(self, pw: str, pass_salt: str) -> str:
+        return self.__hash(pw, pass_salt, self.n, self.r, self.p)
+
+    def is_current(self, pass_hash: str) -> bool:
+        params = pass_hash.split(SEPARATOR)
+        return len(params) == 5 and params[0] == self.scheme \
+            and params[1:4] == [str(self.n), str(self.r), str(self.p)]
+
+    def verify(self, pass_hash: str, pw: str, pass_salt: str) -> bool:
+        _, n, r, p, _ = pass_hash.split(SEPARATOR)
+        return hmac.compare_digest(pass_hash, self.__hash(pw, pass_salt, int(n), int(r), int(p)))
+
+    def __hash(self, pw: str, pass_salt: str, n: int, r: int, p: int) -> str:
+        digest = hashlib.scrypt(
+            pw.encode('utf-8'),
+            salt=pass_salt.encode('utf-8'),
+            n=n, r=r, p=p,
+            maxmem=2 * 128 * n * r * p,
+            dklen=DKLEN,
+        )
+        return SEPARATOR.join([self.scheme, str(n), str(r), str(p), digest.hex()])
+
+
+class PasswordHasher:
+    '''
+    - hash with the configured engine
+    - verify with the engine encoded in the hash string
+    - the KDF runs in a bounded thread pool (hashlib releases the GIL),
+      so it never blocks the event loop serving other requests
+    '''
+
+    def __init__(self, engine: IPasswordEngine, workers: int):
+        self.engine = engine
+        self.engines: Dict[str, IPasswordEngine] = {
+            Sha224Engine.scheme: Sha224Engine(),
+            engine.scheme: engine,
+        }
+        self.workers = max(1, workers)
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    def hash(self, pw: str, pass_salt: str) -> str:
+        return self.engine.hash(pw, pass_salt)
+
+    def verify(self, pass_hash: str, pw: str, pass_salt: str) -> bool:
+        if not pass_hash or pass_salt is None:
+            return False
+
+        engine = self.__engine_of(pass_hash)
+        if engine is None:
+            return False
+
+        try:
+            return engine.verify(pass_hash, pw, pass_salt)
+        except ValueError:
+            # malformed hash string
+            return False
+
+    def needs_rehash(self, pass_hash: str) -> bool:
+        return not self.engine.is_current(pass_hash)
+
+    async def hash_async(self, pw: str, pass_salt: str) -> str:
+        return await self.__run(self.hash, pw, pass_salt)
+
+    async def verify_async(self, pass_hash: str, pw: str, pass_salt: str) -> bool:
+        return await self.__run(self.verify, pass_hash, pw, pass_salt)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def __engine_of(self, pass_hash: str) -> Optional[IPasswordEngine]:
+        if SEPARATOR not in pass_hash:
+            return self.engines[Sha224Engine.scheme]
+
+        scheme = pass_hash.split(SEPARATOR, 1)[0]
+        engine = self.engines.get(scheme, None)
+        if engine is None:
+            # hashes of a previously configured engine stay verifiable
+            engine = build_engine(scheme)
+            if engine is not None:
+                self.engines[scheme] = engine
+        return engine
+
+    async def __run(self, func, *args):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix='pwd_hash')
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+
+def build_engine(
+    scheme: str,
+    iterations: int = PWD_PBKDF2_ITERATIONS,
+    n: int = PWD_SCRYPT_N,
+    r: int = PWD_SCRYPT_R,
+    p: int = PWD_SCRYPT_P,
+) -> Optional[IPasswordEngine]:
+    if scheme == ScryptEngine.scheme:
+        return ScryptEngine(n=n, r=r, p=p)
+
+    if scheme == Pbkdf2Engine.scheme:
+        return Pbkdf2Engine(iterations=iterations)
+
+    if scheme == Sha224Engine.scheme:
+        return Sha224Engine()
+
+    return None
+
+
+current_engine = build_engine(PWD_HASH_SCHEME)
+if current_engine is None:
+    raise ValueError(f'invalid PWD_HASH_SCHEME: {PWD_HASH_SCHEME}')
+
+password_hasher = PasswordHasher(
+    engine=current_engine,
+    workers=PWD_HASH_WORKERS,
+)
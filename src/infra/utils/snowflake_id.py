@@ -0,0 +1,135 @@
+import os
+import time
+import socket
+import hashlib
+from typing import List, Optional
+from ...configs.conf import SNOWFLAKE_WORKER_ID
+import logging
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+'''
+53-bit snowflake id (fits a JS Number, like the former `id / 1000`):
+
+    | 40 bits: ms since EPOCH | 9 bits: worker id | 4 bits: sequence |
+
+- 40 bits of ms last ~34 years from EPOCH (2024-01-01 UTC)
+- worker id: SNOWFLAKE_WORKER_ID, or leased from DynamoDB on startup (SnowflakeWorkerLease);
+  until the lease is granted it is derived from the Lambda container (log stream) / host + pid,
+  which is only 512 values: derived ids of concurrent containers CAN collide
+- 16 ids per ms per worker; on overflow the next ms is borrowed (no blocking wait),
+  at most MAX_DRIFT_MS ahead of the clock
+- clock moving backwards: keep issuing from the last ms (no duplicates)
+
+NOTE: ids issued by the former generator are ~7e15 and above,
+ids of this layout stay below that until ~2051, so they never collide
+'''
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+TIMESTAMP_BITS = 40
+WORKER_BITS = 9
+SEQUENCE_BITS = 4
+
+MAX_TIMESTAMP = (1 << TIMESTAMP_BITS) - 1
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+WORKER_SHIFT = SEQUENCE_BITS
+# borrowed ms ahead of the clock (sequence overflow): a burst of 80k ids,
+# far below any lease duration
+MAX_DRIFT_MS = 5000
+TIMESTAMP_SHIFT = WORKER_BITS + SEQUENCE_BITS
+
+
+def derive_worker_id() -> int:
+    if SNOWFLAKE_WORKER_ID is not None:
+        return int(SNOWFLAKE_WORKER_ID) & MAX_WORKER_ID
+
+    container = os.getenv('AWS_LAMBDA_LOG_STREAM_NAME', None) or socket.gethostname()
+    seed = f'{container}:{os.getpid()}'.encode('utf-8')
+    return int(hashlib.sha1(seed).hexdigest(), 16) & MAX_WORKER_ID
+
+
+class SnowflakeIdGenerator:
+    '''
+    one generator per process, called from the event loop thread only,
+    so there is no lock on the hot path
+    '''
+
+    def __init__(self, worker_id: int, epoch_ms: int = EPOCH_MS):
+        if worker_id < 0 or worker_id > MAX_WORKER_ID:
+            raise ValueError(f'worker_id should be in [0, {MAX_WORKER_ID}]')
+
+        self.worker_id = worker_id
+        self.epoch_ms = epoch_ms
+        self.last_ts = -1
+        self.sequence = 0
+        # a leased worker id is not used after its lease (monotonic secs), even if the
+        # renewal could not run (a frozen Lambda container)
+        self.lease_expires_at: Optional[float] = None
+
+    def next_id(self) -> int:
+        if self.lease_expires_at is not None and time.monotonic() >= self.lease_expires_at:
+            log.error('snowflake worker id %s: the lease expired, fall back to a derived one', self.worker_id)
+            self.reset(derive_worker_id())
+
+        ts = self.__now()
+        if ts < self.last_ts:
+            # clock moved backwards, keep issuing from the last ms
+            ts = self.last_ts
+
+        if ts == self.last_ts:
+            self.sequence = (self.sequence + 1) & MAX_SEQUENCE
+            if self.sequence == 0:
+                # sequence overflow in this ms, borrow the next one
+                ts = self.last_ts + 1
+                if ts - self.__now() > MAX_DRIFT_MS:
+                    raise OverflowError('snowflake sequence is exhausted')
+        else:
+            self.sequence = 0
+
+        if ts > MAX_TIMESTAMP:
+            raise OverflowError('snowflake timestamp bits are exhausted')
+
+        self.last_ts = ts
+        return (ts << TIMESTAMP_SHIFT) | (self.worker_id << WORKER_SHIFT) | self.sequence
+
+    def gen_ids(self, n: int) -> List[int]:
+        return [self.next_id() for _ in range(n)]
+
+    # ms borrowed ahead of the clock
+    def drift_ms(self) -> int:
+        return max(0, self.last_ts - self.__now())
+
+    # last_ts is kept: the ids stay increasing in this process
+    def reset(self, worker_id: int, lease_expires_at: Optional[float] = None):
+        self.worker_id = worker_id
+        self.sequence = 0
+        self.lease_expires_at = lease_expires_at
+
+    def __now(self) -> int:
+        return time.time_ns() // 1000000 - self.epoch_ms
+
+
+snowflake_generator = SnowflakeIdGenerator(derive_worker_id())
+
+# forked children (process pools) get a worker id of their own
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(
+        after_in_child=lambda: snowflake_generator.reset(derive_worker_id()))
+
+
+def gen_id() -> int:
+    return snowflake_generator.next_id()
+
+
+def gen_ids(n: int) -> List[int]:
+    return snowflake_generator.gen_ids(n)
+
+
+def parse_id(snowflake_id: int):
+    return {
+        'timestamp': (snowflake_id >> TIMESTAMP_SHIFT) + EPOCH_MS,
+        'worker_id': (snowflake_id >> WORKER_SHIFT) & MAX_WORKER_ID,
+        'sequence': snowflake_id & MAX_SEQUENCE,
+    }
@@ -0,0 +1,134 @@
+import hmac
+import time
+import inspect
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .histogram import Histogram
+from ...configs.conf import TIMING_ENABLED, METRICS_TOKEN
+import logging
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# Server-Timing entries per response, the others are dropped
+MAX_SERVER_TIMING_ENTRIES = 20
+
+
+'''
+per-stage latency (ms):
+- span(stage) / @timed(stage) record the duration into the histogram of the stage
+- within a request (begin_request ... end_request), the spans are also collected
+  for the Server-Timing header; tasks created by the request (gather) share the list
+- snapshot(): p50/p90/p99 per stage, for the metrics route
+'''
+histograms: Dict[str, Histogram] = {}
+request_spans_var: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar('request_spans', default=None)
+
+
+# the metrics route & the Server-Timing header are for the METRICS_TOKEN holders only
+def metrics_token_ok(token: Optional[str]) -> bool:
+    return bool(METRICS_TOKEN) and token is not None and \
+        hmac.compare_digest(token.encode('utf-8'), METRICS_TOKEN.encode('utf-8'))
+
+
+def record(stage: str, ms: float):
+    histogram = histograms.get(stage, None)
+    if histogram is None:
+        histogram = histograms[stage] = Histogram(stage)
+    histogram.record(ms)
+
+    spans = request_spans_var.get()
+    if spans is not None:
+        spans.append((stage, ms))
+
+
+@contextmanager
+def span(stage: str):
+    if not TIMING_ENABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, (time.perf_counter() - start) * 1000)
+
+
+def timed(stage: str) -> Callable:
+    def decorator(fn: Callable) -> Callable:
+        if not TIMING_ENABLED:
+            return fn
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    record(stage, (time.perf_counter() - start) * 1000)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(stage, (time.perf_counter() - start) * 1000)
+
+        return wrapper
+
+    return decorator
+
+
+def begin_request() -> Token:
+    return request_spans_var.set([])
+
+
+def request_spans() -> List[Tuple[str, float]]:
+    return request_spans_var.get() or []
+
+
+# long-lived tasks created within a request (workers) copy its context:
+# they must not append their spans to that request for the rest of their lives
+def detach_request():
+    request_spans_var.set(None)
+
+
+def end_request(token: Token) -> List[Tuple[str, float]]:
+    spans = request_spans()
+    request_spans_var.reset(token)
+    return spans
+
+
+# the spans of the same stage are summed up: `ddb.find_auth;dur=3.1;desc="x2"`
+def server_timing(spans: List[Tuple[str, float]], total_ms: Optional[float] = None) -> str:
+    merged: Dict[str, List] = {}
+    for (stage, ms) in spans:
+        if stage in merged:
+            merged[stage][0] += ms
+            merged[stage][1] += 1
+        elif len(merged) < MAX_SERVER_TIMING_ENTRIES:
+            merged[stage] = [ms, 1]
+
+    entries = [
+        f'{stage};dur={ms:.3f}' + (f';desc="x{count}"' if count > 1 else '')
+        for (stage, (ms, count)) in merged.items()
+    ]
+    if total_ms is not None:
+        entries.append(f'total;dur={total_ms:.3f}')
+    return ', '.join(entries)
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    return {stage: histograms[stage].snapshot() for stage in sorted(histograms.keys())}
+
+
+def reset():
+    for histogram in histograms.values():
+        histogram.reset()
@@ -0,0 +1,120 @@
+import time
+import uuid
+import asyncio
+from typing import Any, Dict, Optional
+from .snowflake_id import SnowflakeIdGenerator, MAX_WORKER_ID, derive_worker_id
+from ...repositories.worker_lease_repository import IWorkerLeaseRepository
+import logging
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# part of the lease the generator does not use, for the clock skew & the request latency
+LEASE_MARGIN = 0.1
+
+
+'''
+leases a snowflake worker id per process, so concurrent containers never share one:
+
+- start(): candidates from a shared counter (mod 512), the first free one is leased
+  and installed into the generator; the derived worker id is used until then
+- the lease is renewed every lease_secs / 3 in background;
+  if it cannot be renewed before it would expire, another process may take the id,
+  so the generator falls back to a derived id and a new lease is acquired;
+  the generator also stops using the id by itself at the local expiry
+  (LEASE_MARGIN before the lease), in case the renewal does not run at all
+- close(): the worker id is released
+'''
+class SnowflakeWorkerLease:
+    def __init__(self, repo: IWorkerLeaseRepository, generator: SnowflakeIdGenerator, lease_secs: int):
+        self.repo = repo
+        self.generator = generator
+        self.lease_secs = max(3, lease_secs)
+        self.owner = uuid.uuid4().hex
+        self.worker_id: Optional[int] = None
+        self.expires_at = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.task is not None:
+            return
+
+        try:
+            await self.__acquire()
+        except Exception as e:
+            log.error('SnowflakeWorkerLease: acquire error, keep the derived worker id %s, err:%s',
+                      self.generator.worker_id, e)
+
+        self.task = asyncio.create_task(self.__keep())
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        if self.worker_id is None:
+            return
+
+        try:
+            # the next holder must not reuse the borrowed ms
+            await asyncio.sleep(self.generator.drift_ms() / 1000)
+            await self.repo.release(self.worker_id, self.owner)
+        except Exception as e:
+            log.error('SnowflakeWorkerLease: release error, worker_id:%s, err:%s', self.worker_id, e)
+        self.worker_id = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'worker_id': self.generator.worker_id,
+            'leased': self.worker_id is not None,
+            'expires_in_secs': round(max(0, self.expires_at - time.monotonic()), 1),
+        }
+
+    async def __acquire(self):
+        for _ in range(MAX_WORKER_ID + 1):
+            worker_id = (await self.repo.next_candidate()) & MAX_WORKER_ID
+            start = time.monotonic()
+            if await self.repo.acquire(worker_id, self.owner, self.lease_secs):
+                self.worker_id = worker_id
+                self.__extend(start)
+                self.generator.reset(worker_id, self.expires_at)
+                log.info('SnowflakeWorkerLease: worker id %s is leased', worker_id)
+                return
+
+        raise Exception('no_free_worker_id')
+
+    async def __keep(self):
+        while True:
+            await asyncio.sleep(self.lease_secs / 3)
+            try:
+                if self.worker_id is not None and self.generator.worker_id != self.worker_id:
+                    # expired in the generator
+                    self.worker_id = None
+
+                if self.worker_id is None:
+                    await self.__acquire()
+                    continue
+
+                start = time.monotonic()
+                if await self.repo.acquire(self.worker_id, self.owner, self.lease_secs):
+                    self.__extend(start)
+                    self.generator.lease_expires_at = self.expires_at
+                    continue
+
+                log.error('SnowflakeWorkerLease: the lease of worker id %s is lost', self.worker_id)
+                self.__lose()
+
+            except Exception as e:
+                log.error('SnowflakeWorkerLease: renew error, worker_id:%s, err:%s', self.worker_id, e)
+                # it would expire before the next renew
+                if self.worker_id is not None and \
+                    time.monotonic() + self.lease_secs / 3 >= self.expires_at:
+                    self.__lose()
+
+    def __extend(self, start: float):
+        self.expires_at = start + self.lease_secs * (1 - LEASE_MARGIN)
+
+    # the id may be leased by another process now
+    def __lose(self):
+        self.worker_id = None
+        self.generator.reset(derive_worker_id())
@@ -1,9 +1,10 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Any, Type, Optional
 from .event_vos import PubEventDetailVO
 from ..configs.constants import *
 from ..infra.db.nosql.auth_schemas import FTAuth, Account
 from ..infra.utils.auth_util import gen_snowflake_id
+from ..infra.utils.time_util import gen_timestamp
 
 
 class AccountVO(BaseModel):
@@ -14,6 +15,13 @@ class AccountVO(BaseModel):
     created_at: int
 
 
+# what the internal services get from /accounts/batch (no email)
+class AccountBriefVO(BaseModel):
+    role_id: int
+    region: str
+    role: str
+
+
 # 模擬 signup 當下註冊時的運作
 class SignupVO(BaseModel):
     auth: FTAuth
@@ -52,6 +60,8 @@ class UpdatePasswordDTO(BaseModel):
     pass_hash: str
     pass_salt: str
     role_id: Optional[int] = None
+    # ms, the newest password wins when the pending events are compacted
+    updated_at: int = Field(default_factory=gen_timestamp)
 
     def set_role_id(self, role_id: int):
         self.role_id = role_id
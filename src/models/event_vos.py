@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, Dict, List, Any, Type, Callable
+from typing import Optional, Dict, List, Any, Type, Callable, Tuple
 from ..configs.constants import *
 from ..infra.db.nosql.auth_schemas import FTAuth, Account
 from ..infra.utils.auth_util import gen_snowflake_id
@@ -38,6 +38,10 @@ class PubEventDetailVO(EventDetailVO):
         self.retry += 1
         return self
 
+    def coalesced(self) -> 'PubEventDetailVO':
+        self.status = PubEventStatus.COALESCED
+        return self
+
     def dict(self):
         original_dict = super().dict()
         original_dict['status'] = original_dict['status'].value  # 轉換 Enum 為其值
@@ -69,3 +73,24 @@ class SubEventDetailVO(EventDetailVO):
         original_dict = super().dict()
         original_dict['status'] = original_dict['status'].value  # 轉換 Enum 為其值
         return original_dict
+
+
+'''
+compaction key of a pending event: (key, version) or None,
+the pending events of the same key are collapsed into the one of the newest version
+
+update_password: only the newest password of the user (role_id) matters
+'''
+def event_compaction_key(event: Dict) -> Optional[Tuple[str, int]]:
+    if event.get('event_type', None) != BusinessEventType.UPDATE_PASSWORD.value:
+        return None
+
+    role_id = event.get('role_id', None)
+    if role_id is None:
+        return None
+
+    metadata = event.get('metadata', None) or {}
+    return (
+        f'{BusinessEventType.UPDATE_PASSWORD.value}#{role_id}',
+        int(metadata.get('updated_at', None) or 0),
+    )
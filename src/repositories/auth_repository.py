@@ -37,6 +37,37 @@ class IAuthRepository(ABC):
     async def find_auth(self, db: Any, email: EmailStr):
         pass
 
+    '''
+    the updated_at of the params is stored with the password (except for a rehash)
+    expected_pass_hash: only if the stored pass_hash is still this one (rehash on login)
+    newer_only: only if the stored password is older than the params' updated_at
+        (remote events & their retries arrive out of order)
+    returns None when the condition fails (nothing is written)
+    '''
     @abstractmethod
-    async def update_password(self, db: Any, update_password_params: UpdatePasswordDTO) -> (FTAuth):
+    async def update_password(self, db: Any, update_password_params: UpdatePasswordDTO, expected_pass_hash: Optional[str] = None, newer_only: bool = False) -> Optional[FTAuth]:
+        pass
+
+    @abstractmethod
+    async def batch_find_auths(self, db: Any, emails: List[EmailStr]) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    async def batch_find_accounts(self, db: Any, aids: List[Decimal]) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    async def batch_find_by_role_ids(self, db: Any, role_ids: List[Decimal]) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    async def batch_create_accounts(self, auth_db: Any, account_db: Any, accounts: List[Tuple[FTAuth, Account]]):
+        pass
+
+    @abstractmethod
+    async def batch_delete_accounts(self, auth_db: Any, account_db: Any, auths: List[FTAuth]):
+        pass
+
+    @abstractmethod
+    async def scan_auths(self, db: Any, segment: int, total_segments: int, start_key: Optional[Dict] = None, limit: int = 100) -> Tuple[List[Dict], Optional[Dict]]:
         pass
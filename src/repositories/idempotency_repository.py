@@ -0,0 +1,24 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+from ..configs.constants import IdempotencyStatus
+
+
+class IIdempotencyRepository(ABC):
+
+    '''
+    claim the key for `owner` for lease_secs,
+    return None if claimed, or the status of the existing claim
+    '''
+    @abstractmethod
+    async def claim(self, key: str, owner: str, lease_secs: int) -> Optional[IdempotencyStatus]:
+        pass
+
+    # the work is done, keep the key for ttl_secs
+    @abstractmethod
+    async def complete(self, key: str, owner: str, ttl_secs: int):
+        pass
+
+    # the work is not done, the key can be claimed again
+    @abstractmethod
+    async def release(self, key: str, owner: str):
+        pass
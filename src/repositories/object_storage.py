@@ -18,3 +18,23 @@ class IObjectStorage(ABC):
     @abstractmethod
     async def find(self, bucket):
         pass
+
+    '''
+    the stored data, never from a read cache of the implementation
+    (checks which decide a write, e.g. the duplicate check of signup)
+    '''
+    async def find_latest(self, bucket):
+        return await self.find(bucket)
+
+    '''
+    return the existing data if the bucket is registered,
+    otherwise init it with version and return None
+    (read-then-write by default, implementations may do it atomically)
+    '''
+    async def init_if_absent(self, bucket, version):
+        data = await self.find_latest(bucket)
+        if data is not None:
+            return data
+
+        await self.init(bucket, version)
+        return None
@@ -0,0 +1,12 @@
+from abc import ABC, abstractmethod
+
+
+class IRateLimitRepository(ABC):
+
+    '''
+    count a hit of `key` if the key is under `limit` hits per window_secs (sliding window),
+    return False if the limit is reached (the hit is not counted)
+    '''
+    @abstractmethod
+    async def hit(self, key: str, limit: int, window_secs: int) -> bool:
+        pass
@@ -0,0 +1,22 @@
+from abc import ABC, abstractmethod
+
+
+class IWorkerLeaseRepository(ABC):
+
+    # an increasing number shared by all instances, to pick the next candidate
+    @abstractmethod
+    async def next_candidate(self) -> int:
+        pass
+
+    '''
+    lease worker_id to `owner` for lease_secs, also renews the lease of the same owner;
+    return False if another owner holds an unexpired lease
+    '''
+    @abstractmethod
+    async def acquire(self, worker_id: int, owner: str, lease_secs: int) -> bool:
+        pass
+
+    # give the worker_id back before the lease expires
+    @abstractmethod
+    async def release(self, worker_id: int, owner: str):
+        pass
@@ -0,0 +1,2 @@
+from .server_timing import ServerTimingMiddleware
+from .rate_limit import RateLimitMiddleware, rate_limiter
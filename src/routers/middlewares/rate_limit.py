@@ -0,0 +1,227 @@
+import json
+import time
+from typing import Any, Dict, Optional, Tuple
+from fastapi import status
+from fastapi.responses import JSONResponse
+from ..res.response import res_err
+from ...repositories.rate_limit_repository import IRateLimitRepository
+from ...configs.adapters import rate_limit_repo
+from ...configs.conf import (
+    RATE_LIMIT_WINDOW_SECS,
+    RATE_LIMIT_LOGIN_PER_IP,
+    RATE_LIMIT_LOGIN_PER_EMAIL,
+    RATE_LIMIT_SIGNUP_PER_IP,
+    RATE_LIMIT_SIGNUP_PER_EMAIL,
+    RATE_LIMIT_SENDCODE_PER_IP,
+    RATE_LIMIT_SENDCODE_PER_EMAIL,
+    RATE_LIMIT_GLOBAL_RPS,
+    RATE_LIMIT_GLOBAL_BURST,
+)
+import logging
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# larger bodies of the limited routes are rejected (413), they are never read past it
+MAX_BODY_BYTES = 64 * 1024
+
+# path -> (route, limit per ip, limit per email); 0: no limit
+LIMITED_ROUTES = {
+    '/auth/api/v1/auth-nosql/login': ('login', RATE_LIMIT_LOGIN_PER_IP, RATE_LIMIT_LOGIN_PER_EMAIL),
+    '/auth/api/v1/auth-nosql/signup': ('signup', RATE_LIMIT_SIGNUP_PER_IP, RATE_LIMIT_SIGNUP_PER_EMAIL),
+    '/auth/api/v1/auth-nosql/sendcode/email': ('sendcode', RATE_LIMIT_SENDCODE_PER_IP, RATE_LIMIT_SENDCODE_PER_EMAIL),
+}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+
+        self.tokens -= 1
+        return True
+
+
+'''
+per client ip / per email: sliding window of RATE_LIMIT_WINDOW_SECS in the repository
+(per process, or shared by the instances on DynamoDB);
+global: token bucket of this instance, the admission control of all the limited routes
+
+if the repository fails, the request is let through (counted in errors)
+'''
+class RateLimiter:
+    def __init__(
+        self,
+        repo: IRateLimitRepository,
+        window_secs: int,
+        global_bucket: Optional[TokenBucket] = None,
+        routes: Dict[str, Tuple[str, int, int]] = LIMITED_ROUTES,
+    ):
+        self.repo = repo
+        self.window_secs = window_secs
+        self.global_bucket = global_bucket
+        self.routes = routes
+        self.allowed = 0
+        self.errors = 0
+        self.rejected: Dict[str, int] = {}
+
+    def route(self, path: str) -> Optional[Tuple[str, int, int]]:
+        return self.routes.get(path.rstrip('/'), None)
+
+    async def check(self, route: str, kind: str, value: str, limit: int) -> bool:
+        if limit <= 0:
+            return True
+
+        try:
+            return await self.repo.hit(f'{route}#{kind}#{value}', limit, self.window_secs)
+
+        except Exception as e:
+            self.errors += 1
+            log.error('RateLimiter.check error, let through, route:%s, kind:%s, err:%s',
+                      route, kind, e)
+            return True
+
+    def admit(self) -> bool:
+        return self.global_bucket is None or self.global_bucket.take()
+
+    def reject(self, rule: str):
+        self.rejected[rule] = self.rejected.get(rule, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'allowed': self.allowed,
+            'rejected': dict(self.rejected),
+            'errors': self.errors,
+            'global_tokens': round(self.global_bucket.tokens, 1) if self.global_bucket else None,
+            'store': self.repo.stats() if hasattr(self.repo, 'stats') else None,
+        }
+
+
+'''
+pure ASGI middleware, rejects with 429 before the route (no validation, no IO, no hashing):
+1. per client ip, before reading the body
+2. per email, the email of the JSON body (the body is replayed to the route);
+   a body above MAX_BODY_BYTES is rejected with 413, so no email skips the check
+3. global token bucket
+
+the client ip is scope['client']: the sourceIp on API Gateway (Mangum),
+run uvicorn with --proxy-headers behind a proxy
+'''
+class RateLimitMiddleware:
+    def __init__(self, app: Any, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Dict, receive: Any, send: Any):
+        if scope['type'] != 'http' or scope['method'] != 'POST':
+            await self.app(scope, receive, send)
+            return
+
+        route = self.limiter.route(scope['path'])
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        (name, ip_limit, email_limit) = route
+        client = scope.get('client', None)
+        if client and not await self.limiter.check(name, 'ip', client[0], ip_limit):
+            await self.__reject(f'{name}.ip', self.limiter.window_secs, scope, receive, send)
+            return
+
+        if email_limit > 0:
+            body = await self.__read_body(receive)
+            if body is None:
+                await self.__reject_too_large(f'{name}.body', scope, receive, send)
+                return
+
+            receive = self.__replay(body, receive)
+            email = self.__email(body)
+            if email and not await self.limiter.check(name, 'email', email, email_limit):
+                await self.__reject(f'{name}.email', self.limiter.window_secs, scope, receive, send)
+                return
+
+        if not self.limiter.admit():
+            await self.__reject('global', 1, scope, receive, send)
+            return
+
+        self.limiter.allowed += 1
+        await self.app(scope, receive, send)
+
+    async def __reject(self, rule: str, retry_after: int, scope: Dict, receive: Any, send: Any):
+        self.limiter.reject(rule)
+        response = JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content=res_err(msg='too_many_requests', code='42900', data={'limit': rule}),
+            headers={'Retry-After': str(retry_after)},
+        )
+        await response(scope, receive, send)
+
+    async def __reject_too_large(self, rule: str, scope: Dict, receive: Any, send: Any):
+        self.limiter.reject(rule)
+        response = JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content=res_err(msg='request_body_too_large', code='41300', data={'max_bytes': MAX_BODY_BYTES}),
+        )
+        await response(scope, receive, send)
+
+    # None: the body is larger than MAX_BODY_BYTES, the rest is not read
+    async def __read_body(self, receive: Any) -> Optional[bytes]:
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] != 'http.request':
+                break
+
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                return None
+
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                break
+
+        return b''.join(chunks)
+
+    def __replay(self, body: bytes, receive: Any) -> Any:
+        replayed = False
+
+        async def replay_receive() -> Dict:
+            nonlocal replayed
+            if replayed:
+                return await receive()
+
+            replayed = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        return replay_receive
+
+    def __email(self, body: bytes) -> Optional[str]:
+        if not body:
+            return None
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+
+        email = data.get('email', None) if isinstance(data, dict) else None
+        return email.strip().lower() if isinstance(email, str) else None
+
+
+rate_limiter = RateLimiter(
+    rate_limit_repo,
+    window_secs=RATE_LIMIT_WINDOW_SECS,
+    global_bucket=TokenBucket(RATE_LIMIT_GLOBAL_RPS, RATE_LIMIT_GLOBAL_BURST) \
+        if RATE_LIMIT_GLOBAL_RPS > 0 else None,
+)
@@ -0,0 +1,55 @@
+import time
+from typing import Any, Dict
+from ...infra.utils import timing
+from ...configs.conf import SERVER_TIMING_HEADER
+
+
+'''
+pure ASGI middleware (no extra task per request, unlike BaseHTTPMiddleware):
+- collects the spans of the request, returns them in the Server-Timing header:
+  for every request with SERVER_TIMING_HEADER, otherwise only for the requests
+  carrying the metrics token (x-metrics-token), the stages are not leaked to clients
+- records the request latency per endpoint: http.<endpoint name>
+'''
+class ServerTimingMiddleware:
+    def __init__(self, app: Any, header: bool = SERVER_TIMING_HEADER):
+        self.app = app
+        self.header = header
+
+    async def __call__(self, scope: Dict, receive: Any, send: Any):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        token = timing.begin_request()
+        start = time.perf_counter()
+        header = self.header or self.__has_metrics_token(scope)
+
+        async def send_with_timing(message: Dict):
+            if header and message['type'] == 'http.response.start':
+                total_ms = (time.perf_counter() - start) * 1000
+                value = timing.server_timing(timing.request_spans(), total_ms)
+                message = {
+                    **message,
+                    'headers': [
+                        *message.get('headers', []),
+                        (b'server-timing', value.encode('latin-1')),
+                    ],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+
+        finally:
+            timing.end_request(token)
+            # the router puts the matched endpoint into the scope
+            endpoint = scope.get('endpoint', None)
+            name = getattr(endpoint, '__name__', 'unmatched')
+            timing.record(f'http.{name}', (time.perf_counter() - start) * 1000)
+
+    def __has_metrics_token(self, scope: Dict) -> bool:
+        for (name, value) in scope.get('headers', []):
+            if name == b'x-metrics-token':
+                return timing.metrics_token_ok(value.decode('latin-1'))
+        return False
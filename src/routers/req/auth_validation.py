@@ -1,11 +1,12 @@
 import json
+import hmac
 from pydantic import BaseModel, validator
-from typing import Optional
+from typing import Optional, List
 from decimal import Decimal
 from pydantic import EmailStr
-from fastapi import Body
+from fastapi import Body, Header
 from ...configs.constants import VALID_ROLES, HERE_WE_ARE
-from ...configs.conf import MIN_PASSWORD_LENGTH
+from ...configs.conf import MIN_PASSWORD_LENGTH, BATCH_MAX_KEYS_PER_REQUEST, INTERNAL_API_TOKEN
 from ...configs.exceptions import *
 import logging as log
 
@@ -31,6 +32,27 @@ class ResetPasswordPayload(BaseModel):
         return v
 
 
+class BatchRoleIdsPayload(BaseModel):
+    role_ids: List[int]
+
+    @validator('role_ids')
+    def role_ids_size(cls, v):
+        if not v:
+            raise ClientException(msg='role_ids is required')
+        if len(v) > BATCH_MAX_KEYS_PER_REQUEST:
+            raise ClientException(msg=f'role_ids should be at most {BATCH_MAX_KEYS_PER_REQUEST}')
+        return v
+
+
+# service-to-service routes: 404 without INTERNAL_API_TOKEN configured, 403 on a wrong x-internal-token
+def verify_internal_token(x_internal_token: Optional[str] = Header(None)):
+    if not INTERNAL_API_TOKEN:
+        raise NotFoundException(msg='internal_api_disabled')
+    if x_internal_token is None or \
+        not hmac.compare_digest(x_internal_token.encode('utf-8'), INTERNAL_API_TOKEN.encode('utf-8')):
+        raise ForbiddenException(msg='invalid_internal_token')
+
+
 def decrypt_meta_for_signup(
     # signup -> meta: "{\"role\":\"teacher\",\"pass\":\"secret\"}"
     meta: str = Body(...),
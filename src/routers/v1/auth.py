@@ -1,7 +1,13 @@
 from typing import Any, Dict
 from fastapi import APIRouter, Depends, Body, status, BackgroundTasks
 from pydantic import EmailStr
-from ..req.auth_validation import decrypt_meta_for_signup, decrypt_meta, ResetPasswordPayload
+from ..req.auth_validation import (
+    decrypt_meta_for_signup,
+    decrypt_meta,
+    ResetPasswordPayload,
+    BatchRoleIdsPayload,
+    verify_internal_token,
+)
 from ..res.response import post_success, res_success
 from ...services.auth_service import AuthService
 from ...configs.adapters import *
@@ -11,14 +17,13 @@ from ...events.pub.event.publish_remote_events import (
     publish_remote_update_passowrd_task,
 )
 from ...infra.utils.auth_util import get_public_key
-from ...infra.db.nosql.auth_repository import AuthRepository
 import logging as log
 
 log.basicConfig(filemode='w', level=log.INFO)
 
 
 auth_service = AuthService(
-    auth_repo=AuthRepository(),
+    auth_repo=auth_repo,
     obj_storage=global_object_storage,
     email=email_client,
 )
@@ -134,3 +139,13 @@ async def send_reset_password_confirm_email(
 ):
     verify_token = await auth_service.send_reset_password_confirm_email(auth_db, account_db, email)
     return res_success(msg='password modified', data={'token': verify_token})
+
+
+# for internal services (x-internal-token): resolve many role_ids at once, without emails
+@router.post('/accounts/batch', dependencies=[Depends(verify_internal_token)])
+async def find_accounts_by_role_ids(
+    payload: BatchRoleIdsPayload,
+    # account_db: Any = Depends(get_db),
+):
+    accounts = await auth_service.find_accounts_by_role_ids(payload.role_ids, account_db)
+    return res_success(data=[account.dict() for account in accounts])
@@ -0,0 +1,71 @@
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Header, Query
+from ..res.response import res_success
+from ...infra.utils import timing
+from ...configs.conf import METRICS_TOKEN
+from ...configs.exceptions import ForbiddenException, NotFoundException
+from ...configs.adapters import *
+from ...events.sub.sub_event_manager import sub_event_idempotency
+from ..middlewares import rate_limiter
+import logging as log
+
+log.basicConfig(filemode='w', level=log.INFO)
+
+
+router = APIRouter(
+    prefix='/internal',
+    tags=['internal'],
+    responses={404: {'description': 'Not found'}},
+)
+
+
+'''
+aggregated metrics of this container (since start or the last reset),
+only with METRICS_TOKEN configured & given in x-metrics-token:
+- stages: p50/p90/p99 (ms) of the login/signup stages, repositories, S3, SES and endpoints
+- resources: init timings, probe stats, connection pools
+- caches / events: hit ratios, coalesced events, dedupe hits
+- rate_limit: allowed/rejected requests per rule
+- email: send queue, retries, SES send rate
+- snowflake: worker id of this process & its lease
+'''
+@router.get('/metrics')
+async def get_metrics(
+    reset: bool = Query(False),
+    x_metrics_token: Optional[str] = Header(None),
+):
+    if not METRICS_TOKEN:
+        raise NotFoundException(msg='metrics_disabled')
+    if not timing.metrics_token_ok(x_metrics_token):
+        raise ForbiddenException(msg='invalid_metrics_token')
+
+    data = {
+        'stages': timing.snapshot(),
+        'resources': resource_manager.stats(),
+        'caches': {
+            'auth_repo': _stats(auth_repo),
+            'email_registry': _stats(global_object_storage),
+        },
+        'events': {
+            'event_bus': _buffer_stats(event_bus_adapter),
+            'failed_pub_dlq': _buffer_stats(failed_publish_events_dlq),
+            'failed_sub_dlq': _buffer_stats(failed_subscribed_events_dlq),
+            'sub_idempotency': _stats(sub_event_idempotency),
+        },
+        'rate_limit': rate_limiter.stats(),
+        'email': _stats(email_client),
+        'snowflake': snowflake_lease.stats(),
+    }
+    if reset:
+        timing.reset()
+
+    return res_success(data=data)
+
+
+def _stats(component: Any) -> Optional[Dict]:
+    return component.stats() if hasattr(component, 'stats') else None
+
+
+def _buffer_stats(adapter: Any) -> Optional[Dict]:
+    buffer = getattr(adapter, 'buffer', None)
+    return buffer.stats() if buffer is not None else None
@@ -5,14 +5,13 @@ from ...models.email_value_objects import EmailAuthVO
 from ..res.response import res_success
 from ...services.email_service import EmailService
 from ...configs.adapters import *
-from ...infra.db.nosql.auth_repository import AuthRepository
 import logging as log
 
 log.basicConfig(filemode='w', level=log.INFO)
 
 
 _email_service = EmailService(
-    auth_repo=AuthRepository(),
+    auth_repo=auth_repo,
     email=email_client,
 )
 
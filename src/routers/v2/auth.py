@@ -6,13 +6,10 @@ from src.services.google_auth_service import GoogleAuthService
 from src.routers.req.auth_validation import check_valid_role
 from src.routers.res.response import res_success
 from ...configs.adapters import *
-from ...infra.db.nosql.auth_repository import AuthRepository
 import logging as log
 
 log.basicConfig(filemode='w', level=log.INFO)
 
-auth_repo = AuthRepository()
-
 fb_auth_service = FBAuthService(
     auth_repo=auth_repo,
     obj_storage=global_object_storage,
@@ -1,15 +1,16 @@
-from typing import Any, Union, Callable, Optional
+from typing import Any, Union, Callable, Optional, List, Dict
 from pydantic import EmailStr
 from decimal import Decimal
 import hashlib
 import uuid
 
-from src.configs.constants import AccountType
+from src.configs.constants import AccountType, ACCOUNT_PROJECTION
 from ..repositories.auth_repository import IAuthRepository
 from ..repositories.object_storage import IObjectStorage
 from ..models.auth_value_objects import *
 from ..infra.db.nosql.auth_schemas import FTAuth, Account
 from ..infra.utils import auth_util
+from ..infra.utils.timing import span, timed
 from ..infra.client.email import EmailClient
 from ..configs.exceptions import *
 from ..configs.conf import (TESTING, STAGE)
@@ -77,6 +78,7 @@ class AuthService:
         3. 將帳戶資料寫入 DB
     '''
 
+    @timed('signup')
     async def signup(
         self,
         email: EmailStr,
@@ -86,17 +88,20 @@ class AuthService:
     ) -> (SignupVO):
         try:
             # 1. 檢查 email 有沒註冊過
-            version = await self.__check_if_email_is_registered(email)
+            with span('signup.check_email'):
+                version = await self.__check_if_email_is_registered(email)
 
             # 2. 產生帳戶資料
-            auth, account = await self.__generate_account_data(
-                email, data, version)
+            with span('signup.gen_account_data'):
+                auth, account = await self.__generate_account_data(
+                    email, data, version)
 
             # TODO: [2]. Close/disable account
             # 透過 auth_service.funcntion(...) 判斷是否允許 login/signup; 並且調整註解
 
             # 3. 將帳戶資料寫入 DB
-            signup_vo = await self.save_account_data(auth, account, auth_db, account_db)
+            with span('signup.save_account_data'):
+                signup_vo = await self.save_account_data(auth, account, auth_db, account_db)
             return signup_vo
 
         except ClientException as e:
@@ -123,6 +128,7 @@ class AuthService:
         2. 取得帳戶資料
     '''
 
+    @timed('login')
     async def login(
         self,
         email: EmailStr,
@@ -140,8 +146,8 @@ class AuthService:
             auth = await self.__validation(email, pw, current_region, auth_db)
 
             # 2. 取得帳戶資料
-            aid = auth['aid']
-            account_vo = await self.find_account(aid, account_db)
+            with span('login.find_account'):
+                account_vo = await self.find_account_by_auth(auth, account_db)
             return account_vo
 
         except ClientException as e:
@@ -169,6 +175,7 @@ class AuthService:
                       email, data, e.__str__())
             raise ServerException(msg='unknown_err')
 
+    @timed('update_password')
     async def update_password(
         self, db: Any, email: EmailStr, new_pw: str, origin_pw: Optional[str] = None
     ) -> (UpdatePasswordDTO):
@@ -177,7 +184,7 @@ class AuthService:
             params = UpdatePasswordDTO(
                 email=email,
                 pass_salt=pass_salt,
-                pass_hash=auth_util.gen_password_hash(new_pw, pass_salt),
+                pass_hash=await auth_util.gen_password_hash_async(new_pw, pass_salt),
             )
 
             if origin_pw:
@@ -185,7 +192,7 @@ class AuthService:
                 if account_data is None:
                     raise NotFoundException(msg='user_not_found')
 
-                if not auth_util.match_password(
+                if not await auth_util.match_password_async(
                     pass_hash=account_data['pass_hash'], pw=origin_pw, pass_salt=account_data['pass_salt']
                 ):
                     raise ForbiddenException(msg='Invalid Password')
@@ -218,7 +225,12 @@ class AuthService:
 
     async def update_password_by_remote_event(self, db: Any, params: UpdatePasswordDTO):
         try:
-            await self.auth_repo.update_password(db=db, update_password_params=params)
+            # the events (and their DLQ retries) are handled concurrently, out of order
+            auth = await self.auth_repo.update_password(
+                db=db, update_password_params=params, newer_only=True)
+            if auth is None:
+                log.info(f'{self.__cls_name}.update_password_by_remote_event [outdated_password_skipped] \
+                    email:%s, updated_at:%s', params.email, params.updated_at)
         except Exception as e:
             log.error(f'{self.__cls_name}.update_password_by_remote_event [unknown_err] \
                 params:%s, err:%s', params, e.__str__())
@@ -230,14 +242,13 @@ class AuthService:
     '''
 
     async def __check_if_email_is_registered(self, email: EmailStr):
-        # Is the email registered with S3?
-        email_info = await self.obj_storage.find(bucket=email)
+        # save email and version into S3 if it's not registered,
+        # otherwise get the registered email_info
+        version = auth_util.gen_random_string(10)
+        email_info = await self.obj_storage.init_if_absent(bucket=email, version=version)
         if email_info is not None:
             raise DuplicateUserException(data=email_info, msg='registered')
 
-        # save email and version into S3 if it's not registered
-        version = auth_util.gen_random_string(10)
-        version = await self.obj_storage.init(bucket=email, version=version)
         return version  # all good!
 
     '''
@@ -255,7 +266,7 @@ class AuthService:
 
         # 2. 產生 DynamoDB 需要的帳戶資料
         data['email'] = email
-        auth, account = auth_util.gen_account_data(data, AccountType.FT)
+        auth, account = await auth_util.gen_account_data_async(data, AccountType.FT)
         return (auth, account)  # all good!
 
     '''
@@ -353,7 +364,8 @@ class AuthService:
         1. 從 DynamoDB (auth) 取得 auth
         2. not found 錯誤處理
         3. validation password
-        4. return auth
+        4. upgrade legacy/outdated password hash
+        5. return auth
     '''
 
     async def __validation(
@@ -364,11 +376,13 @@ class AuthService:
         auth_db: Any,
     ):
         # 1. 從 DynamoDB (auth) 取得 auth
-        auth = await self.auth_repo.find_auth(db=auth_db, email=email)
+        with span('login.find_auth'):
+            auth = await self.auth_repo.find_auth(db=auth_db, email=email)
 
         # 2. not found 錯誤處理
         if auth is None:
-            email_info = await self.obj_storage.find(bucket=email)
+            with span('login.find_email_info'):
+                email_info = await self.obj_storage.find(bucket=email)
             if email_info is None:
                 raise NotFoundException(msg='user_not_found')
 
@@ -389,12 +403,46 @@ class AuthService:
         # 3. validation password
         pass_hash = auth['pass_hash']
         pass_salt = auth['pass_salt']
-        if not auth_util.match_password(pass_hash=pass_hash, pw=pw, pass_salt=pass_salt):
+        with span('login.match_password'):
+            matched = await auth_util.match_password_async(pass_hash=pass_hash, pw=pw, pass_salt=pass_salt)
+        if not matched:
             raise UnauthorizedException(msg='error_password')
 
-        # 4. return auth
+        # 4. upgrade legacy/outdated password hash
+        if auth_util.password_needs_rehash(pass_hash):
+            with span('login.rehash_password'):
+                await self.__rehash_password(email, pw, pass_hash, auth_db)
+
+        # 5. return auth
         return auth  # all good!
 
+    '''
+    重新雜湊密碼
+        密碼驗證成功後，將舊格式(或舊成本參數)的 hash 以目前的演算法重新產生；
+        失敗不影響登入，下次登入會再嘗試；
+        只在 pass_hash 仍是登入時讀到的值才寫入 (conditional update)，
+        期間被修改/重設的密碼不會被舊密碼覆蓋
+    '''
+
+    async def __rehash_password(self, email: EmailStr, pw: str, old_pass_hash: str, auth_db: Any):
+        try:
+            pass_salt = auth_util.gen_pass_salt()
+            params = UpdatePasswordDTO(
+                email=email,
+                pass_salt=pass_salt,
+                pass_hash=await auth_util.gen_password_hash_async(pw, pass_salt),
+            )
+            # the password may be changed/reset since it was read: skip
+            auth = await self.auth_repo.update_password(
+                db=auth_db, update_password_params=params, expected_pass_hash=old_pass_hash)
+            if auth is None:
+                log.info(f'{self.__cls_name}.login [rehash_password_skipped] \
+                    email:%s, the password is changed', email)
+
+        except Exception as e:
+            log.error(f'{self.__cls_name}.login [rehash_password_err] \
+                email:%s, err:%s', email, e.__str__())
+
     '''
     取得帳戶資料
         從 DynamoDB (accounts) 取得必要的帳戶資料
@@ -407,6 +455,33 @@ class AuthService:
 
         return AccountVO.parse_obj(res)
 
+    '''
+    取得帳戶資料
+        auth 帶有 account projection 時直接使用，不再讀取 DynamoDB (accounts)
+    '''
+
+    async def find_account_by_auth(self, auth: Dict, account_db: Any):
+        projection = auth.get(ACCOUNT_PROJECTION, None)
+        if projection:
+            return AccountVO.parse_obj(projection)
+
+        return await self.find_account(auth['aid'], account_db)
+
+    '''
+    批次取得帳戶資料
+        從 DynamoDB (account_indexs -> accounts) 以 BatchGetItem 取得多個 role_id 的帳戶資料
+    '''
+
+    async def find_accounts_by_role_ids(self, role_ids: List[int], account_db: Any) -> (List[AccountBriefVO]):
+        try:
+            res = await self.auth_repo.batch_find_by_role_ids(db=account_db, role_ids=role_ids)
+            return [AccountBriefVO.parse_obj(item) for item in res]
+
+        except Exception as e:
+            log.error(f'{self.__cls_name}.find_accounts_by_role_ids [unknown_err] \
+                role_ids:%s, err:%s', role_ids, e.__str__())
+            raise ServerException(msg='batch_find_accounts_err')
+
     # TODO: [2]. Close/disable account
     # 新增一個 funcntion 判斷是否允許 login/signup：
     # 1. 是否在三個月內有被停用，
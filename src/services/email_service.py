@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Dict, List
 from pydantic import EmailStr
 from ..repositories.auth_repository import IAuthRepository
 from ..models.auth_value_objects import AccountVO
@@ -16,34 +16,40 @@ class EmailService:
         self.email = email
         self.__cls_name = self.__class__.__name__
 
-    def __find_account(self, account_db: Any, role_id: str) -> (AccountVO):
-        res = self.auth_repo.find_account_by_role_id(
-            db=account_db, role_id=role_id)
-        if res is None:
+    async def __find_accounts(self, account_db: Any, role_ids: List[int]) -> (Dict[int, AccountVO]):
+        res = await self.auth_repo.batch_find_by_role_ids(
+            db=account_db, role_ids=role_ids)
+        accounts = [AccountVO.parse_obj(item) for item in res]
+        return {account.role_id: account for account in accounts}
+
+    def __get_account(self, accounts: Dict[int, AccountVO], role_id: int) -> (AccountVO):
+        account = accounts.get(role_id, None)
+        if account is None:
             raise NotFoundException(msg='account_not_found')
 
-        return AccountVO.parse_obj(res)
+        return account
 
     def __get_recipient_email(
         self,
-        account_db: Any,
+        accounts: Dict[int, AccountVO],
         payload: EmailAuthVO
     ) -> (EmailStr):
-        if payload.recipient_email != None and payload.recipient_email != '':
+        if self.__has_recipient_email(payload):
             return payload.recipient_email
 
-        recipient = self.__find_account(
-            account_db=account_db,
-            role_id=payload.recipient_id,
-        )
+        recipient = self.__get_account(accounts, payload.recipient_id)
         if recipient.role != payload.recipient_role:
             raise ForbiddenException(msg='recipient_role_mismatch')
 
         return recipient.email
 
+    def __has_recipient_email(self, payload: EmailAuthVO) -> bool:
+        return payload.recipient_email != None and payload.recipient_email != ''
+
     '''
     - get sender's email(registration email) by sender_id
     - get recipient's email by recipient_id
+      (sender & recipient are resolved in one batch lookup)
     - send email with body sender's email 
     '''
     async def send_contact(
@@ -53,14 +59,16 @@ class EmailService:
     ):
         log.debug(f'send contact, payload:{payload}')
         try:
-            sender = self.__find_account(
-                account_db=account_db,
-                role_id=payload.sender_id,
-            )
+            role_ids = [payload.sender_id]
+            if not self.__has_recipient_email(payload):
+                role_ids.append(payload.recipient_id)
+            accounts = await self.__find_accounts(account_db, role_ids)
+
+            sender = self.__get_account(accounts, payload.sender_id)
             if sender.role != payload.sender_role:
                 raise ForbiddenException(msg='sender_role_mismatch')
 
-            recipient_email = self.__get_recipient_email(account_db, payload)
+            recipient_email = self.__get_recipient_email(accounts, payload)
 
             await self.email.send_contact(
                 recipient=recipient_email,
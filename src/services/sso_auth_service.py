@@ -11,6 +11,7 @@ from ..repositories.auth_repository import IAuthRepository
 from ..repositories.object_storage import IObjectStorage
 from ..models.auth_value_objects import AccountVO
 from ..infra.utils import auth_util
+from ..infra.utils.timing import span, timed
 from ..infra.client.email import EmailClient
 from ..configs.exceptions import *
 import logging as log
@@ -32,6 +33,7 @@ class SSOAuthService(AuthService):
         self.__cls_name = self.__class__.__name__
 
    
+    @timed('sso.register_or_login')
     async def _register_or_login(
         self,
         user_info: GeneralUserInfo,
@@ -41,7 +43,8 @@ class SSOAuthService(AuthService):
         account_db: Any,
     ) -> AccountVO:
         state_payload = self._parse_state(state)
-        version = await self.__check_if_email_is_registered(email=user_info.email)
+        with span('sso.check_email'):
+            version = await self.__check_if_email_is_registered(email=user_info.email)
  
         if not version:
             return await self.__login(state_payload, user_info, auth_db, account_db)
@@ -60,14 +63,12 @@ class SSOAuthService(AuthService):
         去 S3 檢查 email 有沒註冊過，若沒有 則先寫入 email + version
     """
     async def __check_if_email_is_registered(self, email: EmailStr) -> Optional[str]:
-        # Is the email registered with S3?
-        email_info = await self.obj_storage.find(bucket=email)
+        # save email and version into S3 if it's not registered
+        version = auth_util.gen_random_string(10)
+        email_info = await self.obj_storage.init_if_absent(bucket=email, version=version)
         if email_info is not None:
             return ""
 
-        # save email and version into S3 if it's not registered
-        version = auth_util.gen_random_string(10)
-        version = await self.obj_storage.init(bucket=email, version=version)
         return version  # all good!
 
     async def __login(      
@@ -77,10 +78,11 @@ class SSOAuthService(AuthService):
         auth_db: Any,
         account_db: Any,
     ) -> AccountVO:
-        auth = await self.__validation(user_info.email, user_info.id, state_payload.region, auth_db)
+        with span('sso.validation'):
+            auth = await self.__validation(user_info.email, user_info.id, state_payload.region, auth_db)
 
-        aid = auth['aid']
-        account_vo = await self.find_account(aid, account_db)
+        with span('sso.find_account'):
+            account_vo = await self.find_account_by_auth(auth, account_db)
         return account_vo
 
     async def __register(
@@ -92,10 +94,12 @@ class SSOAuthService(AuthService):
         auth_db: Any,
         account_db: Any,
     ) -> AccountVO:
-        auth, account = await self.__generate_account_data(
-            state_payload, user_info, account_type, version
-        )
-        return await self.save_account_data(auth, account, auth_db, account_db)
+        with span('sso.gen_account_data'):
+            auth, account = await self.__generate_account_data(
+                state_payload, user_info, account_type, version
+            )
+        with span('sso.save_account_data'):
+            return await self.save_account_data(auth, account, auth_db, account_db)
 
     """
     產生帳戶資料